@@ -5,14 +5,35 @@ import os
 from random import randint, random
 
 from kivy.app import App, Builder
-from kivy.clock import Clock
 from kivy.core.audio import SoundLoader
 from kivy.factory import Factory
 from kivy.uix.screenmanager import Screen, ScreenManager, SlideTransition
 
 from kvcheetah import __file__, __version__
+from kvcheetah.ecs import (
+    SPRITE,
+    TRANSFORM,
+    VELOCITY,
+    World,
+    movement_system,
+    render_system
+)
+from kvcheetah.engine import GameLoop
+from kvcheetah.graphics.animation import (
+    ATLAS_CACHE,
+    SpriteAnimation,
+    SpriteAnimator
+)
+from kvcheetah.graphics.batch import BatchSprite
+from kvcheetah.graphics.camera import Camera
+from kvcheetah.graphics.collision import CollisionWorld
+from kvcheetah.graphics.opengl.renderer import SpriteRenderer
+from kvcheetah.graphics.particles import ParticleEmitter
+from kvcheetah.graphics.renderqueue import RenderQueue
 from kvcheetah.graphics.sprite import Sprite
-from kvcheetah.graphics.tilemap import TileMap
+from kvcheetah.graphics.tilemap import TileGrid, TileMap
+from kvcheetah.profiler import PROFILER
+from kvcheetah.uix.overlay import ProfilerOverlay
 
 #Ensure that the current working directory is the package directory
 os.chdir(os.path.dirname(__file__))
@@ -27,10 +48,16 @@ KVLANG = """
     BoxLayout:
         orientation: "vertical"
 
-        Button:
-            text: "Menu"
+        BoxLayout:
             size_hint_y: .1
-            on_release: self.parent.parent.menu()
+
+            Button:
+                text: "Menu"
+                on_release: root.menu()
+
+            ToggleButton:
+                text: "Profiler"
+                on_state: root.show_profiler(self.state == "down")
 
         StencilView:
             id: DemoArea
@@ -75,6 +102,14 @@ KVLANG = """
                         text: "Sprite Color Demo"
                         on_release: root.switch_screen("SpriteColorDemo")
 
+                    Button:
+                        text: "Sprite Batch Demo"
+                        on_release: root.switch_screen("SpriteBatchDemo")
+
+                    Button:
+                        text: "ECS Demo"
+                        on_release: root.switch_screen("ECSDemo")
+
                     Button:
                         text: "TileMap Demo"
                         on_release: root.switch_screen("TileMapDemo")
@@ -89,6 +124,12 @@ KVLANG = """
     SpriteColorDemo:
         name: "SpriteColorDemo"
 
+    SpriteBatchDemo:
+        name: "SpriteBatchDemo"
+
+    ECSDemo:
+        name: "ECSDemo"
+
     TileMapDemo:
         name: "TileMapDemo"
 
@@ -96,6 +137,15 @@ KVLANG = """
         name: "JoystickDemo"
 """
 POP_SND = SoundLoader.load("data/sfx/bubble-pop.wav")
+BUBBLE_LAYER = 1
+PIN_LAYER = 2
+BUBBLE_DRAW_LAYER = 0
+PIN_DRAW_LAYER = 1
+POP_ANIM = SpriteAnimation(
+    frames = ["atlas://data/images/sprites/bubble-pop"],
+    durations = .5,
+    mode = "once"
+)
 
 
 #Classes
@@ -111,18 +161,26 @@ class Bubble(Sprite):
         )
         self.size = (64, 64)
         self.origin = (32, 32)
-        self.source = "atlas://data/images/sprites/bubble"
+        self.texture = ATLAS_CACHE["atlas://data/images/sprites/bubble"]
         self.velocity = (
             2 * cos(radians(randint(0, 359))),
             2 * sin(radians(randint(0, 359)))
         )
         self._hp = 10
         self._destroy_cb = None
+        self._animator = None
+        self._emitter = None
 
         #Process keyword args
         if "destroy_cb" in kwargs:
             self.destroy_cb = kwargs["destroy_cb"]
 
+        if "animator" in kwargs:
+            self.animator = kwargs["animator"]
+
+        if "emitter" in kwargs:
+            self.emitter = kwargs["emitter"]
+
     def get_hp(self):
         """Get the HP of this bubble."""
         return self._hp
@@ -131,7 +189,8 @@ class Bubble(Sprite):
         """Set the HP of this bubble."""
         self._hp = value
 
-        if value <= 0:
+        #Pop this bubble unless it is already popping
+        if value <= 0 and (self.animator is None or self not in self.animator):
             try:
                 POP_SND.seek(0)
                 POP_SND.play()
@@ -139,9 +198,17 @@ class Bubble(Sprite):
             except Exception:
                 pass
 
-            self.source = "atlas://data/images/sprites/bubble-pop"
             self.velocity = (0, 0)
-            Clock.schedule_once(self.destroy, .5)
+
+            if self.emitter is not None:
+                self.emitter.emit(16, self.pos)
+
+            #Destroy this bubble right away if it cannot be animated
+            if self.animator is None:
+                self.destroy()
+
+            else:
+                self.animator.play(self, POP_ANIM, self.destroy)
 
     hp = property(get_hp, set_hp)
 
@@ -155,12 +222,32 @@ class Bubble(Sprite):
 
     destroy_cb = property(get_destroy_cb, set_destroy_cb)
 
+    def get_animator(self):
+        """Get the sprite animator for this bubble."""
+        return self._animator
+
+    def set_animator(self, value):
+        """Set the sprite animator for this bubble."""
+        self._animator = value
+
+    animator = property(get_animator, set_animator)
+
+    def get_emitter(self):
+        """Get the particle emitter for this bubble."""
+        return self._emitter
+
+    def set_emitter(self, value):
+        """Set the particle emitter for this bubble."""
+        self._emitter = value
+
+    emitter = property(get_emitter, set_emitter)
+
     def invert_velocity(self):
         """Invert the velocity of this bubble."""
         vx, vy = self.velocity
         self.velocity = (-vx, -vy)
 
-    def destroy(self, t):
+    def destroy(self, *args):
         """Destroy this bubble."""
         try:
             self.destroy_cb(self)
@@ -184,6 +271,39 @@ class Bubble(Sprite):
         super(Bubble, self).update()
 
 
+class BatchBubble(BatchSprite):
+    """Base class for a batched bubble."""
+    def __init__(self, **kwargs):
+        """Setup this bubble."""
+        super(BatchBubble, self).__init__(**kwargs)
+        self.pos = (
+            randint(16, int(self.parent.width) - 16),
+            randint(16, int(self.parent.height) - 16)
+        )
+        self.size = (32, 32)
+        self.origin = (16, 16)
+        self.source = "atlas://data/images/sprites/bubble"
+        self.velocity = (
+            2 * cos(radians(randint(0, 359))),
+            2 * sin(radians(randint(0, 359)))
+        )
+
+    def bounce(self):
+        """Bounce this bubble off the edges of its parent. The batch applies
+        the velocity of every bubble at once.
+        """
+        x, y = self.pos
+        vx, vy = self.velocity
+
+        if x < 16 or x > self.parent.width - 17:
+            vx = -vx
+
+        if y < 16 or y > self.parent.height - 17:
+            vy = -vy
+
+        self.velocity = (vx, vy)
+
+
 class Pin(Sprite):
     """Base class for a pin."""
     def __init__(self, **kwargs):
@@ -209,11 +329,27 @@ class Ball(Sprite):
     def __init__(self, **kwargs):
         """Setup this ball."""
         super(Ball, self).__init__(**kwargs)
-        self.pos = (self.parent.width / 2, self.parent.height)
+        w, h = self.parent.size
+        self.pos = (w / 2, h)
         self.size = (64, 64)
         self.origin = (32, 32)
         self.velocity = (0, -2)
         self.source = "atlas://data/images/sprites/ball"
+        self._tilemap = None
+
+        #Process keyword args
+        if "tilemap" in kwargs:
+            self.tilemap = kwargs["tilemap"]
+
+    def get_tilemap(self):
+        """Get the tilemap that this ball bounces on."""
+        return self._tilemap
+
+    def set_tilemap(self, value):
+        """Set the tilemap that this ball bounces on."""
+        self._tilemap = value
+
+    tilemap = property(get_tilemap, set_tilemap)
 
     def update(self):
         """Update this ball."""
@@ -224,12 +360,24 @@ class Ball(Sprite):
         if vy > 16:
             vy = 16
 
-        if self.parent.parent.parent.tilemap.hit(self) > 0:
-            vy = -vy
-
         self.velocity = (vx, vy)
         super(Ball, self).update()
 
+        #Bounce off solid tiles
+        tiles, (px, py) = self.tilemap.collide(self)
+
+        if px != 0 or py != 0:
+            x, y = self.pos
+            self.pos = (x + px, y + py)
+
+            if px != 0:
+                vx = -vx
+
+            if py != 0:
+                vy = -vy
+
+            self.velocity = (vx, vy)
+
 
 class DemoBase(Screen):
     """Base class for a demo screen."""
@@ -237,6 +385,20 @@ class DemoBase(Screen):
         """Return to the main menu."""
         self.parent.switch_screen("Menu")
 
+    def show_profiler(self, do_show):
+        """Show/hide the profiler overlay."""
+        if do_show:
+            self.overlay = ProfilerOverlay(
+                size_hint = (None, None),
+                size = (360, 300),
+                pos_hint = {"x": 0, "top": .9}
+            )
+            self.add_widget(self.overlay)
+
+        else:
+            self.remove_widget(self.overlay)
+            self.overlay = None
+
 
 class SpriteDemo(DemoBase):
     """A simple sprite demo."""
@@ -247,26 +409,71 @@ class SpriteDemo(DemoBase):
 
     def on_enter(self):
         """Handle enter event."""
+        #Create the render queue
+        self.queue = RenderQueue(parent = self.demo_area, auto_cull = True)
+        self.queue.show(True)
+
+        #Create the sprite animator
+        self.animator = SpriteAnimator()
+
+        #Create the particle emitter
+        self.emitter = ParticleEmitter(
+            parent = self.demo_area,
+            source = "atlas://data/images/sprites/bubble",
+            speed = (60, 160),
+            lifetime = (.3, .6),
+            size = (12, 0),
+            end_color = (1, 1, 1, 0)
+        )
+        self.emitter.show(True)
+
         #Creat the pin
-        self.pin = Pin(parent = self.demo_area)
+        self.pin = Pin(
+            parent = self.demo_area,
+            queue = self.queue,
+            layer = PIN_DRAW_LAYER
+        )
 
         #Init bubble collection
         self.bubbles = []
 
+        #Create the collision world
+        self.world = CollisionWorld(cell_size = 64)
+        self.world.add(self.pin, layer = PIN_LAYER, mask = BUBBLE_LAYER)
+
+        #Report the render queue stats to the profiler
+        PROFILER.watch("visible_sprites", self.queue.get_drawn)
+        PROFILER.watch("texture_binds", self.queue.get_binds)
+
         #Start the demo
-        self.frame_event = Clock.schedule_interval(self.update, 1 / 60)
+        self.loop = GameLoop(tick_cb = self.update)
+        self.loop.start()
 
     def on_leave(self):
         """Handle leave event."""
         #Stop the demo
-        self.frame_event.cancel()
+        self.loop.stop()
+        PROFILER.unwatch("visible_sprites", self.queue.get_drawn)
+        PROFILER.unwatch("texture_binds", self.queue.get_binds)
+
+        #Destroy the collision world
+        self.world = None
 
         #Destroy bubbles
         self.bubbles = None
+        self.animator = None
+
+        #Destroy the particle emitter
+        self.emitter.show(False)
+        self.emitter = None
 
         #Destroy pin
         self.pin = None
 
+        #Destroy the render queue
+        self.queue.show(False)
+        self.queue = None
+
     def on_touch_down(self, touch):
         """Handle touch down event."""
         super(SpriteDemo, self).on_touch_down(touch)
@@ -293,13 +500,21 @@ class SpriteDemo(DemoBase):
         if self.spawn_tmr <= 0 and len(self.bubbles) < 10:
             self.bubbles.append(Bubble(
                 parent = self.demo_area,
-                destroy_cb = self.destroy_bubble
+                queue = self.queue,
+                layer = BUBBLE_DRAW_LAYER,
+                destroy_cb = self.destroy_bubble,
+                animator = self.animator,
+                emitter = self.emitter
             ))
             self.bubbles[-1].show(True)
+            self.loop.track(self.bubbles[-1])
+            self.world.add(self.bubbles[-1], layer = BUBBLE_LAYER,
+                mask = BUBBLE_LAYER | PIN_LAYER, type = "circle")
             self.spawn_tmr = 100
 
     def destroy_bubble(self, bubble):
         """Destroy the given bubble."""
+        self.world.remove(bubble)
         self.bubbles.remove(bubble)
 
     def update(self, t):
@@ -308,17 +523,26 @@ class SpriteDemo(DemoBase):
         self.spawn_bubble()
 
         #Update bubbles
-        for bubble in self.bubbles:
-            #Update bubble
-            bubble.update()
+        with PROFILER.scope("bubbles"):
+            for bubble in self.bubbles:
+                bubble.update()
+
+        self.animator.update(t)
+        self.emitter.update(t)
+
+        #Do collision detection
+        self.world.update()
 
-            #Do collision detection
-            if bubble.hit(self.pin):
+        for a, b in self.world.pairs():
+            #Pop bubbles that hit the pin
+            if a is self.pin or b is self.pin:
+                bubble = b if a is self.pin else a
                 bubble.hp = 0
                 continue
 
-            for bubble2 in self.bubbles:
-                if bubble2.hp > 0 and bubble.hit(bubble2, "circle"):
+            #Bounce bubbles off each other
+            for bubble, bubble2 in ((a, b), (b, a)):
+                if bubble2.hp > 0:
                     bubble.invert_velocity()
                     bubble.hp -= 1
 
@@ -338,12 +562,13 @@ class SpriteColorDemo(DemoBase):
         self.egg.show(True)
 
         #Start the demo
-        self.frame_event = Clock.schedule_interval(self.update, 1 / 60)
+        self.loop = GameLoop(tick_cb = self.update)
+        self.loop.start()
 
     def on_leave(self):
         """Handle leave event."""
         #Stop the demo
-        self.frame_event.cancel()
+        self.loop.stop()
 
         #Destroy the egg
         self.egg = None
@@ -364,6 +589,115 @@ class SpriteColorDemo(DemoBase):
             self.color_tmr = 30
 
 
+class SpriteBatchDemo(DemoBase):
+    """A sprite batch demo."""
+    def on_enter(self):
+        """Handle enter event."""
+        #Create the sprite batch. The sprite renderer transforms the bubbles on
+        #the GPU and falls back to a regular sprite batch if it cannot.
+        self.batch = SpriteRenderer(parent = self.demo_area, auto_cull = True)
+        self.batch.show(True)
+
+        #Create the bubbles
+        self.bubbles = []
+
+        for i in range(1000):
+            self.bubbles.append(BatchBubble(batch = self.batch))
+            self.bubbles[-1].show(True)
+
+        #Start the demo
+        self.loop = GameLoop(tick_cb = self.update)
+        self.loop.start()
+
+    def on_leave(self):
+        """Handle leave event."""
+        #Stop the demo
+        self.loop.stop()
+
+        #Destroy the bubbles
+        self.bubbles = None
+
+        #Destroy the sprite batch
+        self.batch.show(False)
+        self.batch = None
+
+    def update(self, t):
+        """Update this demo."""
+        for bubble in self.bubbles:
+            bubble.bounce()
+
+        self.batch.update_all()
+
+
+class ECSDemo(DemoBase):
+    """An entity component system demo."""
+    def on_enter(self):
+        """Handle enter event."""
+        #Create the sprite renderer that draws the bubbles
+        region = ATLAS_CACHE.get("atlas://data/images/sprites/bubble")
+        self.batch = SpriteRenderer(parent = self.demo_area)
+        self.batch.texture = region
+        self.batch.show(True)
+
+        #Create the world. Each system runs once per archetype instead of once
+        #per bubble.
+        self.world = World()
+        self.world.add_system(movement_system, TRANSFORM, VELOCITY)
+        self.world.add_system(self.bounce, TRANSFORM, VELOCITY)
+        self.world.add_system(render_system, TRANSFORM, SPRITE)
+
+        #Create the bubbles
+        w, h = self.demo_area.size
+        sprite = (32, 32, 16, 16, 1, 1, 1, 1) + tuple(region.tex_coords)
+
+        for i in range(5000):
+            angle = radians(randint(0, 359))
+            self.world.create(
+                TRANSFORM, VELOCITY, SPRITE,
+                batch = self.batch,
+                transform = (randint(16, int(w) - 16),
+                    randint(16, int(h) - 16), 0, 1),
+                velocity = (120 * cos(angle), 120 * sin(angle), 0, 0),
+                sprite = sprite
+            )
+
+        #Start the demo
+        self.loop = GameLoop(tick_cb = self.world.update)
+        self.loop.start()
+
+    def on_leave(self):
+        """Handle leave event."""
+        #Stop the demo
+        self.loop.stop()
+
+        #Destroy the world
+        self.world = None
+
+        #Destroy the sprite renderer
+        self.batch.show(False)
+        self.batch = None
+
+    def bounce(self, archetype, dt):
+        """Bounce every bubble of the given archetype off the edges of the
+        demo area.
+        """
+        transform = archetype.column(TRANSFORM)
+        velocity = archetype.column(VELOCITY)
+        w, h = self.demo_area.size
+
+        for i in range(0, len(transform), 4):
+            x = transform[i]
+            y = transform[i + 1]
+
+            if ((x < 16 and velocity[i] < 0) or
+                (x > w - 17 and velocity[i] > 0)):
+                velocity[i] = -velocity[i]
+
+            if ((y < 16 and velocity[i + 1] < 0) or
+                (y > h - 17 and velocity[i + 1] > 0)):
+                velocity[i + 1] = -velocity[i + 1]
+
+
 class TileMapDemo(DemoBase):
     """A tilemap demo."""
     def on_enter(self):
@@ -380,16 +714,13 @@ class TileMapDemo(DemoBase):
             "atlas://data/images/tiles/grass-slope-base1",
             "atlas://data/images/tiles/grass-slope-base2"
         ]
-        map_data = [[0 for x in range(128)] for y in range(128)]
+        map_data = TileGrid(128, 128)
 
         #Add dirt tiles
-        for y in range(2):
-            for x in range(128):
-                map_data[y][x] = 1
+        map_data.fill(1, 0, 0, 128, 2)
 
         #Add grass tiles
-        for x in range(128):
-            map_data[2][x] = 2
+        map_data.fill(2, 0, 2, 128, 1)
 
         #Add a small hill
         map_data[2][29] = 7
@@ -402,25 +733,32 @@ class TileMapDemo(DemoBase):
         map_data[4][31] = 7
         map_data[5][31] = 5
 
+        #Create the camera with the world origin at the bottom left of the
+        #demo area
+        w, h = self.demo_area.size
+        self.camera = Camera(parent = self.demo_area, center = (w / 2, h / 2))
+        self.camera.show(True)
+
         #Create the tilemap
         self.tilemap = TileMap(
-            parent = self.demo_area,
+            parent = self.camera,
             tileset = tileset,
             map_data = map_data
             )
         self.tilemap.show(True)
 
         #Create a ball
-        self.ball = Ball(parent = self.demo_area)
+        self.ball = Ball(parent = self.camera, tilemap = self.tilemap)
         self.ball.show(True)
 
         #Start the demo
-        self.frame_event = Clock.schedule_interval(self.update, 1 / 60)
+        self.loop = GameLoop(tick_cb = self.update)
+        self.loop.start()
 
     def on_leave(self):
         """Handle leave event."""
         #Stop the demo
-        self.frame_event.cancel()
+        self.loop.stop()
 
         #Destroy the ball
         self.ball = None
@@ -428,12 +766,29 @@ class TileMapDemo(DemoBase):
         #Destroy the tilemap
         self.tilemap = None
 
+        #Destroy the camera
+        self.camera.show(False)
+        self.camera = None
+
+    def on_touch_down(self, touch):
+        """Handle touch down event."""
+        super(TileMapDemo, self).on_touch_down(touch)
+
+        #Break the tile under the touch
+        x, y = self.camera.to_world(touch.x, touch.y)
+        tx = int(x // 32)
+        ty = int(y // 32)
+        w, h = self.tilemap.size
+
+        if tx >= 0 and tx < w and ty >= 0 and ty < h:
+            self.tilemap.set_tile(tx, ty, 0)
+
     def update(self, t):
         """Update this demo."""
-        #Scroll the tilemap horizontally
-        x, y = self.tilemap.offset
-        x += 2
-        self.tilemap.offset = (x, y)
+        #Scroll the camera horizontally and carry the ball along
+        self.camera.move(2, 0)
+        x, y = self.ball.pos
+        self.ball.pos = (x + 2, y)
 
         #Update the ball
         self.ball.update()
@@ -444,12 +799,13 @@ class JoystickDemo(DemoBase):
     def on_enter(self):
         """Handle enter event."""
         #Start the demo
-        self.frame_event = Clock.schedule_interval(self.update, 1 / 60)
+        self.loop = GameLoop(tick_cb = self.update)
+        self.loop.start()
 
     def on_leave(self):
         """Handle leave event."""
         #Stop the demo
-        self.frame_event.cancel()
+        self.loop.stop()
 
     def update(self, t):
         """Update this demo."""
@@ -0,0 +1,634 @@
+"""kvcheetah - Entity Component System API"""
+
+from array import array
+
+try:
+    from .graphics.batch import DEFAULT_UVS
+    from .math.vecarray import Vec2Array, Vec4Array
+    from .profiler import PROFILER
+
+except ImportError:
+    from graphics.batch import DEFAULT_UVS
+    from kvcheetah.math.vecarray import Vec2Array, Vec4Array
+    from profiler import PROFILER
+
+
+#Classes
+#==============================================================================
+class Component(object):
+    """A component type. The fields of a component are packed into a single
+    typed column per archetype, so a component with 4 float fields takes 4
+    floats per entity. A component without fields is a tag.
+    """
+    def __init__(self, name, fields = (), defaults = None, typecode = "f"):
+        """Setup this component type."""
+        if defaults is None:
+            defaults = (0,) * len(fields)
+
+        if len(defaults) != len(fields):
+            raise ValueError(
+                "Component: {} needs 1 default per field.".format(name))
+
+        self._name = name
+        self._fields = tuple(fields)
+        self._defaults = tuple(defaults)
+        self._typecode = typecode
+
+    def __repr__(self):
+        """Return the representation of this component type."""
+        return "Component({!r})".format(self._name)
+
+    def get_name(self):
+        """Get the name of this component type."""
+        return self._name
+
+    name = property(get_name)
+
+    def get_fields(self):
+        """Get the field names of this component type."""
+        return self._fields
+
+    fields = property(get_fields)
+
+    def get_defaults(self):
+        """Get the default field values of this component type."""
+        return self._defaults
+
+    defaults = property(get_defaults)
+
+    def get_typecode(self):
+        """Get the array typecode of the column of this component type."""
+        return self._typecode
+
+    typecode = property(get_typecode)
+
+    def get_width(self):
+        """Get the number of values per entity."""
+        return len(self._fields)
+
+    width = property(get_width)
+
+    def index(self, field):
+        """Get the offset of the given field within a row."""
+        return self._fields.index(field)
+
+    def pack(self, value):
+        """Convert a component value into a tuple of field values. The value
+        can be None for the defaults, a sequence of every field or a dict of
+        some fields.
+        """
+        if value is None:
+            return self._defaults
+
+        if isinstance(value, dict):
+            values = list(self._defaults)
+
+            for field in value:
+                values[self.index(field)] = value[field]
+
+            return tuple(values)
+
+        value = tuple(value)
+
+        if len(value) != len(self._fields):
+            raise ValueError("Component: {} has {} fields.".format(
+                self._name, len(self._fields)))
+
+        return value
+
+
+class Archetype(object):
+    """The entities that have exactly the same set of components. Each
+    component is stored in a packed column and the entities are kept dense,
+    so row i of every column belongs to the same entity. An archetype with a
+    sprite component can own a sprite batch whose rows mirror its rows.
+    """
+    def __init__(self, components, batch = None):
+        """Setup this archetype."""
+        self._components = frozenset(components)
+        self._columns = {}
+        self._entities = []
+        self._batch = batch
+
+        for component in self._components:
+            self._columns[component] = array(component.typecode)
+
+        #The batch rows must line up with the rows of this archetype
+        if batch is not None:
+            if batch.count > 0:
+                raise ValueError("Archetype: Sprite batch must be empty.")
+
+            batch._free.sort(reverse = True)
+
+    def __len__(self):
+        """Get the number of entities in this archetype."""
+        return len(self._entities)
+
+    def __contains__(self, component):
+        """Does this archetype have the given component?"""
+        return component in self._components
+
+    def get_components(self):
+        """Get the components of this archetype."""
+        return self._components
+
+    components = property(get_components)
+
+    def get_entities(self):
+        """Get the entity in each row of this archetype."""
+        return self._entities
+
+    entities = property(get_entities)
+
+    def get_batch(self):
+        """Get the sprite batch that draws this archetype."""
+        return self._batch
+
+    batch = property(get_batch)
+
+    def column(self, component):
+        """Get the packed column of the given component."""
+        return self._columns[component]
+
+    def append(self, entity, values):
+        """Add a row for the given entity and return its index. values maps
+        components to packed field values and defaults are used for missing
+        components.
+        """
+        i = len(self._entities)
+        self._entities.append(entity)
+
+        for component, column in self._columns.items():
+            column.extend(values.get(component, component.defaults))
+
+        #Show a batch row for the new entity
+        if self._batch is not None:
+            self._batch.acquire()
+            self._batch._shown[i] = 1
+
+        return i
+
+    def remove(self, i):
+        """Remove the given row by moving the last row into it. Returns the
+        entity that was moved or None.
+        """
+        last = len(self._entities) - 1
+        moved = None
+
+        #Move the last row into the removed row
+        if i != last:
+            moved = self._entities[last]
+            self._entities[i] = moved
+
+            for component, column in self._columns.items():
+                w = component.width
+                column[i * w:(i + 1) * w] = column[last * w:]
+
+        #Drop the last row
+        self._entities.pop()
+
+        for component, column in self._columns.items():
+            del column[last * component.width:]
+
+        if self._batch is not None:
+            self._batch.release(last)
+
+        return moved
+
+    def get(self, i, component):
+        """Get the field values of the given component in the given row."""
+        w = component.width
+        return tuple(self._columns[component][i * w:(i + 1) * w])
+
+    def set(self, i, component, values):
+        """Set the field values of the given component in the given row."""
+        w = component.width
+        column = self._columns[component]
+        column[i * w:(i + 1) * w] = array(column.typecode, values)
+
+    def row(self, i):
+        """Get the packed field values of every component in the given row."""
+        return {c: self.get(i, c) for c in self._components}
+
+
+class World(object):
+    """A set of entities and the systems that update them. An entity is an id
+    whose components live in the archetype for its set of components. A
+    system is a function that is called with each matching archetype and the
+    time step, and works on whole columns at once instead of calling a method
+    per entity. Entities destroyed during an update are removed after it.
+    """
+    def __init__(self):
+        """Setup this world."""
+        self._next_id = 1
+        self._locations = {}
+        self._archetypes = {}
+        self._batches = {}
+        self._systems = []
+        self._updating = False
+        self._pending = []
+
+    def __len__(self):
+        """Get the number of entities in this world."""
+        return len(self._locations)
+
+    def __contains__(self, entity):
+        """Is the given entity alive?"""
+        return entity in self._locations
+
+    def get_archetypes(self):
+        """Get the archetypes of this world."""
+        return list(self._archetypes.values())
+
+    archetypes = property(get_archetypes)
+
+    def archetype(self, components, batch = None):
+        """Get or create the archetype for the given components and sprite
+        batch. Each sprite batch can only draw a single archetype.
+        """
+        components = frozenset(components)
+
+        if SPRITE not in components:
+            batch = None
+
+        key = (components, batch)
+        archetype = self._archetypes.get(key, None)
+
+        if archetype is not None:
+            return archetype
+
+        #Ensure that the batch is not drawing another archetype
+        if batch is not None and batch in self._batches:
+            raise ValueError(
+                "World: Sprite batch already draws another archetype.")
+
+        archetype = Archetype(components, batch)
+        self._archetypes[key] = archetype
+
+        if batch is not None:
+            self._batches[batch] = archetype
+
+        #Add the new archetype to each system that matches it
+        for system in self._systems:
+            if system[1] <= components:
+                system[2].append(archetype)
+
+        return archetype
+
+    def create(self, *components, **kwargs):
+        """Create an entity with the given components and return its id. The
+        value of each component is passed as a keyword arg named after it.
+        Entities with a sprite are drawn by the sprite batch given as the batch
+        keyword arg.
+        """
+        archetype = self.archetype(components, kwargs.get("batch", None))
+        values = {}
+
+        for component in components:
+            values[component] = component.pack(
+                kwargs.get(component.name, None))
+
+        entity = self._next_id
+        self._next_id += 1
+        self._locations[entity] = [
+            archetype,
+            archetype.append(entity, values)
+        ]
+        return entity
+
+    def destroy(self, entity):
+        """Destroy the given entity."""
+        #Defer the removal until the current update is done
+        if self._updating:
+            self._pending.append(entity)
+            return
+
+        archetype, i = self._locations.pop(entity)
+        moved = archetype.remove(i)
+
+        if moved is not None:
+            self._locations[moved][1] = i
+
+    def clear(self):
+        """Destroy every entity."""
+        for entity in list(self._locations):
+            self.destroy(entity)
+
+    def has(self, entity, component):
+        """Does the given entity have the given component?"""
+        return component in self._locations[entity][0]
+
+    def get(self, entity, component, field = None):
+        """Get the field values of a component of the given entity, or a
+        single field if it is given.
+        """
+        archetype, i = self._locations[entity]
+
+        if field is not None:
+            w = component.width
+            return archetype.column(component)[
+                i * w + component.index(field)]
+
+        return archetype.get(i, component)
+
+    def set(self, entity, component, value):
+        """Set a component of the given entity. The value can be a sequence of
+        every field or a dict of some fields.
+        """
+        archetype, i = self._locations[entity]
+
+        if isinstance(value, dict):
+            w = component.width
+            column = archetype.column(component)
+
+            for field in value:
+                column[i * w + component.index(field)] = value[field]
+
+        else:
+            archetype.set(i, component, component.pack(value))
+
+    def find_batch(self, components):
+        """Get the sprite batch of an existing archetype for the given
+        components or None.
+        """
+        for key in self._archetypes:
+            if key[0] == components and key[1] is not None:
+                return key[1]
+
+        return None
+
+    def move(self, entity, components, values, batch = None):
+        """Move the given entity to the archetype for the given components.
+        Without a sprite batch, an entity with a sprite moves to an existing
+        archetype for its new components, or to a new archetype drawn by a
+        clone of its current sprite batch.
+        """
+        archetype, i = self._locations[entity]
+        components = frozenset(components)
+        row = archetype.row(i)
+        row.update(values)
+
+        #Find the sprite batch that draws the new archetype
+        if batch is None and SPRITE in components:
+            if components == archetype.components:
+                batch = archetype.batch
+
+            else:
+                batch = self.find_batch(components)
+
+                #Draw a new archetype with a clone of the current sprite batch
+                if batch is None and archetype.batch is not None:
+                    batch = archetype.batch.clone()
+
+                if batch is None:
+                    raise ValueError(
+                        "World: Entity that gains a sprite needs a sprite "
+                        "batch.")
+
+        target = self.archetype(components, batch)
+
+        if target is archetype:
+            return
+
+        #Remove the entity from its old archetype
+        moved = archetype.remove(i)
+
+        if moved is not None:
+            self._locations[moved][1] = i
+
+        #Add it to the new archetype
+        self._locations[entity] = [target, target.append(entity, row)]
+
+    def add_component(self, entity, component, value = None, batch = None):
+        """Add a component to the given entity. Each sprite batch draws a
+        single archetype, so an entity with a sprite moves to the sprite batch
+        that draws its new archetype. If the batch is not given and no
+        archetype with the new components exists, the current sprite batch is
+        cloned. An entity that gains a sprite needs the batch.
+        """
+        components = self._locations[entity][0].components | {component}
+        self.move(entity, components, {component: component.pack(value)},
+            batch)
+
+    def remove_component(self, entity, component, batch = None):
+        """Remove a component from the given entity. An entity that keeps its
+        sprite moves to another sprite batch like in add_component.
+        """
+        components = self._locations[entity][0].components - {component}
+        self.move(entity, components, {}, batch)
+
+    def query(self, *components):
+        """Get the archetypes that have all of the given components."""
+        components = frozenset(components)
+        return [a for a in self._archetypes.values()
+            if components <= a.components]
+
+    def entities(self, *components):
+        """Get every entity that has all of the given components."""
+        entities = []
+
+        for archetype in self.query(*components):
+            entities.extend(archetype.entities)
+
+        return entities
+
+    def add_system(self, system, *components):
+        """Add a system that runs on every archetype with the given
+        components. Systems run in the order they were added.
+        """
+        self._systems.append(
+            (system, frozenset(components), self.query(*components)))
+
+    def remove_system(self, system):
+        """Remove a system from this world."""
+        self._systems = [s for s in self._systems if s[0] != system]
+
+    @PROFILER.profile("ecs")
+    def update(self, dt = 1):
+        """Run every system on its archetypes."""
+        self._updating = True
+
+        try:
+            for system, components, archetypes in self._systems:
+                for archetype in archetypes:
+                    if len(archetype) > 0:
+                        system(archetype, dt)
+
+        finally:
+            self._updating = False
+
+        #Remove the entities that were destroyed during the update
+        pending = self._pending
+        self._pending = []
+
+        for entity in pending:
+            if entity in self._locations:
+                self.destroy(entity)
+
+    @PROFILER.profile("collision")
+    def collisions(self, a, b = None):
+        """Find the pairs of entities whose colliders overlap. a and b are
+        tuples of components that select the 2 groups of entities. Each pair
+        is (entity from a, entity from b). Without b, the entities of a are
+        tested against each other. The boxes are sorted by their left edge
+        and swept, so only boxes that overlap on x are compared.
+        """
+        group_a = frozenset(a) | {COLLIDER, TRANSFORM}
+        group_b = None if b is None else frozenset(b) | {COLLIDER, TRANSFORM}
+
+        #Gather the bounds of every collider with its group flags
+        bounds = array("f")
+        entities = []
+        groups = []
+
+        for archetype in self._archetypes.values():
+            flags = 0
+
+            if group_a <= archetype.components:
+                flags |= 1
+
+            if group_b is not None and group_b <= archetype.components:
+                flags |= 2
+
+            if flags == 0 or len(archetype) == 0:
+                continue
+
+            bounds.extend(collider_bounds(archetype))
+            entities.extend(archetype.entities)
+            groups.extend((flags,) * len(archetype))
+
+        #Sweep along the x axis
+        pairs = []
+        order = sorted(range(len(entities)), key = bounds[0::4].__getitem__)
+
+        n = len(order)
+
+        for k in range(n):
+            i = order[k]
+            x2 = bounds[i * 4 + 2]
+            y1 = bounds[i * 4 + 1]
+            y2 = bounds[i * 4 + 3]
+            gi = groups[i]
+
+            for m in range(k + 1, n):
+                j = order[m]
+
+                if bounds[j * 4] > x2:
+                    break
+
+                if bounds[j * 4 + 1] > y2 or bounds[j * 4 + 3] < y1:
+                    continue
+
+                #Order each pair by group
+                gj = groups[j]
+
+                if group_b is None:
+                    pairs.append((entities[i], entities[j]))
+
+                elif gi & 1 and gj & 2:
+                    pairs.append((entities[i], entities[j]))
+
+                elif gj & 1 and gi & 2:
+                    pairs.append((entities[j], entities[i]))
+
+        return pairs
+
+
+#Globals
+#==============================================================================
+TRANSFORM = Component("transform", ("x", "y", "rot", "scale"), (0, 0, 0, 1))
+VELOCITY = Component("velocity", ("vx", "vy", "spin", "growth"))
+SPRITE = Component(
+    "sprite",
+    (
+        "w", "h", "ox", "oy",
+        "r", "g", "b", "a",
+        "u0", "v0", "u1", "v1", "u2", "v2", "u3", "v3"
+    ),
+    (1, 1, 0, 0, 1, 1, 1, 1) + DEFAULT_UVS
+)
+COLLIDER = Component(
+    "collider",
+    ("left", "bottom", "right", "top"),
+    (0, 0, 1, 1)
+)
+
+
+#Functions
+#==============================================================================
+def movement_system(archetype, dt):
+    """Apply the velocity of every entity with a transform and a velocity.
+    The whole column is integrated in a single call.
+    """
+    transform = Vec4Array(archetype.column(TRANSFORM))
+    transform.add_scaled(Vec4Array(archetype.column(VELOCITY)), dt)
+
+
+def render_system(archetype, dt):
+    """Copy the transform and sprite of every entity into the sprite batch of
+    its archetype. Each field is copied with a strided slice, so no entity is
+    visited in Python. The sprite size and origin are multiplied by the
+    scale of the transform.
+    """
+    batch = archetype.batch
+
+    if batch is None:
+        return
+
+    n = len(archetype)
+    transform = archetype.column(TRANSFORM)
+    sprite = archetype.column(SPRITE)
+
+    #Gather the pos, size and origin of each entity
+    pos = array("f", bytes(n * 8))
+    pos[0::2] = transform[0::4]
+    pos[1::2] = transform[1::4]
+    size = array("f", bytes(n * 8))
+    size[0::2] = sprite[0::16]
+    size[1::2] = sprite[1::16]
+    origin = array("f", bytes(n * 8))
+    origin[0::2] = sprite[2::16]
+    origin[1::2] = sprite[3::16]
+
+    #Adjust the pos based on the parent pos
+    if batch.parent is not None:
+        px, py = batch.parent.pos
+
+        if px or py:
+            Vec2Array(pos).iadd(Vec2Array(array("f", (px, py)) * n))
+
+    #Apply the scale unless every entity is unscaled
+    scale = transform[3::4]
+
+    if scale.count(1) != n:
+        scale2 = array("f", bytes(n * 8))
+        scale2[0::2] = scale
+        scale2[1::2] = scale
+        Vec2Array(size).imul(Vec2Array(scale2))
+        Vec2Array(origin).imul(Vec2Array(scale2))
+
+    #Copy the state into the columns of the batch
+    batch._pos[:n * 2] = pos
+    batch._rot[:n] = transform[2::4]
+    batch._size[:n * 2] = size
+    batch._origin[:n * 2] = origin
+
+    for c in range(4):
+        batch._color[c:n * 4:4] = sprite[4 + c::16]
+
+    for c in range(8):
+        batch._uvs[c:n * 8:8] = sprite[8 + c::16]
+
+    batch.invalidate_all()
+
+
+def collider_bounds(archetype):
+    """Return an array("f") with the world bounds of each collider of the
+    given archetype as (x1, y1, x2, y2). Colliders are axis-aligned boxes
+    relative to the entity pos, so rotation and scale do not affect them.
+    """
+    bounds = array("f", archetype.column(TRANSFORM))
+    bounds[2::4] = bounds[0::4]
+    bounds[3::4] = bounds[1::4]
+    Vec4Array(bounds).iadd(Vec4Array(archetype.column(COLLIDER)))
+    return bounds
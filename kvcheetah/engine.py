@@ -0,0 +1,370 @@
+"""kvcheetah - Engine API"""
+
+from time import perf_counter
+from weakref import WeakKeyDictionary
+
+from kivy.clock import Clock
+
+try:
+    from .profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+
+#Globals
+#==============================================================================
+TICK_RATE = 60
+MAX_STEPS = 5
+
+
+#Functions
+#==============================================================================
+def lerp_angle(a, b, t):
+    """Interpolate between 2 angles in degrees along the shortest arc."""
+    delta = (b - a + 180) % 360 - 180
+    return a + delta * t
+
+
+#Classes
+#==============================================================================
+class GameLoop(object):
+    """Runs game logic at a fixed tick rate, independent of the frame rate.
+    Each frame the time since the last frame is added to an accumulator, and
+    the tick callback is called once for each whole tick in it. The number of
+    catch-up ticks per frame is capped, so a slow frame cannot stall the game.
+    The render callback is called with the fraction of a tick left in the
+    accumulator. Tracked sprites are drawn between their states of the last 2
+    ticks using that fraction, while their logic state stays untouched.
+    """
+    def __init__(self, **kwargs):
+        """Setup this game loop."""
+        self._tick_rate = TICK_RATE
+        self._max_steps = MAX_STEPS
+        self._tick_budget = None
+        self._render_budget = None
+        self._max_render_skip = 0
+        self._tick_cb = None
+        self._render_cb = None
+        self._event = None
+        self._accumulator = 0
+        self._alpha = 0
+        self._states = WeakKeyDictionary()
+
+        #Stats
+        self._ticks = 0
+        self._frames = 0
+        self._dropped_ticks = 0
+        self._skipped_renders = 0
+        self._skip_run = 0
+        self._tick_time = 0
+        self._render_time = 0
+
+        #Process keyword args
+        if "tick_rate" in kwargs:
+            self.tick_rate = kwargs["tick_rate"]
+
+        if "max_steps" in kwargs:
+            self.max_steps = kwargs["max_steps"]
+
+        if "tick_budget" in kwargs:
+            self.tick_budget = kwargs["tick_budget"]
+
+        if "render_budget" in kwargs:
+            self.render_budget = kwargs["render_budget"]
+
+        if "max_render_skip" in kwargs:
+            self.max_render_skip = kwargs["max_render_skip"]
+
+        if "tick_cb" in kwargs:
+            self.tick_cb = kwargs["tick_cb"]
+
+        if "render_cb" in kwargs:
+            self.render_cb = kwargs["render_cb"]
+
+    def __del__(self):
+        """Destroy this game loop."""
+        #Ensure that this game loop is stopped before destroying it
+        try:
+            self.stop()
+
+        except ReferenceError:
+            pass
+
+    def get_tick_rate(self):
+        """Get the number of logic ticks per second."""
+        return self._tick_rate
+
+    def set_tick_rate(self, value):
+        """Set the number of logic ticks per second."""
+        self._tick_rate = value
+
+    tick_rate = property(get_tick_rate, set_tick_rate)
+
+    def get_tick_dt(self):
+        """Get the length of a logic tick in seconds."""
+        return 1 / self._tick_rate
+
+    tick_dt = property(get_tick_dt)
+
+    def get_max_steps(self):
+        """Get the maximum number of logic ticks per frame."""
+        return self._max_steps
+
+    def set_max_steps(self, value):
+        """Set the maximum number of logic ticks per frame. Time beyond that is
+        dropped, which slows the game down instead of stalling it.
+        """
+        self._max_steps = value
+
+    max_steps = property(get_max_steps, set_max_steps)
+
+    def get_tick_budget(self):
+        """Get the maximum time in seconds spent on logic ticks per frame."""
+        return self._tick_budget
+
+    def set_tick_budget(self, value):
+        """Set the maximum time in seconds spent on logic ticks per frame. At
+        least 1 tick runs each frame that has one due. None disables the
+        budget.
+        """
+        self._tick_budget = value
+
+    tick_budget = property(get_tick_budget, set_tick_budget)
+
+    def get_render_budget(self):
+        """Get the frame time in seconds above which the render callback is
+        skipped.
+        """
+        return self._render_budget
+
+    def set_render_budget(self, value):
+        """Set the frame time in seconds above which the render callback is
+        skipped. When the logic ticks of a frame plus the last render take
+        longer than this, interpolation and the render callback are skipped
+        for up to max_render_skip frames in a row. Kivy still draws the canvas
+        of a skipped frame, with the tracked sprites in their logic state.
+        None disables the budget.
+        """
+        self._render_budget = value
+
+    render_budget = property(get_render_budget, set_render_budget)
+
+    def get_max_render_skip(self):
+        """Get the maximum number of render callbacks skipped in a row."""
+        return self._max_render_skip
+
+    def set_max_render_skip(self, value):
+        """Set the maximum number of render callbacks skipped in a row."""
+        self._max_render_skip = value
+
+    max_render_skip = property(get_max_render_skip, set_max_render_skip)
+
+    def get_tick_cb(self):
+        """Get the tick callback of this game loop."""
+        return self._tick_cb
+
+    def set_tick_cb(self, value):
+        """Set the tick callback of this game loop. It is called with the tick
+        length in seconds.
+        """
+        self._tick_cb = value
+
+    tick_cb = property(get_tick_cb, set_tick_cb)
+
+    def get_render_cb(self):
+        """Get the render callback of this game loop."""
+        return self._render_cb
+
+    def set_render_cb(self, value):
+        """Set the render callback of this game loop. It is called with the
+        fraction of a tick between the last tick and the frame.
+        """
+        self._render_cb = value
+
+    render_cb = property(get_render_cb, set_render_cb)
+
+    def get_running(self):
+        """Is this game loop running?"""
+        return self._event is not None
+
+    running = property(get_running)
+
+    def get_alpha(self):
+        """Get the fraction of a tick used to interpolate the last frame."""
+        return self._alpha
+
+    alpha = property(get_alpha)
+
+    def get_ticks(self):
+        """Get the number of logic ticks run."""
+        return self._ticks
+
+    ticks = property(get_ticks)
+
+    def get_frames(self):
+        """Get the number of frames run."""
+        return self._frames
+
+    frames = property(get_frames)
+
+    def get_dropped_ticks(self):
+        """Get the number of logic ticks dropped by the catch-up limits."""
+        return self._dropped_ticks
+
+    dropped_ticks = property(get_dropped_ticks)
+
+    def get_skipped_renders(self):
+        """Get the number of frames whose render callback was skipped."""
+        return self._skipped_renders
+
+    skipped_renders = property(get_skipped_renders)
+
+    def get_tick_time(self):
+        """Get the time in seconds spent on logic ticks in the last frame."""
+        return self._tick_time
+
+    tick_time = property(get_tick_time)
+
+    def get_render_time(self):
+        """Get the time in seconds spent on the last render step."""
+        return self._render_time
+
+    render_time = property(get_render_time)
+
+    def start(self):
+        """Start this game loop. It runs once per frame."""
+        if self._event is None:
+            self._accumulator = 0
+            self._event = Clock.schedule_interval(self.step, 0)
+
+    def stop(self):
+        """Stop this game loop."""
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def track(self, sprite):
+        """Interpolate the pos and rot of the given sprite between ticks."""
+        x, y = sprite.pos
+        state = (x, y, sprite.rot)
+        self._states[sprite] = [state, state, state]
+
+    def untrack(self, sprite):
+        """Stop interpolating the given sprite and restore its logic state."""
+        states = self._states.pop(sprite, None)
+
+        if states is not None:
+            self.apply(sprite, states[1])
+
+    def apply(self, sprite, state):
+        """Set the pos and rot of the given sprite."""
+        x, y, rot = state
+        sprite.pos = (x, y)
+        sprite.rot = rot
+
+    def sync(self, sprite, states):
+        """Adopt the state of a sprite that was moved outside of the game loop,
+        without interpolating towards it. Returns False if the sprite was
+        moved.
+        """
+        x, y = sprite.pos
+        state = (x, y, sprite.rot)
+
+        if state != states[2]:
+            states[0] = state
+            states[1] = state
+            states[2] = state
+            return False
+
+        return True
+
+    def restore(self):
+        """Put the tracked sprites back into their logic state before ticking.
+        A sprite that was moved since the last frame keeps its new state.
+        """
+        for sprite, states in list(self._states.items()):
+            if self.sync(sprite, states) and states[2] != states[1]:
+                self.apply(sprite, states[1])
+                states[2] = states[1]
+
+    def capture(self):
+        """Save the logic state of each tracked sprite after a tick."""
+        for sprite, states in list(self._states.items()):
+            x, y = sprite.pos
+            states[0] = states[1]
+            states[1] = (x, y, sprite.rot)
+            states[2] = states[1]
+
+    def interpolate(self, alpha):
+        """Draw each tracked sprite between its last 2 logic states."""
+        for sprite, states in list(self._states.items()):
+            if not self.sync(sprite, states) or states[0] == states[1]:
+                continue
+
+            x0, y0, rot0 = states[0]
+            x1, y1, rot1 = states[1]
+            state = (
+                x0 + (x1 - x0) * alpha,
+                y0 + (y1 - y0) * alpha,
+                lerp_angle(rot0, rot1, alpha)
+            )
+            self.apply(sprite, state)
+
+            #Read the state back, since a sprite may round it
+            x, y = sprite.pos
+            states[2] = (x, y, sprite.rot)
+
+    def step(self, dt):
+        """Run the logic ticks that are due and render the frame."""
+        tick_dt = 1 / self._tick_rate
+        self._accumulator += dt
+        self._frames += 1
+        steps = 0
+        start = perf_counter()
+
+        #Run the logic ticks that are due
+        if self._accumulator >= tick_dt:
+            self.restore()
+
+            while self._accumulator >= tick_dt:
+                #Drop the backlog once a catch-up limit is reached
+                if steps >= self._max_steps or (
+                    steps > 0 and self._tick_budget is not None and
+                    perf_counter() - start >= self._tick_budget):
+                    dropped = int(self._accumulator / tick_dt)
+                    self._dropped_ticks += dropped
+                    self._accumulator -= dropped * tick_dt
+                    break
+
+                if self._tick_cb is not None:
+                    self._tick_cb(tick_dt)
+
+                self.capture()
+                self._accumulator -= tick_dt
+                self._ticks += 1
+                steps += 1
+
+        self._tick_time = perf_counter() - start
+        PROFILER.add_time("update", int(self._tick_time * 1000000000))
+        self._alpha = self._accumulator / tick_dt
+
+        #Skip the render callback while the frame is over budget. Kivy still
+        #draws the canvas.
+        if (self._render_budget is not None and
+            self._skip_run < self._max_render_skip and
+            self._tick_time + self._render_time > self._render_budget):
+            self._skip_run += 1
+            self._skipped_renders += 1
+            return
+
+        #Render the frame
+        self._skip_run = 0
+        start = perf_counter()
+        self.interpolate(self._alpha)
+
+        if self._render_cb is not None:
+            self._render_cb(self._alpha)
+
+        self._render_time = perf_counter() - start
+        PROFILER.add_time("render", int(self._render_time * 1000000000))
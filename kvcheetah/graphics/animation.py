@@ -0,0 +1,282 @@
+"""kvcheetah - SpriteAnimation API"""
+
+from array import array
+from bisect import bisect_right
+from weakref import WeakKeyDictionary
+
+try:
+    from ..profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+try:
+    from .atlas import AtlasCache
+
+except ImportError:
+    from atlas import AtlasCache
+
+
+#Globals
+#==============================================================================
+LOOP_MODES = ("loop", "once", "pingpong")
+ATLAS_CACHE = AtlasCache()
+
+
+#Classes
+#==============================================================================
+class SpriteAnimation(object):
+    """An animation clip made of texture regions. Each frame can be a URI or a
+    texture. The frames are resolved and their texture coords are copied the
+    first time the clip is played, so advancing a sprite to another frame only
+    swaps its texture coords. Valid loop modes are: "loop", "once" and
+    "pingpong".
+    """
+    def __init__(self, **kwargs):
+        """Setup this sprite animation."""
+        self._frames = []
+        self._durations = [.1]
+        self._mode = "loop"
+        self._cache = ATLAS_CACHE
+        self._textures = None
+        self._coords = None
+        self._pages = None
+        self._sequence = None
+        self._ends = None
+        self._length = 0
+
+        #Process keyword args
+        if "frames" in kwargs:
+            self.frames = kwargs["frames"]
+
+        if "durations" in kwargs:
+            self.durations = kwargs["durations"]
+
+        if "mode" in kwargs:
+            self.mode = kwargs["mode"]
+
+        if "cache" in kwargs:
+            self.cache = kwargs["cache"]
+
+    def __len__(self):
+        """Get the number of frames in this sprite animation."""
+        return len(self._frames)
+
+    def get_frames(self):
+        """Get the frames of this sprite animation."""
+        return self._frames
+
+    def set_frames(self, value):
+        """Set the frames of this sprite animation."""
+        self._frames = list(value)
+        self.invalidate()
+
+    frames = property(get_frames, set_frames)
+
+    def get_durations(self):
+        """Get the duration of each frame in seconds."""
+        return self._durations
+
+    def set_durations(self, value):
+        """Set the duration of each frame in seconds. A single number is used
+        for every frame.
+        """
+        if isinstance(value, (int, float)):
+            value = [value]
+
+        self._durations = list(value)
+        self.invalidate()
+
+    durations = property(get_durations, set_durations)
+
+    def get_mode(self):
+        """Get the loop mode of this sprite animation."""
+        return self._mode
+
+    def set_mode(self, value):
+        """Set the loop mode of this sprite animation."""
+        if value not in LOOP_MODES:
+            raise ValueError(
+                "SpriteAnimation: No such loop mode '{}'".format(value))
+
+        self._mode = value
+        self.invalidate()
+
+    mode = property(get_mode, set_mode)
+
+    def get_cache(self):
+        """Get the atlas cache that resolves the frames of this sprite
+        animation.
+        """
+        return self._cache
+
+    def set_cache(self, value):
+        """Set the atlas cache that resolves the frames of this sprite
+        animation.
+        """
+        self._cache = value
+        self.invalidate()
+
+    cache = property(get_cache, set_cache)
+
+    def get_textures(self):
+        """Get the texture of each frame."""
+        self.resolve()
+        return self._textures
+
+    textures = property(get_textures)
+
+    def get_coords(self):
+        """Get the texture coords of each frame as an array("f")."""
+        self.resolve()
+        return self._coords
+
+    coords = property(get_coords)
+
+    def get_pages(self):
+        """Get the id of the texture that each frame is drawn from."""
+        self.resolve()
+        return self._pages
+
+    pages = property(get_pages)
+
+    def get_length(self):
+        """Get the length of 1 pass through this sprite animation in
+        seconds.
+        """
+        self.resolve()
+        return self._length
+
+    length = property(get_length)
+
+    def invalidate(self):
+        """Resolve the frames of this sprite animation again when it is next
+        used.
+        """
+        self._textures = None
+
+    def resolve(self):
+        """Resolve the frames of this sprite animation and build its
+        timeline.
+        """
+        if self._textures is not None:
+            return
+
+        if not self._frames:
+            raise ValueError("SpriteAnimation: Animation has no frames.")
+
+        #Resolve the textures of the frames
+        self._textures = [
+            self._cache.get(frame) if isinstance(frame, str) else frame
+            for frame in self._frames
+        ]
+        self._coords = [array("f", texture.tex_coords)
+            for texture in self._textures]
+        self._pages = [texture.id for texture in self._textures]
+
+        #Build the frame sequence. Ping-pong clips play the inner frames again
+        #in reverse.
+        n = len(self._frames)
+        self._sequence = list(range(n))
+
+        if self._mode == "pingpong":
+            self._sequence += list(range(n - 2, 0, -1))
+
+        #Find the end time of each step of the sequence
+        durations = self._durations
+        self._ends = []
+        t = 0
+
+        for frame in self._sequence:
+            t += durations[frame] if frame < len(durations) else durations[-1]
+            self._ends.append(t)
+
+        self._length = t
+
+    def frame_at(self, t):
+        """Return the frame shown at the given time in seconds and whether the
+        animation has finished.
+        """
+        self.resolve()
+
+        #Clips that play once stop on their last frame
+        if self._mode == "once":
+            if t >= self._length:
+                return (self._sequence[-1], True)
+
+        elif self._length > 0:
+            t %= self._length
+
+        step = min(bisect_right(self._ends, t), len(self._sequence) - 1)
+        return (self._sequence[step], False)
+
+
+class SpriteAnimator(object):
+    """Plays sprite animations on many sprites. Each update advances every
+    sprite and only swaps the texture coords of the sprites whose frame
+    changed. The texture of a sprite is only replaced when a frame comes from
+    another texture than the previous one. This works with both sprites and
+    batch sprites. Sprites are held weakly, so a sprite that is destroyed
+    stops playing.
+    """
+    def __init__(self):
+        """Setup this sprite animator."""
+        self._playing = WeakKeyDictionary()
+
+    def __len__(self):
+        """Get the number of sprites playing an animation."""
+        return len(self._playing)
+
+    def __contains__(self, sprite):
+        """Check if the given sprite is playing an animation."""
+        return sprite in self._playing
+
+    def play(self, sprite, clip, callback = None):
+        """Play a sprite animation on the given sprite. The callback is called
+        with the sprite when a clip that plays once has finished.
+        """
+        #Bind the texture of the first frame
+        frame, done = clip.frame_at(0)
+        sprite.texture = clip.textures[frame]
+        self._playing[sprite] = [clip, 0, frame, callback]
+
+    def stop(self, sprite):
+        """Stop the animation of the given sprite. The sprite keeps its current
+        frame.
+        """
+        self._playing.pop(sprite, None)
+
+    def clear(self):
+        """Stop every animation."""
+        self._playing = WeakKeyDictionary()
+
+    @PROFILER.profile("animation")
+    def update(self, dt):
+        """Advance every animation by the given number of seconds."""
+        finished = []
+
+        for sprite, state in self._playing.items():
+            clip, t, current, callback = state
+            t += dt
+            state[1] = t
+            frame, done = clip.frame_at(t)
+
+            #Swap the frame
+            if frame != current:
+                if clip._pages[frame] == clip._pages[current]:
+                    sprite.tex_coords = clip._coords[frame]
+
+                else:
+                    sprite.texture = clip._textures[frame]
+
+                state[2] = frame
+
+            if done:
+                finished.append(sprite)
+
+        #Remove finished animations
+        for sprite in finished:
+            callback = self._playing.pop(sprite)[3]
+
+            if callback is not None:
+                callback(sprite)
@@ -0,0 +1,503 @@
+"""kvcheetah - AtlasBuilder API"""
+
+import hashlib
+import json
+import os
+
+from kivy.atlas import Atlas
+from kivy.core.image import Image as CoreImage
+from kivy.graphics.texture import Texture
+from kivy.logger import Logger
+from kivy.resources import resource_find
+
+
+#Globals
+#==============================================================================
+ATLAS_SIZE = 1024
+ATLAS_PADDING = 2
+
+
+#Functions
+#==============================================================================
+def next_pot(value):
+    """Return the smallest power of 2 that is at least the given value."""
+    pot = 1
+
+    while pot < value:
+        pot *= 2
+
+    return pot
+
+
+def hash_file(filename):
+    """Return the SHA-1 digest of the contents of the given file."""
+    sha = hashlib.sha1()
+
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def flip_rows(pixels, w, h):
+    """Return a copy of the given RGBA pixels with the order of the rows
+    reversed.
+    """
+    stride = w * 4
+    return b"".join(pixels[y * stride:(y + 1) * stride]
+        for y in range(h - 1, -1, -1))
+
+
+#Classes
+#==============================================================================
+class SkylinePacker(object):
+    """Packs rectangles into a fixed size area with the skyline bottom-left
+    heuristic. The skyline is a list of [x, y, width] segments that track the
+    top edge of the packed rectangles.
+    """
+    def __init__(self, width, height):
+        """Setup this skyline packer."""
+        self._width = width
+        self._height = height
+        self._skyline = [[0, 0, width]]
+        self._used = (0, 0)
+
+    def get_size(self):
+        """Get the size of the area of this skyline packer."""
+        return (self._width, self._height)
+
+    size = property(get_size)
+
+    def get_used(self):
+        """Get the size of the part of the area that holds rectangles."""
+        return self._used
+
+    used = property(get_used)
+
+    def fit(self, i, w, h):
+        """Return the y coord a rectangle would get if placed at the start of
+        the given skyline segment, or -1 if it does not fit there.
+        """
+        skyline = self._skyline
+        x = skyline[i][0]
+
+        if x + w > self._width:
+            return -1
+
+        #The rectangle rests on the highest segment below it
+        left = w
+        y = 0
+
+        while left > 0:
+            sx, sy, sw = skyline[i]
+            y = max(y, sy)
+
+            if y + h > self._height:
+                return -1
+
+            left -= sw
+            i += 1
+
+        return y
+
+    def insert(self, w, h):
+        """Place a rectangle and return its (x, y) coords, or None if it does
+        not fit.
+        """
+        #Find the placement with the lowest top edge, then the lowest x
+        skyline = self._skyline
+        best = None
+
+        for i in range(len(skyline)):
+            y = self.fit(i, w, h)
+
+            if y >= 0:
+                key = (y + h, skyline[i][0])
+
+                if best is None or key < best[0]:
+                    best = (key, i, y)
+
+        if best is None:
+            return None
+
+        #Raise the skyline under the new rectangle
+        key, i, y = best
+        x = skyline[i][0]
+        skyline.insert(i, [x, y + h, w])
+        end = x + w
+        j = i + 1
+
+        while j < len(skyline):
+            sx, sy, sw = skyline[j]
+
+            if sx >= end:
+                break
+
+            if sx + sw <= end:
+                del skyline[j]
+                continue
+
+            skyline[j] = [end, sy, sx + sw - end]
+            break
+
+        #Merge neighboring segments of the same height
+        for k in range(len(skyline) - 1, 0, -1):
+            if skyline[k - 1][1] == skyline[k][1]:
+                skyline[k - 1][2] += skyline[k][2]
+                del skyline[k]
+
+        uw, uh = self._used
+        self._used = (max(uw, end), max(uh, y + h))
+        return (x, y)
+
+
+class AtlasBuilder(object):
+    """Packs loose images into 1 or more power of 2 textures at runtime, so
+    sprites using them can share a texture like sprites using a bundled atlas.
+    If a cache dir is given, the packed pages are saved as a regular Kivy atlas
+    named after a hash of the sources, and later builds with the same sources
+    load that atlas instead of packing again.
+    """
+    def __init__(self, **kwargs):
+        """Setup this atlas builder."""
+        self._sources = []
+        self._size = ATLAS_SIZE
+        self._padding = ATLAS_PADDING
+        self._cache_dir = None
+        self._name = "atlas"
+        self._textures = {}
+        self._pages = []
+
+        #Process keyword args
+        if "sources" in kwargs:
+            self.sources = kwargs["sources"]
+
+        if "size" in kwargs:
+            self.size = kwargs["size"]
+
+        if "padding" in kwargs:
+            self.padding = kwargs["padding"]
+
+        if "cache_dir" in kwargs:
+            self.cache_dir = kwargs["cache_dir"]
+
+        if "name" in kwargs:
+            self.name = kwargs["name"]
+
+    def get_sources(self):
+        """Get the image files packed by this atlas builder."""
+        return self._sources
+
+    def set_sources(self, value):
+        """Set the image files packed by this atlas builder."""
+        self._sources = list(value)
+
+    sources = property(get_sources, set_sources)
+
+    def get_size(self):
+        """Get the maximum size of each page of this atlas builder."""
+        return self._size
+
+    def set_size(self, value):
+        """Set the maximum size of each page of this atlas builder. This is
+        rounded up to a power of 2.
+        """
+        self._size = next_pot(value)
+
+    size = property(get_size, set_size)
+
+    def get_padding(self):
+        """Get the number of empty pixels around each image."""
+        return self._padding
+
+    def set_padding(self, value):
+        """Set the number of empty pixels around each image."""
+        self._padding = value
+
+    padding = property(get_padding, set_padding)
+
+    def get_cache_dir(self):
+        """Get the dir that packed atlases are cached in."""
+        return self._cache_dir
+
+    def set_cache_dir(self, value):
+        """Set the dir that packed atlases are cached in. None disables the
+        cache.
+        """
+        self._cache_dir = value
+
+    cache_dir = property(get_cache_dir, set_cache_dir)
+
+    def get_name(self):
+        """Get the name prefix of the cached atlas files."""
+        return self._name
+
+    def set_name(self, value):
+        """Set the name prefix of the cached atlas files."""
+        self._name = value
+
+    name = property(get_name, set_name)
+
+    def get_textures(self):
+        """Get a dict that maps each source to its region texture."""
+        return self._textures
+
+    textures = property(get_textures)
+
+    def get_pages(self):
+        """Get the page textures of the last build."""
+        return self._pages
+
+    pages = property(get_pages)
+
+    def add(self, source):
+        """Add an image file to this atlas builder."""
+        if source not in self._sources:
+            self._sources.append(source)
+
+    def cache_key(self):
+        """Return a key that changes whenever the sources, their contents or
+        the packing settings change.
+        """
+        sha = hashlib.sha1()
+        sha.update("{}:{}".format(self._size, self._padding).encode("utf-8"))
+
+        for source in self._sources:
+            sha.update(source.encode("utf-8"))
+            sha.update(hash_file(source).encode("utf-8"))
+
+        return sha.hexdigest()[:16]
+
+    def get_atlas_filename(self, key):
+        """Return the filename of the cached atlas with the given key."""
+        return os.path.join(self._cache_dir, "{}-{}.atlas".format(
+            self._name, key))
+
+    def get_ids(self):
+        """Return a unique atlas id for each source."""
+        ids = []
+        used = set()
+
+        for source in self._sources:
+            base = os.path.splitext(os.path.basename(source))[0]
+            uid = base
+            n = 1
+
+            while uid in used:
+                uid = "{}-{}".format(base, n)
+                n += 1
+
+            used.add(uid)
+            ids.append(uid)
+
+        return ids
+
+    def pack(self, sizes):
+        """Pack the given list of (w, h) sizes. Returns a list of
+        (page, x, y) for each size and a list of the size of each page.
+        """
+        pad = self._padding
+        packers = []
+        placements = [None] * len(sizes)
+
+        #Place the tallest images first
+        order = sorted(range(len(sizes)), key = lambda i: -sizes[i][1])
+
+        for i in order:
+            w, h = sizes[i]
+            pos = None
+
+            for page, packer in enumerate(packers):
+                pos = packer.insert(w + pad * 2, h + pad * 2)
+
+                if pos is not None:
+                    break
+
+            #Start a new page if no page has room
+            if pos is None:
+                packer = SkylinePacker(self._size, self._size)
+                packers.append(packer)
+                page = len(packers) - 1
+                pos = packer.insert(w + pad * 2, h + pad * 2)
+
+                if pos is None:
+                    raise ValueError(
+                        "AtlasBuilder: Image is larger than a page: {}".format(
+                        self._sources[i]))
+
+            placements[i] = (page, pos[0] + pad, pos[1] + pad)
+
+        #Shrink each page to the smallest power of 2 that holds its images
+        page_sizes = [(next_pot(packer.used[0]), next_pot(packer.used[1]))
+            for packer in packers]
+        return placements, page_sizes
+
+    def build(self):
+        """Pack the sources and return a dict that maps each source to its
+        region texture.
+        """
+        #Load a cached atlas if possible
+        key = None
+
+        if self._cache_dir is not None:
+            key = self.cache_key()
+            filename = self.get_atlas_filename(key)
+
+            if os.path.exists(filename):
+                self.load(filename)
+                return self._textures
+
+        #Pack the images
+        textures = [CoreImage(source).texture for source in self._sources]
+        sizes = [(int(tex.width), int(tex.height)) for tex in textures]
+        placements, page_sizes = self.pack(sizes)
+
+        #Copy each image into its page
+        self._pages = []
+
+        for w, h in page_sizes:
+            page = Texture.create(size = (w, h), colorfmt = "rgba")
+            page.blit_buffer(bytes(w * h * 4), colorfmt = "rgba",
+                bufferfmt = "ubyte")
+            self._pages.append(page)
+
+        self._textures = {}
+
+        for source, tex, size, place in zip(self._sources, textures, sizes,
+            placements):
+            #The pixels of an image start with the top row, but the pages
+            #have their origin at the bottom left
+            page, x, y = place
+            self._pages[page].blit_buffer(flip_rows(tex.pixels, *size),
+                size = size, colorfmt = "rgba", bufferfmt = "ubyte",
+                pos = (x, y))
+            self._textures[source] = self._pages[page].get_region(x, y, *size)
+
+        #Save the packed atlas
+        if key is not None:
+            try:
+                self.save(key, sizes, placements)
+
+            except (IOError, OSError) as e:
+                Logger.warning(
+                    "AtlasBuilder: Failed to cache atlas: {}".format(e))
+
+        return self._textures
+
+    def save(self, key, sizes, placements):
+        """Save the pages of the last build as a Kivy atlas."""
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        meta = {}
+        ids = self.get_ids()
+        pages = []
+
+        for i, page in enumerate(self._pages):
+            pagename = "{}-{}-{}.png".format(self._name, key, i)
+            page.save(os.path.join(self._cache_dir, pagename))
+            pages.append(pagename)
+            meta[pagename] = {}
+
+        for uid, size, place in zip(ids, sizes, placements):
+            page, x, y = place
+            meta[pages[page]][uid] = [x, y, size[0], size[1]]
+
+        with open(self.get_atlas_filename(key), "w") as f:
+            json.dump(meta, f)
+
+    def load(self, filename):
+        """Load the region textures of a cached atlas."""
+        atlas = Atlas(filename)
+        ids = self.get_ids()
+        self._textures = {}
+
+        for source, uid in zip(self._sources, ids):
+            self._textures[source] = atlas[uid]
+
+        self._pages = list(atlas.original_textures)
+
+
+class AtlasCache(object):
+    """Resolves image and atlas URIs to textures once and keeps them. The first
+    URI of an atlas loads the whole atlas, so every region of that atlas is
+    resolved with a single load. Resolved textures can be assigned to sprites
+    without going through the string parsing and image cache of Kivy again.
+    """
+    def __init__(self):
+        """Setup this atlas cache."""
+        self._textures = {}
+        self._atlases = set()
+
+    def __len__(self):
+        """Get the number of textures in this atlas cache."""
+        return len(self._textures)
+
+    def __contains__(self, uri):
+        """Check if the given URI has been resolved by this atlas cache."""
+        return uri in self._textures
+
+    def __getitem__(self, uri):
+        """Get the texture of the given URI."""
+        return self.get(uri)
+
+    def get(self, uri):
+        """Get the texture of the given URI, loading it if needed."""
+        try:
+            return self._textures[uri]
+
+        except KeyError:
+            pass
+
+        #Load every region of an atlas at once
+        if uri.startswith("atlas://"):
+            path = uri[8:].rpartition("/")[0]
+
+            if path not in self._atlases:
+                self.add_atlas(path)
+
+            if uri not in self._textures:
+                raise KeyError(
+                    "AtlasCache: No such atlas region '{}'".format(uri))
+
+        #Load a plain image
+        else:
+            self._textures[uri] = CoreImage(uri).texture
+
+        return self._textures[uri]
+
+    def resolve(self, uris):
+        """Return a list with the texture of each of the given URIs."""
+        return [self.get(uri) for uri in uris]
+
+    def add(self, uri, texture):
+        """Add a texture under the given URI."""
+        self._textures[uri] = texture
+
+    def add_textures(self, textures):
+        """Add a dict that maps URIs to textures, such as the textures built by
+        an atlas builder.
+        """
+        self._textures.update(textures)
+
+    def add_atlas(self, path):
+        """Load an atlas and add each of its regions as
+        "atlas://<path>/<id>". The path does not include the .atlas
+        extension.
+        """
+        filename = resource_find("{}.atlas".format(path))
+
+        if filename is None:
+            raise KeyError("AtlasCache: No such atlas '{}'".format(path))
+
+        atlas = Atlas(filename)
+        self._atlases.add(path)
+
+        for uid, texture in atlas.textures.items():
+            self._textures["atlas://{}/{}".format(path, uid)] = texture
+
+    def clear(self):
+        """Forget every texture of this atlas cache."""
+        self._textures = {}
+        self._atlases = set()
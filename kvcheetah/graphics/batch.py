@@ -0,0 +1,494 @@
+"""kvcheetah - SpriteBatch API"""
+
+from array import array
+
+from kivy.clock import Clock
+from kivy.core.image import Image as CoreImage
+from kivy.graphics import Mesh, RenderContext
+from kivy.logger import Logger
+
+try:
+    from ..math.quads import build_quads, cull_quads
+    from ..profiler import PROFILER
+
+except ImportError:
+    from kvcheetah.math.quads import build_quads, cull_quads
+    from profiler import PROFILER
+
+try:
+    from .sprite import view_rect
+    from .store import SpriteStore, StoreSprite
+
+except ImportError:
+    from sprite import view_rect
+    from store import SpriteStore, StoreSprite
+
+
+#Globals
+#==============================================================================
+BATCH_VS = """
+$HEADER$
+
+attribute vec4 vColor;
+
+void main(void) {
+    frag_color = vColor * color * vec4(1.0, 1.0, 1.0, opacity);
+    tex_coord0 = vTexCoords0;
+    gl_Position = projection_mat * modelview_mat * vec4(vPosition.xy, 0.0, 1.0);
+}
+"""
+BATCH_FS = """
+$HEADER$
+
+void main(void) {
+    gl_FragColor = frag_color * texture2D(texture0, tex_coord0);
+}
+"""
+BATCH_FMT = [
+    (b"vPosition", 2, "float"),
+    (b"vTexCoords0", 2, "float"),
+    (b"vColor", 4, "float")
+]
+VERTEX_SIZE = 8
+QUAD_SIZE = 4 * VERTEX_SIZE
+MAX_SPRITES = 65536 // 4 #Unsigned short indices can address 65536 vertices
+EMPTY_QUAD = array("f", [0] * QUAD_SIZE)
+DEFAULT_UVS = (0, 0, 1, 0, 1, 1, 0, 1)
+
+
+#Classes
+#==============================================================================
+class SpriteBatch(SpriteStore):
+    """A sprite store whose sprites share a texture and are drawn with a single
+    mesh. The culling pass collapses the quads of sprites whose bounds are
+    outside the visible area of the parent.
+    """
+    def __init__(self, **kwargs):
+        """Setup this sprite batch."""
+        self._visible = False
+        self._texture = None
+        self._source = None
+
+        #Per-sprite render state
+        self._color = array("f")
+        self._uvs = array("f")
+        self._culled = array("B")
+
+        #Culling state
+        self._cull_margin = 0
+        self._auto_cull = False
+        self._cull_event = None
+        self._culled_count = 0
+        self._drawn_count = 0
+
+        #Render state
+        self._capacity = 0
+        self._dirty = set()
+        self._rebuild = False
+        self._moved = False
+        self._vertices = array("f")
+        self._indices = array("H")
+        self._quad_size = QUAD_SIZE
+        self._empty_quad = EMPTY_QUAD
+        self._ctx = None
+        self._mesh = None
+        self.setup_context()
+        self._trigger = Clock.create_trigger(self.update)
+
+        super(SpriteBatch, self).__init__(**kwargs)
+
+        #Process keyword args
+        if "texture" in kwargs:
+            self.texture = kwargs["texture"]
+
+        if "source" in kwargs:
+            self.source = kwargs["source"]
+
+        if "cull_margin" in kwargs:
+            self.cull_margin = kwargs["cull_margin"]
+
+        if "auto_cull" in kwargs:
+            self.auto_cull = kwargs["auto_cull"]
+
+    def __del__(self):
+        """Destroy this sprite batch."""
+        #Ensure that this sprite batch is hidden before destroying it
+        try:
+            self.show(False)
+
+        except ReferenceError:
+            pass
+
+    def setup_context(self):
+        """Create the render context and mesh of this sprite batch."""
+        self._ctx = RenderContext(
+            vs = BATCH_VS,
+            fs = BATCH_FS,
+            use_parent_projection = True,
+            use_parent_modelview = True
+        )
+        self._mesh = Mesh(fmt = BATCH_FMT, mode = "triangles")
+        self._ctx.add(self._mesh)
+        self._quad_size = QUAD_SIZE
+        self._empty_quad = EMPTY_QUAD
+
+    def set_parent(self, value):
+        """Set the parent of this sprite batch."""
+        #Ensure that this sprite batch is hidden
+        if self.visible:
+            self.show(False)
+
+        #Change the parent
+        self._parent = value
+
+    parent = property(SpriteStore.get_parent, set_parent)
+
+    def get_visible(self):
+        """Is this sprite batch visible?"""
+        return self._visible
+
+    visible = property(get_visible)
+
+    def get_texture(self):
+        """Get the texture shared by the sprites in this sprite batch."""
+        return self._texture
+
+    def set_texture(self, value):
+        """Set the texture shared by the sprites in this sprite batch."""
+        self._texture = value
+        self._source = None
+        self._mesh.texture = value
+
+    texture = property(get_texture, set_texture)
+
+    def get_source(self):
+        """Get the source image of the texture of this sprite batch."""
+        return self._source
+
+    def set_source(self, value):
+        """Set the texture of this sprite batch from an image or atlas
+        source.
+        """
+        self.texture = CoreImage(value).texture
+        self._source = value
+
+    source = property(get_source, set_source)
+
+    def get_cull_margin(self):
+        """Get the distance that sprites can be outside the visible area
+        before they are culled.
+        """
+        return self._cull_margin
+
+    def set_cull_margin(self, value):
+        """Set the distance that sprites can be outside the visible area
+        before they are culled.
+        """
+        self._cull_margin = value
+
+    cull_margin = property(get_cull_margin, set_cull_margin)
+
+    def get_auto_cull(self):
+        """Does this sprite batch run the culling pass every frame?"""
+        return self._auto_cull
+
+    def set_auto_cull(self, value):
+        """Set whether this sprite batch runs the culling pass every frame
+        while it is visible.
+        """
+        self._auto_cull = value
+        self.schedule_cull()
+
+    auto_cull = property(get_auto_cull, set_auto_cull)
+
+    def get_culled(self):
+        """Get the number of sprites skipped by the last culling pass."""
+        return self._culled_count
+
+    culled = property(get_culled)
+
+    def get_drawn(self):
+        """Get the number of sprites drawn after the last culling pass."""
+        return self._drawn_count
+
+    drawn = property(get_drawn)
+
+    def show(self, do_show):
+        """Show/hide this sprite batch."""
+        #Ensure that this sprite batch has a parent
+        if self.parent is None:
+            Logger.warning("SpriteBatch: No parent assigned to sprite batch.")
+            return
+
+        #Show this sprite batch
+        if do_show and not self.visible:
+            self.parent.canvas.add(self._ctx)
+
+        #Hide this sprite batch
+        elif not do_show and self.visible:
+            self.parent.canvas.remove(self._ctx)
+
+        #Update visibility state
+        self._visible = do_show
+        self.schedule_cull()
+
+    def clone(self, **kwargs):
+        """Create an empty sprite batch with the parent, texture and culling
+        settings of this sprite batch. The keyword args override settings. The
+        new sprite batch is shown if this sprite batch is visible.
+        """
+        settings = {
+            "parent": self.parent,
+            "cull_margin": self._cull_margin,
+            "auto_cull": self._auto_cull
+        }
+        settings.update(kwargs)
+        batch = type(self)(**settings)
+
+        if self._texture is not None:
+            batch.texture = self._texture
+            batch._source = self._source
+
+        if self.visible and batch.parent is not None:
+            batch.show(True)
+
+        return batch
+
+    def schedule_cull(self):
+        """Start or stop the automatic culling pass."""
+        run = self._auto_cull and self._visible
+
+        if run and self._cull_event is None:
+            self._cull_event = Clock.schedule_interval(self.cull, 0)
+
+        elif not run and self._cull_event is not None:
+            self._cull_event.cancel()
+            self._cull_event = None
+
+    @PROFILER.profile("cull")
+    def cull(self, *args):
+        """Cull the sprites whose bounds are outside the visible area of the
+        parent. Only the quads of sprites whose visibility changed are
+        rebuilt.
+        """
+        if self.parent is None:
+            return
+
+        #The rows hold parent coords offset by the parent pos
+        x1, y1, x2, y2 = view_rect(self.parent, self._cull_margin)
+        px, py = self.parent.pos
+        x1 += px
+        y1 += py
+        x2 += px
+        y2 += py
+        drawn, culled, rows = cull_quads(self._pos, self._origin, self._size,
+            self._rot, self._shown, self._culled, self._count, x1, y1, x2, y2)
+
+        #Only the rows whose culled flag flipped need a rebuild
+        if len(rows) > 0:
+            self._dirty.update(rows)
+            self._trigger()
+
+        self._culled_count = culled
+        self._drawn_count = drawn
+
+    def grow(self):
+        """Append a row to each column of this sprite batch."""
+        if self._count >= MAX_SPRITES:
+            raise OverflowError(
+                "SpriteBatch: Cannot hold more than {} sprites.".format(
+                    MAX_SPRITES))
+
+        super(SpriteBatch, self).grow()
+        self._color.extend((1, 1, 1, 1))
+        self._uvs.extend(DEFAULT_UVS)
+        self._culled.append(0)
+
+        if self._count + 1 > self._capacity:
+            self.reserve(self._capacity * 2)
+
+    def reset(self, i):
+        """Reset the given row of this sprite batch to its default state."""
+        super(SpriteBatch, self).reset(i)
+        self._color[i * 4:i * 4 + 4] = array("f", (1, 1, 1, 1))
+        self._uvs[i * 8:i * 8 + 8] = array("f", DEFAULT_UVS)
+        self._culled[i] = 0
+
+    def reserve(self, capacity):
+        """Grow the vertex and index buffers of this sprite batch so they can
+        hold the given number of sprites.
+        """
+        capacity = min(max(capacity, 64), MAX_SPRITES)
+
+        if capacity <= self._capacity:
+            return
+
+        #The mesh keeps a view of the current buffers, which prevents them from
+        #being resized in place. So we copy them into larger buffers instead.
+        vertices = array("f", self._vertices)
+        vertices.extend(self._empty_quad * (capacity - self._capacity))
+        indices = array("H", self._indices)
+
+        for i in range(self._capacity, capacity):
+            base = i * 4
+            indices.extend((
+                base, base + 1, base + 2,
+                base + 2, base + 3, base
+            ))
+
+        self._vertices = vertices
+        self._indices = indices
+        self._capacity = capacity
+
+    def invalidate(self, i):
+        """Flag the given row for a vertex rebuild on the next frame."""
+        self._dirty.add(i)
+        self._trigger()
+
+    def invalidate_all(self):
+        """Flag every row for a vertex rebuild on the next frame."""
+        self._rebuild = True
+        self._trigger()
+
+    def invalidate_pos(self):
+        """Flag the position of every row for a rebuild on the next frame."""
+        self._moved = True
+        self._trigger()
+
+    def build_all(self):
+        """Write the vertices of every row into the vertex buffer."""
+        self.build_rows(None)
+
+    def build_rows(self, rows):
+        """Write the vertices of the given rows into the vertex buffer. The
+        quads are built by a typed loop over the sprite columns.
+        """
+        build_quads(self._vertices, self._pos, self._origin, self._size,
+            self._rot, self._color, self._uvs, self._shown, self._culled,
+            self._count, rows)
+
+    def build_quad(self, i):
+        """Write the vertices of the given row into the vertex buffer."""
+        self.build_rows((i,))
+
+    def build_pos(self):
+        """Move the corners of every row in the vertex buffer. This only reads
+        the columns that place the corners.
+        """
+        build_quads(self._vertices, self._pos, self._origin, self._size,
+            self._rot, self._color, self._uvs, self._shown, self._culled,
+            self._count, None, True)
+
+    @PROFILER.profile("batch")
+    def update(self, *args):
+        """Rebuild the vertices of every changed sprite and upload them."""
+        #Skip this if nothing changed
+        if not self._rebuild and not self._moved and len(self._dirty) == 0:
+            return
+
+        #Rebuild every quad after a bulk update
+        if self._rebuild:
+            self.build_all()
+
+        #Otherwise only move every quad after a bulk move and rebuild the
+        #changed quads
+        else:
+            if self._moved:
+                self.build_pos()
+
+            if len(self._dirty) > 0:
+                self.build_rows(self._dirty)
+
+        self._rebuild = False
+        self._moved = False
+        self._dirty.clear()
+
+        #Upload the vertex data of every row in use. Kivy cannot read an empty
+        #memoryview.
+        n = self._count
+
+        if n == 0:
+            self._mesh.vertices = []
+            self._mesh.indices = []
+            return
+
+        self._mesh.vertices = memoryview(self._vertices)[:n * self._quad_size]
+        self._mesh.indices = memoryview(self._indices)[:n * 6]
+
+
+class BatchSprite(StoreSprite):
+    """A sprite whose state is stored in and drawn by a sprite batch."""
+    def __init__(self, **kwargs):
+        """Setup this sprite."""
+        kwargs["store"] = kwargs["batch"]
+        super(BatchSprite, self).__init__(**kwargs)
+
+    def get_batch(self):
+        """Get the batch of this sprite."""
+        return self._store
+
+    batch = property(get_batch)
+
+    def get_culled(self):
+        """Is this sprite skipped by the culling pass of its batch?"""
+        return bool(self._store._culled[self._index])
+
+    culled = property(get_culled)
+
+    def get_color(self):
+        """Get the color of this sprite."""
+        i = self._index * 4
+        return tuple(self._store._color[i:i + 4])
+
+    def set_color(self, value):
+        """Set the color of this sprite."""
+        i = self._index * 4
+        self._store._color[i:i + 4] = array("f", value)
+        self._store.invalidate(self._index)
+
+    color = property(get_color, set_color)
+
+    def get_texture(self):
+        """Get the texture for this sprite."""
+        return self._texture
+
+    def set_texture(self, value):
+        """Set the texture for this sprite. The texture must be a region of the
+        batch texture.
+        """
+        #Adopt the texture of the first sprite if the batch has none yet
+        batch = self._store
+
+        if batch.texture is None:
+            batch.texture = value
+
+        elif value.id != batch.texture.id:
+            Logger.warning(
+                "BatchSprite: Texture does not belong to the batch texture.")
+
+        #Copy the texture coords of the region into the batch
+        self._texture = value
+        self._source = None
+        i = self._index * 8
+        batch._uvs[i:i + 8] = array("f", value.tex_coords)
+        batch.invalidate(self._index)
+
+    texture = property(get_texture, set_texture)
+
+    def get_tex_coords(self):
+        """Get the texture coords of this sprite."""
+        i = self._index * 8
+        return tuple(self._store._uvs[i:i + 8])
+
+    def set_tex_coords(self, value):
+        """Set the texture coords of this sprite. This keeps the current
+        texture, so it can only switch between regions of the batch texture.
+        """
+        if not isinstance(value, array):
+            value = array("f", value)
+
+        i = self._index * 8
+        self._store._uvs[i:i + 8] = value
+        self._store.invalidate(self._index)
+
+    tex_coords = property(get_tex_coords, set_tex_coords)
@@ -0,0 +1,282 @@
+"""kvcheetah - Camera API"""
+
+from math import cos, radians, sin
+
+from kivy.event import EventDispatcher
+from kivy.graphics import (
+    InstructionGroup,
+    PopMatrix,
+    PushMatrix,
+    Rotate,
+    Scale,
+    Translate
+)
+from kivy.logger import Logger
+from kivy.properties import ListProperty
+
+
+#Classes
+#==============================================================================
+class Camera(EventDispatcher):
+    """A view onto a world that is drawn inside a parent widget. The camera
+    applies a single transform at the root of its canvas, so objects that use
+    the camera as their parent keep their positions in world coords. Moving,
+    zooming or rotating the camera only updates that transform. The pos of a
+    camera is the world origin, so sprites and tilemaps that use a camera as
+    their parent need no parent pos adjustment. The visible_rect property holds
+    the part of the world that is in view as [x, y, w, h] and can be bound to
+    for culling.
+    """
+    visible_rect = ListProperty([0, 0, 0, 0])
+
+    def __init__(self, **kwargs):
+        """Setup this camera."""
+        self._parent = None
+        self._visible = False
+        self._center = (0, 0)
+        self._zoom = 1
+        self._min_zoom = .1
+        self._max_zoom = 10
+        self._rot = 0
+
+        self._ig = InstructionGroup()
+        self._view = Translate(0, 0)
+        self._rotate = Rotate(0)
+        self._scale = Scale(1, 1, 1)
+        self._look = Translate(0, 0)
+        self._canvas = InstructionGroup()
+
+        self._ig.add(PushMatrix())
+        self._ig.add(self._view)
+        self._ig.add(self._rotate)
+        self._ig.add(self._scale)
+        self._ig.add(self._look)
+        self._ig.add(self._canvas)
+        self._ig.add(PopMatrix())
+
+        super(Camera, self).__init__()
+
+        #Process keyword args
+        if "parent" in kwargs:
+            self.parent = kwargs["parent"]
+
+        if "min_zoom" in kwargs:
+            self.min_zoom = kwargs["min_zoom"]
+
+        if "max_zoom" in kwargs:
+            self.max_zoom = kwargs["max_zoom"]
+
+        if "center" in kwargs:
+            self.center = kwargs["center"]
+
+        if "zoom" in kwargs:
+            self.zoom = kwargs["zoom"]
+
+        if "rot" in kwargs:
+            self.rot = kwargs["rot"]
+
+    def __del__(self):
+        """Destroy this camera."""
+        #Ensure that this camera is hidden before destroying it
+        try:
+            self.show(False)
+
+        except ReferenceError:
+            pass
+
+    def get_parent(self):
+        """Get the widget that this camera draws into."""
+        return self._parent
+
+    def set_parent(self, value):
+        """Set the widget that this camera draws into."""
+        #Ensure that this camera is hidden
+        if self.visible:
+            self.show(False)
+
+        #Change the parent
+        self._parent = value
+        self.update()
+
+    parent = property(get_parent, set_parent)
+
+    def get_visible(self):
+        """Is this camera visible?"""
+        return self._visible
+
+    visible = property(get_visible)
+
+    def get_canvas(self):
+        """Get the canvas that the objects of this camera are drawn into."""
+        return self._canvas
+
+    canvas = property(get_canvas)
+
+    def get_pos(self):
+        """Get the pos of this camera in world coords. This is always the
+        world origin.
+        """
+        return (0, 0)
+
+    pos = property(get_pos)
+
+    def get_size(self):
+        """Get the size of the view of this camera in screen pixels."""
+        if self.parent is None:
+            return (0, 0)
+
+        return tuple(self.parent.size)
+
+    size = property(get_size)
+
+    def get_center(self):
+        """Get the world point at the center of the view."""
+        return self._center
+
+    def set_center(self, value):
+        """Set the world point at the center of the view."""
+        self._center = tuple(value)
+        self.update()
+
+    center = property(get_center, set_center)
+
+    def get_zoom(self):
+        """Get the zoom factor of this camera."""
+        return self._zoom
+
+    def set_zoom(self, value):
+        """Set the zoom factor of this camera. The zoom is clamped between
+        min_zoom and max_zoom.
+        """
+        self._zoom = min(max(value, self._min_zoom), self._max_zoom)
+        self.update()
+
+    zoom = property(get_zoom, set_zoom)
+
+    def get_min_zoom(self):
+        """Get the smallest zoom factor of this camera."""
+        return self._min_zoom
+
+    def set_min_zoom(self, value):
+        """Set the smallest zoom factor of this camera."""
+        self._min_zoom = value
+        self.zoom = self._zoom
+
+    min_zoom = property(get_min_zoom, set_min_zoom)
+
+    def get_max_zoom(self):
+        """Get the largest zoom factor of this camera."""
+        return self._max_zoom
+
+    def set_max_zoom(self, value):
+        """Set the largest zoom factor of this camera."""
+        self._max_zoom = value
+        self.zoom = self._zoom
+
+    max_zoom = property(get_max_zoom, set_max_zoom)
+
+    def get_rot(self):
+        """Get the rotation of this camera. The world is drawn rotated the
+        other way.
+        """
+        return self._rot
+
+    def set_rot(self, value):
+        """Set the rotation of this camera."""
+        self._rot = value
+        self.update()
+
+    rot = property(get_rot, set_rot)
+
+    def show(self, do_show):
+        """Show/hide this camera."""
+        #Ensure that this camera has a parent
+        if self.parent is None:
+            Logger.warning("Camera: No parent assigned to camera.")
+            return
+
+        #Show this camera
+        if do_show and not self.visible:
+            self.parent.canvas.add(self._ig)
+            self.parent.bind(pos = self.update, size = self.update)
+            self.update()
+
+        #Hide this camera
+        elif not do_show and self.visible:
+            self.parent.canvas.remove(self._ig)
+            self.parent.unbind(pos = self.update, size = self.update)
+
+        #Update visibility state
+        self._visible = do_show
+
+    def move(self, dx, dy):
+        """Move the center of this camera by the given world distance."""
+        x, y = self._center
+        self.center = (x + dx, y + dy)
+
+    def zoom_at(self, factor, x, y):
+        """Multiply the zoom of this camera by the given factor while keeping
+        the world point under the given screen point in place.
+        """
+        wx, wy = self.to_world(x, y)
+        self._zoom = min(max(self._zoom * factor, self._min_zoom),
+            self._max_zoom)
+        sx, sy = self.to_screen(wx, wy)
+        cx, cy = self._center
+        theta = radians(self._rot)
+        c = cos(theta)
+        s = sin(theta)
+        dx = (sx - x) / self._zoom
+        dy = (sy - y) / self._zoom
+        self.center = (cx + c * dx - s * dy, cy + s * dx + c * dy)
+
+    def get_view_center(self):
+        """Get the center of the view in screen coords."""
+        if self.parent is None:
+            return (0, 0)
+
+        px, py = self.parent.pos
+        w, h = self.parent.size
+        return (px + w / 2, py + h / 2)
+
+    def to_world(self, x, y):
+        """Convert a point from screen coords to world coords."""
+        vx, vy = self.get_view_center()
+        cx, cy = self._center
+        theta = radians(self._rot)
+        c = cos(theta)
+        s = sin(theta)
+        dx = (x - vx) / self._zoom
+        dy = (y - vy) / self._zoom
+        return (cx + c * dx - s * dy, cy + s * dx + c * dy)
+
+    def to_screen(self, x, y):
+        """Convert a point from world coords to screen coords."""
+        vx, vy = self.get_view_center()
+        cx, cy = self._center
+        theta = radians(self._rot)
+        c = cos(theta)
+        s = sin(theta)
+        dx = (x - cx) * self._zoom
+        dy = (y - cy) * self._zoom
+        return (vx + c * dx + s * dy, vy - s * dx + c * dy)
+
+    def update(self, *args):
+        """Update the transform and visible rect of this camera."""
+        cx, cy = self._center
+        zoom = self._zoom
+        self._view.xy = self.get_view_center()
+        self._rotate.angle = -self._rot
+        self._scale.xyz = (zoom, zoom, 1)
+        self._look.xy = (-cx, -cy)
+
+        #Find the world bounding box of the rotated view
+        w, h = self.size
+        theta = radians(self._rot)
+        c = abs(cos(theta))
+        s = abs(sin(theta))
+        hw = w / 2 / zoom
+        hh = h / 2 / zoom
+        ex = c * hw + s * hh
+        ey = s * hw + c * hh
+        self.visible_rect = [cx - ex, cy - ey, ex * 2, ey * 2]
@@ -0,0 +1,251 @@
+"""kvcheetah - Collision API"""
+
+try:
+    from ..profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+try:
+    from .sprite import hit_test
+
+except ImportError:
+    from sprite import hit_test
+
+
+#Globals
+#==============================================================================
+ALL_LAYERS = 0xFFFFFFFF
+
+
+#Classes
+#==============================================================================
+class CollisionWorld(object):
+    """A spatial hash that finds colliding sprites without testing every pair
+    of sprites against each other.
+    """
+    def __init__(self, **kwargs):
+        """Setup this collision world."""
+        self._cell_size = 64
+        self._index = {}
+        self._sprites = []
+        self._layers = []
+        self._masks = []
+        self._types = []
+        self._bounds = []
+        self._cells = {}
+
+        #Process keyword args
+        if "cell_size" in kwargs:
+            self.cell_size = kwargs["cell_size"]
+
+    def __len__(self):
+        """Get the number of sprites in this collision world."""
+        return len(self._sprites)
+
+    def __contains__(self, sprite):
+        """Check if the given sprite is in this collision world."""
+        return sprite in self._index
+
+    def get_cell_size(self):
+        """Get the cell size of this collision world."""
+        return self._cell_size
+
+    def set_cell_size(self, value):
+        """Set the cell size of this collision world. This should be roughly
+        the size of a typical sprite.
+        """
+        self._cell_size = value
+        self._cells = {}
+
+    cell_size = property(get_cell_size, set_cell_size)
+
+    def add(self, sprite, layer = 1, mask = ALL_LAYERS, type = "box"):
+        """Add a sprite to this collision world. A pair of sprites is only
+        tested if the layer of each sprite is in the mask of the other one.
+        Valid collision types are: "box" and "circle".
+        """
+        if type not in ("box", "circle"):
+            raise ValueError(
+                "CollisionWorld: No such collision type '{}'".format(type))
+
+        #Update the sprite if it was already added
+        if sprite in self._index:
+            i = self._index[sprite]
+            self._layers[i] = layer
+            self._masks[i] = mask
+            self._types[i] = type
+            return
+
+        self._index[sprite] = len(self._sprites)
+        self._sprites.append(sprite)
+        self._layers.append(layer)
+        self._masks.append(mask)
+        self._types.append(type)
+        self._bounds.append(None)
+
+    def remove(self, sprite):
+        """Remove a sprite from this collision world. The cell buckets are
+        discarded until the next update.
+        """
+        #Move the last sprite into the slot of the removed one
+        i = self._index.pop(sprite)
+        last = len(self._sprites) - 1
+
+        if i != last:
+            moved = self._sprites[last]
+            self._sprites[i] = moved
+            self._layers[i] = self._layers[last]
+            self._masks[i] = self._masks[last]
+            self._types[i] = self._types[last]
+            self._bounds[i] = self._bounds[last]
+            self._index[moved] = i
+
+        self._sprites.pop()
+        self._layers.pop()
+        self._masks.pop()
+        self._types.pop()
+        self._bounds.pop()
+        self._cells = {}
+
+    def clear(self):
+        """Remove every sprite from this collision world."""
+        self._index = {}
+        self._sprites = []
+        self._layers = []
+        self._masks = []
+        self._types = []
+        self._bounds = []
+        self._cells = {}
+
+    def update(self):
+        """Rebuild the cell buckets from the current sprite positions. Call this
+        once per frame after moving the sprites.
+        """
+        cells = {}
+        cs = self._cell_size
+
+        for i, sprite in enumerate(self._sprites):
+            #Gather the shape of the sprite
+            cx, cy = sprite.center
+            w, h = sprite.size
+
+            if self._types[i] == "circle":
+                r = max(w, h) / 2
+                hw = r
+                hh = r
+
+            else:
+                hw = w / 2
+                hh = h / 2
+
+            self._bounds[i] = (cx, cy, w, h)
+
+            #Insert the sprite into every cell its bounds overlap
+            x1 = int((cx - hw) // cs)
+            x2 = int((cx + hw) // cs)
+            y1 = int((cy - hh) // cs)
+            y2 = int((cy + hh) // cs)
+
+            for y in range(y1, y2 + 1):
+                for x in range(x1, x2 + 1):
+                    key = (x, y)
+
+                    if key in cells:
+                        cells[key].append(i)
+
+                    else:
+                        cells[key] = [i]
+
+        self._cells = cells
+
+    def can_interact(self, i, j):
+        """Check if the sprites at the given indices can ever collide."""
+        return ((self._layers[i] & self._masks[j]) != 0 and
+            (self._layers[j] & self._masks[i]) != 0)
+
+    def test(self, i, j):
+        """Run the narrow-phase test between the sprites at the given indices.
+        2 circles use circle collision detection, everything else uses bounding
+        box collision detection.
+        """
+        cx, cy, w, h = self._bounds[i]
+        cx2, cy2, w2, h2 = self._bounds[j]
+
+        if self._types[i] == "circle" and self._types[j] == "circle":
+            return hit_test(cx, cy, w, h, cx2, cy2, w2, h2, "circle")
+
+        return hit_test(cx, cy, w, h, cx2, cy2, w2, h2, "box")
+
+    def candidates(self):
+        """Return the index pairs of every sprite pair that shares a cell and
+        whose layers can interact.
+        """
+        seen = set()
+
+        for bucket in self._cells.values():
+            n = len(bucket)
+
+            if n < 2:
+                continue
+
+            for a in range(n - 1):
+                i = bucket[a]
+
+                for b in range(a + 1, n):
+                    j = bucket[b]
+                    pair = (i, j) if i < j else (j, i)
+
+                    if pair in seen:
+                        continue
+
+                    seen.add(pair)
+
+                    if self.can_interact(i, j):
+                        yield pair
+
+    @PROFILER.profile("collision")
+    def pairs(self):
+        """Return a list of every pair of colliding sprites."""
+        sprites = self._sprites
+        return [(sprites[i], sprites[j]) for i, j in self.candidates()
+            if self.test(i, j)]
+
+    def check(self, callback):
+        """Call the given callback with each pair of colliding sprites."""
+        for a, b in self.pairs():
+            callback(a, b)
+
+    @PROFILER.profile("collision")
+    def query(self, sprite):
+        """Return a list of the sprites that collide with the given sprite. The
+        sprite must have been added to this collision world. The cell buckets
+        are rebuilt first if they are out of date.
+        """
+        i = self._index[sprite]
+
+        #Rebuild the cell buckets if the sprite was added or removed since the
+        #last update
+        if self._bounds[i] is None or len(self._cells) == 0:
+            self.update()
+
+        cx, cy, w, h = self._bounds[i]
+        cs = self._cell_size
+
+        if self._types[i] == "circle":
+            hw = hh = max(w, h) / 2
+
+        else:
+            hw = w / 2
+            hh = h / 2
+
+        #Gather the sprites in every cell the sprite overlaps
+        found = set()
+
+        for y in range(int((cy - hh) // cs), int((cy + hh) // cs) + 1):
+            for x in range(int((cx - hw) // cs), int((cx + hw) // cs) + 1):
+                found.update(self._cells.get((x, y), ()))
+
+        found.discard(i)
+        return [self._sprites[j] for j in found
+            if self.can_interact(i, j) and self.test(i, j)]
@@ -0,0 +1,245 @@
+"""kvcheetah - SpriteRenderer API"""
+
+from array import array
+
+from kivy.graphics import Mesh, RenderContext
+from kivy.logger import Logger
+
+try:
+    from ..batch import SpriteBatch
+
+except ImportError:
+    from kvcheetah.graphics.batch import SpriteBatch
+
+
+#Globals
+#==============================================================================
+RENDERER_VS = """
+$HEADER$
+
+attribute vec2 vCorner;
+attribute vec3 vTransform;
+attribute vec4 vRect;
+attribute vec4 vColor;
+attribute vec4 vUVRect;
+
+void main(void) {
+    //Place the corner relative to the origin, then rotate it around the pos
+    vec2 local = vCorner * vRect.zw - vRect.xy;
+    float theta = radians(vTransform.z);
+    float c = cos(theta);
+    float s = sin(theta);
+    vec2 world = vTransform.xy + vec2(
+        c * local.x - s * local.y,
+        s * local.x + c * local.y
+    );
+
+    frag_color = vColor * color * vec4(1.0, 1.0, 1.0, opacity);
+    tex_coord0 = mix(vUVRect.xy, vUVRect.zw, vCorner);
+    gl_Position = projection_mat * modelview_mat * vec4(world, 0.0, 1.0);
+}
+"""
+RENDERER_FS = """
+$HEADER$
+
+void main(void) {
+    gl_FragColor = frag_color * texture2D(texture0, tex_coord0);
+}
+"""
+RENDERER_FMT = [
+    (b"vCorner", 2, "float"),
+    (b"vTransform", 3, "float"),
+    (b"vRect", 4, "float"),
+    (b"vColor", 4, "float"),
+    (b"vUVRect", 4, "float")
+]
+VERTEX_SIZE = 17
+QUAD_SIZE = 4 * VERTEX_SIZE
+CORNERS = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+#New rows get their corners once when the buffer grows. They never change, so
+#the rows are only ever written from offset 2 onwards.
+EMPTY_QUAD = array("f")
+
+for corner in CORNERS:
+    EMPTY_QUAD.extend(corner)
+    EMPTY_QUAD.extend([0] * (VERTEX_SIZE - 2))
+
+EMPTY_SIZE = array("f", [0, 0])
+
+#Where each per-sprite column goes in a vertex: (column name, floats per row,
+#((float in row, float in vertex), ...))
+STREAMS = (
+    ("_pos", 2, ((0, 2), (1, 3))),
+    ("_rot", 1, ((0, 4),)),
+    ("_origin", 2, ((0, 5), (1, 6))),
+    ("_size", 2, ((0, 7), (1, 8))),
+    ("_color", 4, ((0, 9), (1, 10), (2, 11), (3, 12))),
+    ("_uvs", 8, ((0, 13), (1, 14), (4, 15), (5, 16)))
+)
+
+
+#Classes
+#==============================================================================
+class SpriteRenderer(SpriteBatch):
+    """A sprite batch that copies the raw state of each sprite into the vertex
+    stream and transforms the sprites in the vertex shader. Bulk updates are
+    copied column by column, so the CPU never loops over the sprites or builds
+    their corners. If the shader cannot be used, this falls back to building
+    the corners on the CPU like a sprite batch. Use BatchSprite to add sprites
+    to a sprite renderer.
+    """
+    def __init__(self, **kwargs):
+        """Setup this sprite renderer."""
+        self._use_shader = True
+        self._gpu = False
+
+        if "use_shader" in kwargs:
+            self._use_shader = kwargs["use_shader"]
+
+        super(SpriteRenderer, self).__init__(**kwargs)
+
+    def get_gpu(self):
+        """Are the sprites of this sprite renderer transformed on the GPU?"""
+        return self._gpu
+
+    gpu = property(get_gpu)
+
+    def clone(self, **kwargs):
+        """Create an empty sprite renderer with the settings of this sprite
+        renderer.
+        """
+        kwargs.setdefault("use_shader", self._use_shader)
+        return super(SpriteRenderer, self).clone(**kwargs)
+
+    def setup_context(self):
+        """Create the render context and mesh of this sprite renderer."""
+        #Use the CPU path if requested
+        if not self._use_shader:
+            super(SpriteRenderer, self).setup_context()
+            return
+
+        #Fall back to the CPU path if the shader does not compile
+        ctx = RenderContext(
+            vs = RENDERER_VS,
+            fs = RENDERER_FS,
+            use_parent_projection = True,
+            use_parent_modelview = True
+        )
+
+        if not ctx.shader.success:
+            Logger.warning(
+                "SpriteRenderer: Shader failed, using the CPU fallback.")
+            super(SpriteRenderer, self).setup_context()
+            return
+
+        self._ctx = ctx
+        self._mesh = Mesh(fmt = RENDERER_FMT, mode = "triangles")
+        self._ctx.add(self._mesh)
+        self._quad_size = QUAD_SIZE
+        self._empty_quad = EMPTY_QUAD
+        self._gpu = True
+
+    def build_all(self):
+        """Write the vertices of every row into the vertex buffer."""
+        if not self._gpu:
+            super(SpriteRenderer, self).build_all()
+            return
+
+        if self._count == 0:
+            return
+
+        self.copy_streams(STREAMS)
+
+        #Collapse the hidden and culled rows again
+        shown = self._shown.tobytes()
+        i = shown.find(b"\x00")
+
+        while i != -1:
+            self.collapse(i)
+            i = shown.find(b"\x00", i + 1)
+
+        culled = self._culled.tobytes()
+        i = culled.find(b"\x01")
+
+        while i != -1:
+            self.collapse(i)
+            i = culled.find(b"\x01", i + 1)
+
+    def collapse(self, i):
+        """Collapse the quad of the given row to a point by zeroing the size
+        of each of its corners.
+        """
+        vertices = self._vertices
+        base = i * QUAD_SIZE
+
+        for corner in range(4):
+            start = base + corner * VERTEX_SIZE + 7
+            vertices[start:start + 2] = EMPTY_SIZE
+
+    def copy_streams(self, streams):
+        """Copy the given columns into the matching attributes of all 4
+        corners of every row with strided slices.
+        """
+        vertices = self._vertices
+        end = self._count * QUAD_SIZE
+
+        for name, width, parts in streams:
+            column = getattr(self, name)
+
+            for src, dst in parts:
+                values = column[src::width]
+
+                for corner in range(4):
+                    start = corner * VERTEX_SIZE + dst
+                    vertices[start:start + end:QUAD_SIZE] = values
+
+    def build_pos(self):
+        """Move every row in the vertex buffer. Only the pos column is
+        copied.
+        """
+        if not self._gpu:
+            super(SpriteRenderer, self).build_pos()
+            return
+
+        self.copy_streams(STREAMS[:1])
+
+    def build_rows(self, rows):
+        """Write the vertices of the given rows into the vertex buffer."""
+        if not self._gpu:
+            super(SpriteRenderer, self).build_rows(rows)
+            return
+
+        if rows is None:
+            self.build_all()
+            return
+
+        for i in rows:
+            self.build_quad(i)
+
+    def build_quad(self, i):
+        """Write the vertices of the given row into the vertex buffer."""
+        if not self._gpu:
+            super(SpriteRenderer, self).build_quad(i)
+            return
+
+        #Every corner gets the same sprite state. The corners themselves were
+        #written when the buffer grew.
+        uvs = self._uvs[i * 8:i * 8 + 8]
+        state = array("f",
+            tuple(self._pos[i * 2:i * 2 + 2]) + (self._rot[i],) +
+            tuple(self._origin[i * 2:i * 2 + 2]) +
+            tuple(self._size[i * 2:i * 2 + 2]) +
+            tuple(self._color[i * 4:i * 4 + 4]) +
+            (uvs[0], uvs[1], uvs[4], uvs[5])
+        )
+        vertices = self._vertices
+        base = i * QUAD_SIZE
+
+        for corner in range(4):
+            start = base + corner * VERTEX_SIZE + 2
+            vertices[start:start + VERTEX_SIZE - 2] = state
+
+        #Hidden and culled sprites are collapsed to a point
+        if not self._shown[i] or self._culled[i]:
+            self.collapse(i)
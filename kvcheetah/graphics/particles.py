@@ -0,0 +1,437 @@
+"""kvcheetah - ParticleEmitter API"""
+
+from array import array
+
+from kivy.graphics import Mesh, RenderContext
+from kivy.logger import Logger
+
+try:
+    from ..math.particles import ParticleArray
+    from ..profiler import PROFILER
+
+except ImportError:
+    from kvcheetah.math.particles import ParticleArray
+    from profiler import PROFILER
+
+try:
+    from .animation import ATLAS_CACHE
+    from .batch import (
+        BATCH_FMT,
+        BATCH_FS,
+        BATCH_VS,
+        DEFAULT_UVS,
+        MAX_SPRITES,
+        QUAD_SIZE
+    )
+
+except ImportError:
+    from animation import ATLAS_CACHE
+    from batch import (
+        BATCH_FMT,
+        BATCH_FS,
+        BATCH_VS,
+        DEFAULT_UVS,
+        MAX_SPRITES,
+        QUAD_SIZE
+    )
+
+
+#Classes
+#==============================================================================
+class ParticleEmitter(object):
+    """Emits particles that share a texture. The state of every particle is
+    kept in the preallocated arrays of a particle array, and all live particles
+    are drawn with a single mesh whose vertex buffer is rewritten in place each
+    update. Call update once per frame.
+    """
+    def __init__(self, **kwargs):
+        """Setup this particle emitter."""
+        self._parent = None
+        self._visible = False
+        self._pos = (0, 0)
+        self._rate = 0
+        self._angle = 90
+        self._spread = 360
+        self._speed = (50, 50)
+        self._lifetime = (1, 1)
+        self._size = (8, 8)
+        self._rotation = (0, 0)
+        self._spin = (0, 0)
+        self._color = (1, 1, 1, 1)
+        self._end_color = None
+        self._gravity = (0, 0)
+        self._texture = None
+        self._source = None
+        self._uvs = DEFAULT_UVS
+        self._pending = 0
+
+        #Render state
+        self._ctx = RenderContext(
+            vs = BATCH_VS,
+            fs = BATCH_FS,
+            use_parent_projection = True,
+            use_parent_modelview = True
+        )
+        self._mesh = Mesh(fmt = BATCH_FMT, mode = "triangles")
+        self._ctx.add(self._mesh)
+        self.capacity = kwargs["capacity"] if "capacity" in kwargs else 256
+
+        #Process keyword args
+        if "parent" in kwargs:
+            self.parent = kwargs["parent"]
+
+        if "pos" in kwargs:
+            self.pos = kwargs["pos"]
+
+        if "rate" in kwargs:
+            self.rate = kwargs["rate"]
+
+        if "angle" in kwargs:
+            self.angle = kwargs["angle"]
+
+        if "spread" in kwargs:
+            self.spread = kwargs["spread"]
+
+        if "speed" in kwargs:
+            self.speed = kwargs["speed"]
+
+        if "lifetime" in kwargs:
+            self.lifetime = kwargs["lifetime"]
+
+        if "size" in kwargs:
+            self.size = kwargs["size"]
+
+        if "rotation" in kwargs:
+            self.rotation = kwargs["rotation"]
+
+        if "spin" in kwargs:
+            self.spin = kwargs["spin"]
+
+        if "color" in kwargs:
+            self.color = kwargs["color"]
+
+        if "end_color" in kwargs:
+            self.end_color = kwargs["end_color"]
+
+        if "gravity" in kwargs:
+            self.gravity = kwargs["gravity"]
+
+        if "texture" in kwargs:
+            self.texture = kwargs["texture"]
+
+        if "source" in kwargs:
+            self.source = kwargs["source"]
+
+    def __del__(self):
+        """Destroy this particle emitter."""
+        #Ensure that this particle emitter is hidden before destroying it
+        try:
+            self.show(False)
+
+        except ReferenceError:
+            pass
+
+    def __len__(self):
+        """Get the number of live particles."""
+        return len(self._particles)
+
+    def get_parent(self):
+        """Get the parent of this particle emitter."""
+        return self._parent
+
+    def set_parent(self, value):
+        """Set the parent of this particle emitter."""
+        #Ensure that this particle emitter is hidden
+        if self.visible:
+            self.show(False)
+
+        #Change the parent
+        self._parent = value
+
+    parent = property(get_parent, set_parent)
+
+    def get_visible(self):
+        """Is this particle emitter visible?"""
+        return self._visible
+
+    visible = property(get_visible)
+
+    def get_particles(self):
+        """Get the particle array of this particle emitter."""
+        return self._particles
+
+    particles = property(get_particles)
+
+    def get_capacity(self):
+        """Get the maximum number of live particles."""
+        return self._particles.capacity
+
+    def set_capacity(self, value):
+        """Set the maximum number of live particles. This kills every
+        particle.
+        """
+        value = min(max(value, 1), MAX_SPRITES)
+        self._particles = ParticleArray(value)
+        self._vertices = array("f", bytes(value * QUAD_SIZE * 4))
+        self._indices = array("H")
+
+        for i in range(value):
+            base = i * 4
+            self._indices.extend((
+                base, base + 1, base + 2,
+                base + 2, base + 3, base
+            ))
+
+        self.upload(0)
+
+    capacity = property(get_capacity, set_capacity)
+
+    def get_pos(self):
+        """Get the position of this particle emitter."""
+        #Adjust current pos based on parent pos
+        x, y = self._pos
+
+        if self.parent is not None:
+            px, py = self.parent.pos
+            x -= px
+            y -= py
+
+        return (x, y)
+
+    def set_pos(self, value):
+        """Set the position of this particle emitter."""
+        #Adjust new pos based on parent pos
+        x, y = value
+
+        if self.parent is not None:
+            px, py = self.parent.pos
+            x += px
+            y += py
+
+        self._pos = (x, y)
+
+    pos = property(get_pos, set_pos)
+
+    def get_rate(self):
+        """Get the number of particles emitted per second."""
+        return self._rate
+
+    def set_rate(self, value):
+        """Set the number of particles emitted per second. A rate of 0 only
+        emits particles when emit is called.
+        """
+        self._rate = value
+
+    rate = property(get_rate, set_rate)
+
+    def get_angle(self):
+        """Get the direction of the emitted particles in degrees."""
+        return self._angle
+
+    def set_angle(self, value):
+        """Set the direction of the emitted particles in degrees."""
+        self._angle = value
+
+    angle = property(get_angle, set_angle)
+
+    def get_spread(self):
+        """Get the angle in degrees that emitted particles are spread over."""
+        return self._spread
+
+    def set_spread(self, value):
+        """Set the angle in degrees that emitted particles are spread over."""
+        self._spread = value
+
+    spread = property(get_spread, set_spread)
+
+    def get_speed(self):
+        """Get the (min, max) speed of emitted particles."""
+        return self._speed
+
+    def set_speed(self, value):
+        """Set the (min, max) speed of emitted particles."""
+        self._speed = tuple(value)
+
+    speed = property(get_speed, set_speed)
+
+    def get_lifetime(self):
+        """Get the (min, max) lifetime of emitted particles in seconds."""
+        return self._lifetime
+
+    def set_lifetime(self, value):
+        """Set the (min, max) lifetime of emitted particles in seconds."""
+        self._lifetime = tuple(value)
+
+    lifetime = property(get_lifetime, set_lifetime)
+
+    def get_size(self):
+        """Get the (start, end) size of emitted particles."""
+        return self._size
+
+    def set_size(self, value):
+        """Set the (start, end) size of emitted particles."""
+        self._size = tuple(value)
+
+    size = property(get_size, set_size)
+
+    def get_rotation(self):
+        """Get the (min, max) start rotation of emitted particles."""
+        return self._rotation
+
+    def set_rotation(self, value):
+        """Set the (min, max) start rotation of emitted particles."""
+        self._rotation = tuple(value)
+
+    rotation = property(get_rotation, set_rotation)
+
+    def get_spin(self):
+        """Get the (min, max) spin of emitted particles in degrees per
+        second.
+        """
+        return self._spin
+
+    def set_spin(self, value):
+        """Set the (min, max) spin of emitted particles in degrees per
+        second.
+        """
+        self._spin = tuple(value)
+
+    spin = property(get_spin, set_spin)
+
+    def get_color(self):
+        """Get the start color of emitted particles."""
+        return self._color
+
+    def set_color(self, value):
+        """Set the start color of emitted particles."""
+        self._color = tuple(value)
+
+    color = property(get_color, set_color)
+
+    def get_end_color(self):
+        """Get the color that emitted particles fade to."""
+        return self._end_color
+
+    def set_end_color(self, value):
+        """Set the color that emitted particles fade to. None keeps the start
+        color.
+        """
+        self._end_color = None if value is None else tuple(value)
+
+    end_color = property(get_end_color, set_end_color)
+
+    def get_gravity(self):
+        """Get the acceleration applied to every particle."""
+        return self._gravity
+
+    def set_gravity(self, value):
+        """Set the acceleration applied to every particle."""
+        self._gravity = tuple(value)
+
+    gravity = property(get_gravity, set_gravity)
+
+    def get_texture(self):
+        """Get the texture of the particles."""
+        return self._texture
+
+    def set_texture(self, value):
+        """Set the texture of the particles. This can be an atlas region."""
+        self._texture = value
+        self._source = None
+        self._uvs = DEFAULT_UVS if value is None else tuple(value.tex_coords)
+        self._mesh.texture = value
+
+    texture = property(get_texture, set_texture)
+
+    def get_source(self):
+        """Get the source image of the texture of the particles."""
+        return self._source
+
+    def set_source(self, value):
+        """Set the texture of the particles from an image or atlas source."""
+        self.texture = ATLAS_CACHE.get(value)
+        self._source = value
+
+    source = property(get_source, set_source)
+
+    def show(self, do_show):
+        """Show/hide this particle emitter."""
+        #Ensure that this particle emitter has a parent
+        if self.parent is None:
+            Logger.warning(
+                "ParticleEmitter: No parent assigned to particle emitter.")
+            return
+
+        #Show this particle emitter
+        if do_show and not self.visible:
+            self.parent.canvas.add(self._ctx)
+
+        #Hide this particle emitter
+        elif not do_show and self.visible:
+            self.parent.canvas.remove(self._ctx)
+
+        #Update visibility state
+        self._visible = do_show
+
+    def emit(self, n, pos = None):
+        """Emit n particles at the position of this particle emitter or at the
+        given position.
+        """
+        #The given position is in parent coords like the emitter pos
+        x, y = self._pos
+
+        if pos is not None:
+            x, y = pos
+
+            if self.parent is not None:
+                px, py = self.parent.pos
+                x += px
+                y += py
+
+        self._particles.emit(
+            n, x, y,
+            angle = self._angle,
+            spread = self._spread,
+            speed = self._speed,
+            life = self._lifetime,
+            size = self._size,
+            rot = self._rotation,
+            spin = self._spin,
+            color = self._color,
+            end_color = self._end_color
+        )
+
+    def clear(self):
+        """Kill every particle."""
+        self._particles.clear()
+        self.upload(0)
+
+    @PROFILER.profile("particles")
+    def update(self, dt):
+        """Emit, move and expire particles for the given number of seconds and
+        upload the vertices of the live particles.
+        """
+        #Emit particles at the emission rate
+        if self._rate > 0:
+            self._pending += self._rate * dt
+            n = int(self._pending)
+
+            if n > 0:
+                self._pending -= n
+                self.emit(n)
+
+        #Simulate the particles and rebuild their quads in place
+        gx, gy = self._gravity
+        self._particles.update(dt, gx, gy)
+        self.upload(self._particles.build(self._vertices, self._uvs))
+
+    def upload(self, n):
+        """Upload the vertices of the first n quads."""
+        #Kivy cannot read an empty memoryview
+        if n == 0:
+            self._mesh.vertices = []
+            self._mesh.indices = []
+            return
+
+        self._mesh.vertices = memoryview(self._vertices)[:n * QUAD_SIZE]
+        self._mesh.indices = memoryview(self._indices)[:n * 6]
@@ -0,0 +1,339 @@
+"""kvcheetah - RenderQueue API"""
+
+from weakref import WeakKeyDictionary, ref
+
+from kivy.clock import Clock
+from kivy.graphics import InstructionGroup
+from kivy.logger import Logger
+
+try:
+    from ..profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+try:
+    from .sprite import view_rect
+
+except ImportError:
+    from sprite import view_rect
+
+
+#Functions
+#==============================================================================
+def texture_key(sprite):
+    """Return the id of the texture that the given sprite is drawn with. Atlas
+    regions share the id of their atlas texture.
+    """
+    texture = sprite.texture
+    return 0 if texture is None else texture.id
+
+
+def count_binds(keys):
+    """Return the number of texture binds needed to draw textures with the
+    given sequence of texture keys.
+    """
+    binds = 0
+    last = None
+
+    for key in keys:
+        if key != last:
+            binds += 1
+            last = key
+
+    return binds
+
+
+#Classes
+#==============================================================================
+class RenderQueue(object):
+    """Draws its sprites sorted by layer and texture, so sprites that share a
+    texture are drawn back to back. Lower layers are drawn first. Sprites in an
+    ordered layer keep the order they were shown in instead of being sorted by
+    texture. The render queue only keeps weak references to its sprites, so a
+    sprite is still hidden when it is destroyed. The culling pass detaches
+    sprites whose bounds are outside the visible area of the parent.
+    """
+    def __init__(self, **kwargs):
+        """Setup this render queue."""
+        self._parent = None
+        self._visible = False
+        self._ig = InstructionGroup()
+        self._sprites = WeakKeyDictionary()
+        self._next_seq = 0
+        self._ordered_layers = set()
+        self._binds = 0
+        self._binds_saved = 0
+        self._order = []
+        self._culled_layers = None
+        self._cull_margin = 0
+        self._auto_cull = False
+        self._cull_event = None
+        self._culled_count = 0
+        self._drawn_count = 0
+        self._trigger = Clock.create_trigger(self.sort)
+
+        #Process keyword args
+        if "parent" in kwargs:
+            self.parent = kwargs["parent"]
+
+        if "ordered_layers" in kwargs:
+            self.ordered_layers = kwargs["ordered_layers"]
+
+        if "culled_layers" in kwargs:
+            self.culled_layers = kwargs["culled_layers"]
+
+        if "cull_margin" in kwargs:
+            self.cull_margin = kwargs["cull_margin"]
+
+        if "auto_cull" in kwargs:
+            self.auto_cull = kwargs["auto_cull"]
+
+    def __del__(self):
+        """Destroy this render queue."""
+        #Ensure that this render queue is hidden before destroying it
+        try:
+            self.show(False)
+
+        except ReferenceError:
+            pass
+
+    def __len__(self):
+        """Get the number of sprites in this render queue."""
+        return len(self._sprites)
+
+    def __contains__(self, sprite):
+        """Check if the given sprite is in this render queue."""
+        return sprite in self._sprites
+
+    def get_parent(self):
+        """Get the parent of this render queue."""
+        return self._parent
+
+    def set_parent(self, value):
+        """Set the parent of this render queue."""
+        #Ensure that this render queue is hidden
+        if self.visible:
+            self.show(False)
+
+        #Change the parent
+        self._parent = value
+
+    parent = property(get_parent, set_parent)
+
+    def get_visible(self):
+        """Is this render queue visible?"""
+        return self._visible
+
+    visible = property(get_visible)
+
+    def get_ordered_layers(self):
+        """Get the layers that keep the order their sprites were shown in."""
+        return self._ordered_layers
+
+    def set_ordered_layers(self, value):
+        """Set the layers that keep the order their sprites were shown in."""
+        self._ordered_layers = set(value)
+        self.invalidate()
+
+    ordered_layers = property(get_ordered_layers, set_ordered_layers)
+
+    def get_binds(self):
+        """Get the number of texture binds needed to draw this render queue."""
+        return self._binds
+
+    binds = property(get_binds)
+
+    def get_binds_saved(self):
+        """Get the number of texture binds per frame that sorting saves
+        compared to drawing the sprites in the order they were shown in.
+        """
+        return self._binds_saved
+
+    binds_saved = property(get_binds_saved)
+
+    def get_culled_layers(self):
+        """Get the layers that the culling pass applies to. None means every
+        layer.
+        """
+        return self._culled_layers
+
+    def set_culled_layers(self, value):
+        """Set the layers that the culling pass applies to. None means every
+        layer. Sprites in other layers are always drawn.
+        """
+        self._culled_layers = None if value is None else set(value)
+
+    culled_layers = property(get_culled_layers, set_culled_layers)
+
+    def get_cull_margin(self):
+        """Get the distance that sprites can be outside the visible area
+        before they are culled.
+        """
+        return self._cull_margin
+
+    def set_cull_margin(self, value):
+        """Set the distance that sprites can be outside the visible area
+        before they are culled.
+        """
+        self._cull_margin = value
+
+    cull_margin = property(get_cull_margin, set_cull_margin)
+
+    def get_auto_cull(self):
+        """Does this render queue run the culling pass every frame?"""
+        return self._auto_cull
+
+    def set_auto_cull(self, value):
+        """Set whether this render queue runs the culling pass every frame
+        while it is visible.
+        """
+        self._auto_cull = value
+        self.schedule_cull()
+
+    auto_cull = property(get_auto_cull, set_auto_cull)
+
+    def get_culled(self):
+        """Get the number of sprites skipped by the last culling pass."""
+        return self._culled_count
+
+    culled = property(get_culled)
+
+    def get_drawn(self):
+        """Get the number of sprites drawn after the last culling pass."""
+        return self._drawn_count
+
+    drawn = property(get_drawn)
+
+    def show(self, do_show):
+        """Show/hide this render queue."""
+        #Ensure that this render queue has a parent
+        if self.parent is None:
+            Logger.warning("RenderQueue: No parent assigned to render queue.")
+            return
+
+        #Show this render queue
+        if do_show and not self.visible:
+            self.parent.canvas.add(self._ig)
+
+        #Hide this render queue
+        elif not do_show and self.visible:
+            self.parent.canvas.remove(self._ig)
+
+        #Update visibility state
+        self._visible = do_show
+        self.schedule_cull()
+
+    def schedule_cull(self):
+        """Start or stop the automatic culling pass."""
+        run = self._auto_cull and self._visible
+
+        if run and self._cull_event is None:
+            self._cull_event = Clock.schedule_interval(self.cull, 0)
+
+        elif not run and self._cull_event is not None:
+            self._cull_event.cancel()
+            self._cull_event = None
+
+    def add(self, sprite):
+        """Add a shown sprite to this render queue. This is called by
+        Sprite.show.
+        """
+        self._sprites[sprite] = self._next_seq
+        self._next_seq += 1
+        self.invalidate()
+
+    def remove(self, sprite):
+        """Remove a hidden sprite from this render queue. This is called by
+        Sprite.show.
+        """
+        self._sprites.pop(sprite, None)
+        sprite._culled = False
+        self.invalidate()
+
+    def clear(self):
+        """Remove every sprite from this render queue."""
+        self._sprites = WeakKeyDictionary()
+        self.invalidate()
+
+    def invalidate(self, *args):
+        """Sort this render queue again before the next frame."""
+        self._trigger()
+
+    @PROFILER.profile("sort")
+    def sort(self, *args):
+        """Sort the sprites of this render queue by layer and texture and
+        rebuild the draw order.
+        """
+        #Gather the sort keys in the order the sprites were shown in
+        ordered = self._ordered_layers
+        entries = []
+
+        for sprite, seq in list(self._sprites.items()):
+            layer = sprite.layer
+            texture = texture_key(sprite)
+            entries.append((seq, layer, texture, sprite))
+
+        entries.sort(key = lambda e: e[0])
+        unsorted_binds = count_binds([e[2] for e in entries])
+
+        #Sort by layer, then by texture unless the layer is ordered. The
+        #sort is stable, so equal keys keep their show order.
+        entries.sort(key = lambda e: (e[1], 0 if e[1] in ordered else e[2]))
+        self._binds = count_binds([e[2] for e in entries])
+        self._binds_saved = unsorted_binds - self._binds
+
+        #Rebuild the draw order
+        self._order = [ref(e[3]) for e in entries]
+        self.rebuild()
+
+    def rebuild(self):
+        """Add the sprites that are not culled to the instruction group of
+        this render queue in the sorted order.
+        """
+        PROFILER.count("canvas_removes", len(self._ig.children))
+        self._ig.clear()
+
+        for sprite_ref in self._order:
+            sprite = sprite_ref()
+
+            if sprite is not None and not sprite._culled:
+                self._ig.add(sprite._ig)
+
+        PROFILER.count("canvas_adds", len(self._ig.children))
+
+    @PROFILER.profile("cull")
+    def cull(self, *args):
+        """Cull the sprites whose bounds are outside the visible area of the
+        parent. The draw order is only rebuilt when the visibility of a sprite
+        changed.
+        """
+        if self.parent is None:
+            return
+
+        x1, y1, x2, y2 = view_rect(self.parent, self._cull_margin)
+        layers = self._culled_layers
+        changed = False
+        culled = 0
+
+        for sprite in list(self._sprites.keys()):
+            #Sprites in other layers are always drawn
+            if layers is not None and sprite.layer not in layers:
+                off = False
+
+            else:
+                bx1, by1, bx2, by2 = sprite.bounds
+                off = bx2 < x1 or bx1 > x2 or by2 < y1 or by1 > y2
+
+            if off != sprite._culled:
+                sprite._culled = off
+                changed = True
+
+            if off:
+                culled += 1
+
+        self._culled_count = culled
+        self._drawn_count = len(self._sprites) - culled
+
+        if changed:
+            self.rebuild()
@@ -1,6 +1,8 @@
 """kvcheetah - Sprite API"""
 
-from math import sqrt
+from array import array
+from math import cos, radians, sin, sqrt
+from numbers import Real
 
 from kivy.graphics import (
     Color,
@@ -13,6 +15,142 @@ from kivy.graphics import (
 )
 from kivy.logger import Logger
 
+try:
+    from ..math.sweep import sweep_pairs
+    from ..profiler import PROFILER
+
+except ImportError:
+    from kvcheetah.math.sweep import sweep_pairs
+    from profiler import PROFILER
+
+
+#Functions
+#==============================================================================
+def hit_test(cx, cy, w, h, cx2, cy2, w2, h2, type = "box"):
+    """Check if 2 shapes with the given centers and sizes overlap. Valid
+    collision types are: "box" and "circle".
+    """
+    dx = abs(cx2 - cx)
+    dy = abs(cy2 - cy)
+
+    #Do bounding box collision detection
+    if type == "box":
+        return (dx < (w + w2) / 2 and dy < (h + h2) / 2)
+
+    #Do circle-based collision detection
+    elif type == "circle":
+        r = max(w, h) / 2
+        r2 = max(w2, h2) / 2
+        dist = sqrt(dx ** 2 + dy ** 2)
+        return dist < r + r2
+
+    #Handle unknown collision type
+    else:
+        Logger.warning("Sprite: No such collision type '{}'".format(type))
+        return False
+
+
+def sprite_bounds(x, y, ox, oy, w, h, rot):
+    """Return the bounding box (x1, y1, x2, y2) of a sprite with the given pos,
+    origin, size and rotation. The sprite rotates around its pos.
+    """
+    #Unrotated sprites are the common case
+    if rot == 0:
+        return (x - ox, y - oy, x - ox + w, y - oy + h)
+
+    #Rotate the corners of the sprite around its pos
+    theta = radians(rot)
+    c = cos(theta)
+    s = sin(theta)
+    lx = -ox
+    ly = -oy
+    rx = w - ox
+    ty = h - oy
+    xs = (c * lx - s * ly, c * rx - s * ly, c * rx - s * ty, c * lx - s * ty)
+    ys = (s * lx + c * ly, s * rx + c * ly, s * rx + c * ty, s * lx + c * ty)
+    return (x + min(xs), y + min(ys), x + max(xs), y + max(ys))
+
+
+def view_rect(parent, margin = 0):
+    """Return the area of the given parent that is in view as
+    (x1, y1, x2, y2) in parent coords, grown by the given margin. A camera
+    provides its visible rect, other parents show their own size.
+    """
+    if hasattr(parent, "visible_rect"):
+        x, y, w, h = parent.visible_rect
+
+    else:
+        x = 0
+        y = 0
+        w, h = parent.size
+
+    return (x - margin, y - margin, x + w + margin, y + h + margin)
+
+
+def pack_group(group):
+    """Pack the centers and sizes of the given group into flat arrays. The group
+    can be a sequence of sprites or a (centers, sizes) pair of flat sequences
+    in the form [x0, y0, x1, y1, ...].
+    """
+    #Use the given centers and sizes
+    if is_shape_pair(group):
+        centers, sizes = group
+        return (array("f", centers), array("f", sizes))
+
+    #Gather the centers and sizes of the given sprites
+    centers = array("f")
+    sizes = array("f")
+
+    for sprite in group:
+        centers.extend(sprite.center)
+        sizes.extend(sprite.size)
+
+    return (centers, sizes)
+
+
+def is_shape_pair(group):
+    """Check if the given group is a (centers, sizes) pair of flat sequences
+    of numbers rather than a sequence of sprites.
+    """
+    try:
+        if len(group) != 2:
+            return False
+
+        centers, sizes = group
+        return (len(centers) == len(sizes) and
+            all(isinstance(v, Real) for v in centers[:2]) and
+            all(isinstance(v, Real) for v in sizes[:2]))
+
+    except TypeError:
+        return False
+
+
+@PROFILER.profile("collision")
+def hit_many(group, group2 = None, type = "box"):
+    """Find every colliding pair in the given group, or every colliding pair
+    between 2 groups. Each group can be a sequence of sprites or a
+    (centers, sizes) pair of flat sequences. This returns a list of index
+    pairs (i, j). Within 1 group i < j, between 2 groups i is an index into the
+    first group and j is an index into the second one. Valid collision types
+    are: "box" and "circle".
+    """
+    if type not in ("box", "circle"):
+        Logger.warning("Sprite: No such collision type '{}'".format(type))
+        return []
+
+    #Pack both groups into the same arrays. The shapes of the second group
+    #start at split.
+    centers, sizes = pack_group(group)
+    split = -1
+
+    if group2 is not None:
+        split = len(centers) // 2
+        centers2, sizes2 = pack_group(group2)
+        centers.extend(centers2)
+        sizes.extend(sizes2)
+
+    return sweep_pairs(centers, sizes, split, type == "circle")
+
 
 #Classes
 #==============================================================================
@@ -21,7 +159,10 @@ class Sprite(object):
     def __init__(self, **kwargs):
         """Setup this sprite."""
         self._parent = None
+        self._queue = None
+        self._layer = 0
         self._visible = False
+        self._culled = False
         self._velocity = (0, 0)
 
         self._ig = InstructionGroup()
@@ -43,6 +184,12 @@ class Sprite(object):
         if "parent" in kwargs:
             self.parent = kwargs["parent"]
 
+        if "queue" in kwargs:
+            self.queue = kwargs["queue"]
+
+        if "layer" in kwargs:
+            self.layer = kwargs["layer"]
+
         if "pos" in kwargs:
             self.pos = kwargs["pos"]
 
@@ -88,12 +235,53 @@ class Sprite(object):
 
     parent = property(get_parent, set_parent)
 
+    def get_queue(self):
+        """Get the render queue of this sprite."""
+        return self._queue
+
+    def set_queue(self, value):
+        """Set the render queue of this sprite. A sprite with a render queue is
+        drawn by the queue instead of being added to the canvas of its parent.
+        """
+        #Ensure that this sprite is hidden
+        if self.visible:
+            self.show(False)
+
+        #Change the render queue
+        self._queue = value
+
+    queue = property(get_queue, set_queue)
+
+    def get_layer(self):
+        """Get the render queue layer of this sprite."""
+        return self._layer
+
+    def set_layer(self, value):
+        """Set the render queue layer of this sprite. Lower layers are drawn
+        first.
+        """
+        self._layer = value
+        self.invalidate_queue()
+
+    layer = property(get_layer, set_layer)
+
+    def invalidate_queue(self):
+        """Make the render queue of this sprite sort its sprites again."""
+        if self.visible and self.queue is not None:
+            self.queue.invalidate()
+
     def get_visible(self):
         """Is this sprite visible?"""
         return self._visible
 
     visible = property(get_visible)
 
+    def get_culled(self):
+        """Is this sprite skipped by the culling pass of its render queue?"""
+        return self._culled
+
+    culled = property(get_culled)
+
     def get_pos(self):
         """Get the position of this sprite."""
         #Adjust current pos based on parent pos
@@ -151,6 +339,17 @@ class Sprite(object):
 
     center = property(get_center)
 
+    def get_bounds(self):
+        """Get the bounding box of this sprite as (x1, y1, x2, y2). This takes
+        the origin and rotation of this sprite into account.
+        """
+        x, y = self.pos
+        ox, oy = self.origin
+        w, h = self.size
+        return sprite_bounds(x, y, ox, oy, w, h, self.rot)
+
+    bounds = property(get_bounds)
+
     def get_rot(self):
         """Get the rotation of this sprite."""
         return self._rot.angle
@@ -187,6 +386,7 @@ class Sprite(object):
     def set_source(self, value):
         """Set the source image for this sprite."""
         self._rect.source = value
+        self.invalidate_queue()
 
     source = property(get_source, set_source)
 
@@ -197,9 +397,22 @@ class Sprite(object):
     def set_texture(self, value):
         """Set the texture for this sprite."""
         self._rect.texture = value
+        self.invalidate_queue()
 
     texture = property(get_texture, set_texture)
 
+    def get_tex_coords(self):
+        """Get the texture coords of this sprite."""
+        return self._rect.tex_coords
+
+    def set_tex_coords(self, value):
+        """Set the texture coords of this sprite. This keeps the current
+        texture, so it can only switch between regions of the same texture.
+        """
+        self._rect.tex_coords = value
+
+    tex_coords = property(get_tex_coords, set_tex_coords)
+
     def show(self, do_show):
         """Show/hide this sprite."""
         #Ensure that this sprite has a parent
@@ -209,11 +422,21 @@ class Sprite(object):
 
         #Show this sprite
         if do_show and not self.visible:
-            self.parent.canvas.add(self._ig)
+            if self.queue is not None:
+                self.queue.add(self)
+
+            else:
+                self.parent.canvas.add(self._ig)
+                PROFILER.count("canvas_adds")
 
         #Hide this sprite
         elif not do_show and self.visible:
-            self.parent.canvas.remove(self._ig)
+            if self.queue is not None:
+                self.queue.remove(self)
+
+            else:
+                self.parent.canvas.remove(self._ig)
+                PROFILER.count("canvas_removes")
 
         #Update visibility state
         self._visible = do_show
@@ -231,24 +454,7 @@ class Sprite(object):
         w, h = self.size
         cx2, cy2 = sprite.center
         w2, h2 = sprite.size
-        dx = abs(cx2 - cx)
-        dy = abs(cy2 - cy)
-
-        #Do bounding box collision detection
-        if type == "box":
-            return (dx < (w + w2) / 2 and dy < (h + h2) / 2)
-
-        #Do circle-based collision detection
-        elif type == "circle":
-            r = max(w, h) / 2
-            r2 = max(w2, h2) / 2
-            dist = sqrt(dx ** 2 + dy ** 2)
-            return dist < r + r2
-
-        #Handle unknown collision type
-        else:
-            Logger.warning("Sprite: No such collision type '{}'".format(type))
-            return False
+        return hit_test(cx, cy, w, h, cx2, cy2, w2, h2, type)
 
     def update(self):
         """Update this sprite. Override this method in a derived class."""
@@ -0,0 +1,355 @@
+"""kvcheetah - SpriteStore API"""
+
+from array import array
+
+from kivy.core.image import Image as CoreImage
+
+try:
+    from ..math.vecarray import Vec2Array
+
+except ImportError:
+    from kvcheetah.math.vecarray import Vec2Array
+
+try:
+    from .sprite import Sprite
+
+except ImportError:
+    from sprite import Sprite
+
+
+#Classes
+#==============================================================================
+class SpriteStore(object):
+    """A structure-of-arrays container that keeps the state of many sprites in
+    contiguous columns so they can be updated in bulk.
+    """
+    def __init__(self, **kwargs):
+        """Setup this sprite store."""
+        self._parent = None
+
+        #Per-sprite state
+        self._count = 0
+        self._free = []
+        self._shown = array("B")
+        self._pos = array("f")
+        self._vel = array("f")
+        self._rot = array("f")
+        self._origin = array("f")
+        self._size = array("f")
+
+        #Process keyword args
+        if "parent" in kwargs:
+            self.parent = kwargs["parent"]
+
+    def get_parent(self):
+        """Get the parent of this sprite store."""
+        return self._parent
+
+    def set_parent(self, value):
+        """Set the parent of this sprite store."""
+        self._parent = value
+
+    parent = property(get_parent, set_parent)
+
+    def get_count(self):
+        """Get the number of sprites in this sprite store."""
+        return self._count - len(self._free)
+
+    count = property(get_count)
+
+    def grow(self):
+        """Append a row to each column of this sprite store."""
+        self._shown.append(0)
+        self._pos.extend((0, 0))
+        self._vel.extend((0, 0))
+        self._rot.append(0)
+        self._origin.extend((0, 0))
+        self._size.extend((1, 1))
+
+    def reset(self, i):
+        """Reset the given row of this sprite store to its default state."""
+        self._shown[i] = 0
+        self._pos[i * 2:i * 2 + 2] = array("f", (0, 0))
+        self._vel[i * 2:i * 2 + 2] = array("f", (0, 0))
+        self._rot[i] = 0
+        self._origin[i * 2:i * 2 + 2] = array("f", (0, 0))
+        self._size[i * 2:i * 2 + 2] = array("f", (1, 1))
+
+    def acquire(self):
+        """Reserve a row in this sprite store and return its index."""
+        #Reuse a free row if possible
+        if len(self._free) > 0:
+            i = self._free.pop()
+
+        #Otherwise grow the columns
+        else:
+            i = self._count
+            self.grow()
+            self._count += 1
+
+        self.reset(i)
+        self.invalidate(i)
+        return i
+
+    def release(self, i):
+        """Release the given row of this sprite store."""
+        self.reset(i)
+        self._free.append(i)
+        self.invalidate(i)
+
+    def invalidate(self, i):
+        """Flag the given row as changed. Override this method in a derived
+        class that renders the rows.
+        """
+        pass
+
+    def invalidate_all(self):
+        """Flag every row as changed. Override this method in a derived class
+        that renders the rows.
+        """
+        pass
+
+    def invalidate_pos(self):
+        """Flag the position of every row as changed. Override this method in
+        a derived class that can rebuild the positions alone.
+        """
+        self.invalidate_all()
+
+    def update_all(self, dt = 1):
+        """Apply the velocity of every sprite in this sprite store. The
+        velocity is scaled by dt, so a dt of 1 matches Sprite.update.
+        """
+        #Free rows have no velocity, so we can integrate the whole column
+        Vec2Array(self._pos).add_scaled(Vec2Array(self._vel), dt)
+        self.invalidate_pos()
+
+
+class StoreSprite(Sprite):
+    """A lightweight sprite that is a view onto a row of a sprite store."""
+    def __init__(self, **kwargs):
+        """Setup this sprite."""
+        self._store = kwargs["store"]
+        self._index = self._store.acquire()
+        self._layer = 0
+        self._visible = False
+        self._culled = False
+        self._color = (1, 1, 1, 1)
+        self._source = None
+        self._texture = None
+        self._tex_coords = (0, 0, 1, 0, 1, 1, 0, 1)
+
+        #Process keyword args
+        self.process_kwargs(kwargs)
+
+    def __del__(self):
+        """Destroy this sprite."""
+        #Return the row of this sprite to its store
+        try:
+            self._store.release(self._index)
+
+        except (AttributeError, ReferenceError):
+            pass
+
+    def process_kwargs(self, kwargs):
+        """Process the keyword args of this sprite."""
+        if "queue" in kwargs:
+            self.queue = kwargs["queue"]
+
+        if "layer" in kwargs:
+            self.layer = kwargs["layer"]
+
+        if "pos" in kwargs:
+            self.pos = kwargs["pos"]
+
+        if "velocity" in kwargs:
+            self.velocity = kwargs["velocity"]
+
+        if "size" in kwargs:
+            self.size = kwargs["size"]
+
+        if "origin" in kwargs:
+            self.origin = kwargs["origin"]
+
+        if "rot" in kwargs:
+            self.rot = kwargs["rot"]
+
+        if "color" in kwargs:
+            self.color = kwargs["color"]
+
+        if "source" in kwargs:
+            self.source = kwargs["source"]
+
+        if "texture" in kwargs:
+            self.texture = kwargs["texture"]
+
+    def get_store(self):
+        """Get the store of this sprite."""
+        return self._store
+
+    store = property(get_store)
+
+    def get_index(self):
+        """Get the row index of this sprite in its store."""
+        return self._index
+
+    index = property(get_index)
+
+    def get_parent(self):
+        """Get the parent of this sprite."""
+        return self._store.parent
+
+    parent = property(get_parent)
+
+    def get_queue(self):
+        """Get the render queue of this sprite. Store sprites are drawn by
+        their store, so this is always None.
+        """
+        return None
+
+    def set_queue(self, value):
+        """Store sprites are drawn by their store and cannot have a render
+        queue.
+        """
+        if value is not None:
+            raise ValueError(
+                "StoreSprite: Store sprites cannot have a render queue.")
+
+    queue = property(get_queue, set_queue)
+
+    def get_visible(self):
+        """Is this sprite visible?"""
+        return self._visible
+
+    visible = property(get_visible)
+
+    def get_pos(self):
+        """Get the position of this sprite."""
+        #Adjust current pos based on parent pos
+        i = self._index * 2
+        x = self._store._pos[i]
+        y = self._store._pos[i + 1]
+
+        if self.parent is not None:
+            px, py = self.parent.pos
+            x -= px
+            y -= py
+
+        return (x, y)
+
+    def set_pos(self, value):
+        """Set the position of this sprite."""
+        #Adjust new pos based on parent pos
+        x, y = value
+
+        if self.parent is not None:
+            px, py = self.parent.pos
+            x += px
+            y += py
+
+        i = self._index * 2
+        self._store._pos[i] = x
+        self._store._pos[i + 1] = y
+        self._store.invalidate(self._index)
+
+    pos = property(get_pos, set_pos)
+
+    def get_velocity(self):
+        """Get the velocity of this sprite."""
+        i = self._index * 2
+        return (self._store._vel[i], self._store._vel[i + 1])
+
+    def set_velocity(self, value):
+        """Set the velocity of this sprite."""
+        i = self._index * 2
+        self._store._vel[i:i + 2] = array("f", value)
+
+    velocity = property(get_velocity, set_velocity)
+
+    def get_size(self):
+        """Get the size of this sprite."""
+        i = self._index * 2
+        return (self._store._size[i], self._store._size[i + 1])
+
+    def set_size(self, value):
+        """Set the size of this sprite."""
+        i = self._index * 2
+        self._store._size[i:i + 2] = array("f", value)
+        self._store.invalidate(self._index)
+
+    size = property(get_size, set_size)
+
+    def get_origin(self):
+        """Get the origin of this sprite."""
+        i = self._index * 2
+        return (self._store._origin[i], self._store._origin[i + 1])
+
+    def set_origin(self, value):
+        """Set the origin of this sprite."""
+        i = self._index * 2
+        self._store._origin[i:i + 2] = array("f", value)
+        self._store.invalidate(self._index)
+
+    origin = property(get_origin, set_origin)
+
+    def get_rot(self):
+        """Get the rotation of this sprite."""
+        return self._store._rot[self._index]
+
+    def set_rot(self, value):
+        """Set the rotation of this sprite."""
+        self._store._rot[self._index] = value
+        self._store.invalidate(self._index)
+
+    rot = property(get_rot, set_rot)
+
+    def get_color(self):
+        """Get the color of this sprite."""
+        return self._color
+
+    def set_color(self, value):
+        """Set the color of this sprite."""
+        self._color = tuple(value)
+        self._store.invalidate(self._index)
+
+    color = property(get_color, set_color)
+
+    def get_source(self):
+        """Get the source image for this sprite."""
+        return self._source
+
+    def set_source(self, value):
+        """Set the source image for this sprite."""
+        self.texture = CoreImage(value).texture
+        self._source = value
+
+    source = property(get_source, set_source)
+
+    def get_texture(self):
+        """Get the texture for this sprite."""
+        return self._texture
+
+    def set_texture(self, value):
+        """Set the texture for this sprite."""
+        self._texture = value
+        self._source = None
+        self._tex_coords = tuple(value.tex_coords)
+        self._store.invalidate(self._index)
+
+    texture = property(get_texture, set_texture)
+
+    def get_tex_coords(self):
+        """Get the texture coords of this sprite."""
+        return self._tex_coords
+
+    def set_tex_coords(self, value):
+        """Set the texture coords of this sprite."""
+        self._tex_coords = tuple(value)
+        self._store.invalidate(self._index)
+
+    tex_coords = property(get_tex_coords, set_tex_coords)
+
+    def show(self, do_show):
+        """Show/hide this sprite."""
+        self._store._shown[self._index] = 1 if do_show else 0
+        self._store.invalidate(self._index)
+        self._visible = do_show
@@ -1,38 +1,359 @@
 """kvcheetah - TileMap API"""
 
+from array import array
+
+from kivy.clock import Clock
+from kivy.core.image import Image as CoreImage
 from kivy.graphics import (
-    ClearBuffers,
-    ClearColor,
-    Fbo,
     InstructionGroup,
+    Mesh,
     PopMatrix,
     PushMatrix,
-    Rectangle,
     Translate
 )
 from kivy.logger import Logger
 
+try:
+    from ..profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+
+#Globals
+#===============================================================================
+TILE_SIZE = 32
+CHUNK_SIZE = 16
+TILE_SOLID = 1
+QUAD_SIZE = 16 #4 vertices of x, y, u, v
+CHUNK_INDICES = array("H")
+
+for i in range(CHUNK_SIZE * CHUNK_SIZE):
+    CHUNK_INDICES.extend((
+        i * 4, i * 4 + 1, i * 4 + 2,
+        i * 4 + 2, i * 4 + 3, i * 4
+    ))
+
+FULL_HEIGHTS = array("B", [TILE_SIZE] * TILE_SIZE)
+EMPTY_HEIGHTS = array("B", [0] * TILE_SIZE)
+
+
+#Functions
+#===============================================================================
+def derive_heights(texture, threshold = 128):
+    """Derive the height profile of a tile from the alpha channel of its
+    texture. The profile holds the height of the highest opaque pixel of each
+    of the TILE_SIZE columns of the tile.
+    """
+    #The pixels are RGBA and start with the top row
+    w, h = texture.size
+    w = int(w)
+    h = int(h)
+    pixels = texture.pixels
+    heights = array("B", EMPTY_HEIGHTS)
+
+    for col in range(TILE_SIZE):
+        x = col * w // TILE_SIZE
+
+        for y in range(h):
+            if pixels[(y * w + x) * 4 + 3] >= threshold:
+                heights[col] = -(-(h - y) * TILE_SIZE // h)
+                break
+
+    return heights
+
 
 #Classes
 #===============================================================================
+class TileGrid(object):
+    """A compact grid of tile indices stored in a single array of unsigned
+    shorts. Rows are stored bottom to top like the rows of map data.
+    """
+    @staticmethod
+    def from_rows(rows):
+        """Return a tile grid with a copy of the given rows of tiles. Every row
+        must have the same length.
+        """
+        h = len(rows)
+        w = len(rows[0]) if h > 0 else 0
+        grid = TileGrid(w, h)
+
+        for y, row in enumerate(rows):
+            grid[y] = row
+
+        return grid
+
+    def __init__(self, width, height, tile = 0):
+        """Setup this tile grid."""
+        self._width = width
+        self._height = height
+        self._data = array("H", [tile]) * (width * height)
+
+    def __len__(self):
+        """Get the number of rows in this tile grid."""
+        return self._height
+
+    def __getitem__(self, i):
+        """Get a tile at (x, y) or a view of row y of this tile grid."""
+        if isinstance(i, tuple):
+            x, y = i
+            return self._data[self.offset(x, y)]
+
+        if i < 0:
+            i += self._height
+
+        if i < 0 or i >= self._height:
+            raise IndexError("TileGrid: Row index out of range.")
+
+        return self.row(i)
+
+    def __setitem__(self, i, value):
+        """Set a tile at (x, y) or replace row y of this tile grid."""
+        if isinstance(i, tuple):
+            x, y = i
+            self._data[self.offset(x, y)] = value
+            return
+
+        if i < 0:
+            i += self._height
+
+        if i < 0 or i >= self._height:
+            raise IndexError("TileGrid: Row index out of range.")
+
+        row = array("H", value)
+
+        if len(row) != self._width:
+            raise ValueError(
+                "TileGrid: Row has {} tiles, expected {}.".format(len(row),
+                self._width))
+
+        b = i * self._width
+        self._data[b:b + self._width] = row
+
+    def __iter__(self):
+        """Iterate over the rows of this tile grid."""
+        for y in range(self._height):
+            yield self.row(y)
+
+    def get_width(self):
+        """Get the width of this tile grid."""
+        return self._width
+
+    width = property(get_width)
+
+    def get_height(self):
+        """Get the height of this tile grid."""
+        return self._height
+
+    height = property(get_height)
+
+    def get_size(self):
+        """Get the size of this tile grid."""
+        return (self._width, self._height)
+
+    size = property(get_size)
+
+    def get_data(self):
+        """Get the flat array of tiles of this tile grid."""
+        return self._data
+
+    data = property(get_data)
+
+    def offset(self, x, y):
+        """Get the index of the tile at the given coords in the flat array of
+        tiles.
+        """
+        if x < 0 or x >= self._width or y < 0 or y >= self._height:
+            raise IndexError(
+                "TileGrid: Tile coords ({}, {}) out of range.".format(x, y))
+
+        return y * self._width + x
+
+    def get(self, x, y):
+        """Get the tile at the given coords."""
+        return self._data[self.offset(x, y)]
+
+    def set(self, x, y, tile):
+        """Set the tile at the given coords."""
+        self._data[self.offset(x, y)] = tile
+
+    def row(self, y):
+        """Return a writable view of the given row."""
+        b = y * self._width
+        return memoryview(self._data)[b:b + self._width]
+
+    def column(self, x):
+        """Return a copy of the given column."""
+        return self._data[x::self._width]
+
+    def set_column(self, x, tiles):
+        """Replace the given column."""
+        self._data[x::self._width] = array("H", tiles)
+
+    def clip(self, x, y, w, h):
+        """Clip the given rectangle to this tile grid. This returns the clipped
+        rectangle as (x, y, w, h).
+        """
+        x1 = max(x, 0)
+        y1 = max(y, 0)
+        x2 = min(x + w, self._width)
+        y2 = min(y + h, self._height)
+        return (x1, y1, max(x2 - x1, 0), max(y2 - y1, 0))
+
+    def fill(self, tile, x = 0, y = 0, w = None, h = None):
+        """Fill the given rectangle with a tile. By default the whole grid is
+        filled. This returns the clipped rectangle as (x, y, w, h).
+        """
+        if w is None:
+            w = self._width - x
+
+        if h is None:
+            h = self._height - y
+
+        x, y, w, h = self.clip(x, y, w, h)
+        run = array("H", [tile]) * w
+
+        for ty in range(y, y + h):
+            b = ty * self._width + x
+            self._data[b:b + w] = run
+
+        return (x, y, w, h)
+
+    def copy(self, x = 0, y = 0, w = None, h = None):
+        """Return a new tile grid with a copy of the given rectangle. By default
+        the whole grid is copied.
+        """
+        if w is None:
+            w = self._width - x
+
+        if h is None:
+            h = self._height - y
+
+        x, y, w, h = self.clip(x, y, w, h)
+        grid = TileGrid(w, h)
+
+        for ty in range(h):
+            b = (y + ty) * self._width + x
+            grid._data[ty * w:(ty + 1) * w] = self._data[b:b + w]
+
+        return grid
+
+    def paste(self, tiles, x, y):
+        """Copy a tile grid or rows of tiles into this tile grid with their
+        bottom-left corner at the given coords. This returns the clipped
+        rectangle that was changed as (x, y, w, h).
+        """
+        if not isinstance(tiles, TileGrid):
+            tiles = TileGrid.from_rows(tiles)
+
+        cx, cy, w, h = self.clip(x, y, tiles.width, tiles.height)
+
+        for ty in range(cy, cy + h):
+            src = (ty - y) * tiles.width + cx - x
+            dst = ty * self._width + cx
+            self._data[dst:dst + w] = tiles._data[src:src + w]
+
+        return (cx, cy, w, h)
+
+    def to_rows(self):
+        """Return the rows of this tile grid as lists."""
+        return [self._data[y * self._width:(y + 1) * self._width].tolist()
+            for y in range(self._height)]
+
+
+class TileChunk(object):
+    """A square block of tiles that is drawn with a single mesh."""
+    def __init__(self, tilemap, cx, cy):
+        """Setup this chunk."""
+        self.cx = cx
+        self.cy = cy
+
+        #Calculate the tile range covered by this chunk
+        w, h = tilemap.size
+        self.x1 = cx * CHUNK_SIZE
+        self.y1 = cy * CHUNK_SIZE
+        self.x2 = min(self.x1 + CHUNK_SIZE, w)
+        self.y2 = min(self.y1 + CHUNK_SIZE, h)
+
+        #Precompute the position of each tile quad. Only the texture coords
+        #change when tiles are redrawn.
+        n = (self.x2 - self.x1) * (self.y2 - self.y1)
+        self.vertices = array("f", bytes(n * QUAD_SIZE * 4))
+        v = self.vertices
+        b = 0
+
+        for y in range(self.y1, self.y2):
+            py = y * TILE_SIZE
+
+            for x in range(self.x1, self.x2):
+                px = x * TILE_SIZE
+                v[b:b + QUAD_SIZE:4] = array("f", 
+                    (px, px + TILE_SIZE, px + TILE_SIZE, px))
+                v[b + 1:b + QUAD_SIZE:4] = array("f", 
+                    (py, py, py + TILE_SIZE, py + TILE_SIZE))
+                b += QUAD_SIZE
+
+        self.mesh = Mesh(mode = "triangles", texture = tilemap.texture)
+        self.fill(tilemap, self.x1, self.y1, self.x2, self.y2)
+        self.upload()
+
+    def fill(self, tilemap, x1, y1, x2, y2):
+        """Write the texture coords of the tiles in the given range into the
+        vertex buffer of this chunk. The range is clipped to this chunk.
+        """
+        x1 = max(x1, self.x1)
+        y1 = max(y1, self.y1)
+        x2 = min(x2, self.x2)
+        y2 = min(y2, self.y2)
+        v = self.vertices
+        us = tilemap._tile_us
+        vs = tilemap._tile_vs
+        data = tilemap.map_data.data
+        map_w = tilemap.map_data.width
+        w = self.x2 - self.x1
+
+        for y in range(y1, y2):
+            b = ((y - self.y1) * w + x1 - self.x1) * QUAD_SIZE
+
+            for tile in data[y * map_w + x1:y * map_w + x2]:
+                v[b + 2:b + QUAD_SIZE:4] = us[tile]
+                v[b + 3:b + QUAD_SIZE:4] = vs[tile]
+                b += QUAD_SIZE
+
+    def upload(self):
+        """Upload the vertex buffer of this chunk to its mesh."""
+        n = len(self.vertices) // QUAD_SIZE
+        self.mesh.vertices = self.vertices
+        self.mesh.indices = memoryview(CHUNK_INDICES)[:n * 6]
+        PROFILER.count("chunk_uploads")
+
+
 class TileMap(object):
-    """Base class for a tilemap."""
+    """Base class for a tilemap. The tilemap is split into chunks, and only the
+    chunks that intersect the visible area of the parent are rendered.
+    """
     def __init__(self, **kwargs):
         """Setup this tilemap."""
         self._parent = None
         self._tileset = None
+        self._texture = None
+        self._tile_us = []
+        self._tile_vs = []
+        self._tile_flags = array("B")
+        self._tile_textures = []
+        self._tile_heights = None
         self._map_data = None
-        self._tiles = None
         self._visible = False
+        self._chunks = {}
+        self._dirty = []
+        self._trigger = Clock.create_trigger(self.redraw_dirty)
         self._ig = InstructionGroup()
         self._offset = Translate(0, 0)
-        self._fbo = Fbo(size = (32, 32))
-        self._rect = Rectangle(pos = (0, 0), size = (32, 32), 
-            texture = self._fbo.texture)
+        self._chunk_ig = InstructionGroup()
 
         self._ig.add(PushMatrix())
         self._ig.add(self._offset)
-        self._ig.add(self._rect)
+        self._ig.add(self._chunk_ig)
         self._ig.add(PopMatrix())
 
         #Process keyword args
@@ -42,6 +363,12 @@ class TileMap(object):
         if "tileset" in kwargs:
             self.tileset = kwargs["tileset"]
 
+        if "tile_flags" in kwargs:
+            self.tile_flags = kwargs["tile_flags"]
+
+        if "tile_heights" in kwargs:
+            self.tile_heights = kwargs["tile_heights"]
+
         if "map_data" in kwargs:
             self.map_data = kwargs["map_data"]
 
@@ -57,8 +384,8 @@ class TileMap(object):
         except ReferenceError:
             pass
 
-        #We must clear the Fbo to prevent a memory leak
-        self._fbo.clear()
+        #Release the chunk meshes
+        self.release_chunks()
 
     def get_parent(self):
         """Get the parent of this tilemap."""
@@ -70,8 +397,12 @@ class TileMap(object):
         if self.visible:
             self.show(False)
 
-        #Set the new parent
+        #Set the new parent and keep the current offset relative to it
+        offset = self.offset
         self._parent = value
+        self.offset = offset
+
+    parent = property(get_parent, set_parent)
 
     def get_visible(self):
         """Get the visibility state of this tilemap."""
@@ -84,7 +415,7 @@ class TileMap(object):
         if self.map_data is None:
             return (0, 0)
 
-        return (len(self.map_data[0]), len(self.map_data))
+        return self.map_data.size
 
     size = property(get_size)
 
@@ -93,23 +424,184 @@ class TileMap(object):
         return self._tileset
 
     def set_tileset(self, value):
-        """Set the tileset for this tilemap."""
+        """Set the tileset for this tilemap. Every tile must be a region of the
+        same texture, such as the images of an atlas.
+        """
         self._tileset = value
+        self.resolve_tileset()
         self.update()
 
     tileset = property(get_tileset, set_tileset)
 
+    def get_texture(self):
+        """Get the texture shared by the tiles of this tilemap."""
+        return self._texture
+
+    texture = property(get_texture)
+
+    def get_tile_flags(self):
+        """Get the flags of each tile in the tileset of this tilemap."""
+        return self._tile_flags
+
+    def set_tile_flags(self, value):
+        """Set the flags of each tile in the tileset of this tilemap. A tile
+        with the TILE_SOLID flag blocks sprites.
+        """
+        self._tile_flags = array("B", value)
+
+    tile_flags = property(get_tile_flags, set_tile_flags)
+
+    def is_solid(self, tile):
+        """Check if the given tile is solid."""
+        return (tile < len(self._tile_flags) and 
+            (self._tile_flags[tile] & TILE_SOLID) != 0)
+
+    def get_tile_heights(self):
+        """Get the height profiles of the tiles in the tileset of this tilemap.
+        The profiles are stored back to back, TILE_SIZE entries per tile.
+        """
+        if self._tile_heights is None:
+            self.set_tile_heights([None] * len(self._tile_textures))
+
+        return self._tile_heights
+
+    def set_tile_heights(self, value):
+        """Set the height profile of each tile in the tileset of this tilemap.
+        Each profile is a sequence of TILE_SIZE heights, one per pixel column,
+        or None to derive the profile from the alpha channel of the tile.
+        """
+        heights = array("B")
+
+        for i, profile in enumerate(value):
+            #Derive missing profiles from the tile texture
+            if profile is None:
+                if i < len(self._tile_textures):
+                    profile = derive_heights(self._tile_textures[i])
+
+                else:
+                    profile = FULL_HEIGHTS
+
+            elif len(profile) != TILE_SIZE:
+                Logger.warning(
+                    "TileMap: Height profile of tile {} is invalid.".format(i))
+                profile = FULL_HEIGHTS
+
+            heights.extend(profile)
+
+        self._tile_heights = heights
+
+    tile_heights = property(get_tile_heights, set_tile_heights)
+
+    def resolve_tileset(self):
+        """Resolve each tile source into texture coords on the shared
+        texture.
+        """
+        self._texture = None
+        self._tile_us = []
+        self._tile_vs = []
+        self._tile_textures = []
+        self._tile_heights = None
+
+        if self._tileset is None:
+            return
+
+        #By default every tile except the first one is solid
+        if len(self._tile_flags) != len(self._tileset):
+            self._tile_flags = array("B", [0] + 
+                [TILE_SOLID] * (len(self._tileset) - 1))
+
+        for source in self._tileset:
+            texture = CoreImage(source).texture
+
+            if self._texture is None:
+                self._texture = texture
+
+            elif texture.id != self._texture.id:
+                Logger.warning(
+                    "TileMap: Tile '{}' is not on the tileset texture.".format(
+                        source))
+
+            u0, v0, u1, v1, u2, v2, u3, v3 = texture.tex_coords
+            self._tile_textures.append(texture)
+            self._tile_us.append(array("f", (u0, u1, u2, u3)))
+            self._tile_vs.append(array("f", (v0, v1, v2, v3)))
+
     def get_map_data(self):
         """Get the map data for this tilemap."""
         return self._map_data
 
     def set_map_data(self, value):
-        """Set the map data for this tilemap."""
+        """Set the map data for this tilemap. This can be a tile grid or a list
+        of rows of tiles, which is copied into a new tile grid.
+        """
+        if value is not None and not isinstance(value, TileGrid):
+            value = TileGrid.from_rows(value)
+
         self._map_data = value
         self.update()
 
     map_data = property(get_map_data, set_map_data)
 
+    def get_tile(self, x, y):
+        """Get the tile at the given tile coords."""
+        return self.map_data.get(x, y)
+
+    def set_tile(self, x, y, tile):
+        """Set the tile at the given tile coords. Only the affected part of the
+        tilemap is redrawn on the next frame.
+        """
+        self.map_data.set(x, y, tile)
+        self.invalidate(x, y, 1, 1)
+
+    def set_region(self, x, y, tiles):
+        """Copy a tile grid or rows of tiles into this tilemap with their
+        bottom-left corner at the given tile coords. Only the affected part of
+        the tilemap is redrawn on the next frame.
+        """
+        self.invalidate(*self.map_data.paste(tiles, x, y))
+
+    def fill_region(self, x, y, w, h, tile):
+        """Fill the given rectangle of this tilemap with a tile. Only the
+        affected part of the tilemap is redrawn on the next frame.
+        """
+        self.invalidate(*self.map_data.fill(tile, x, y, w, h))
+
+    def invalidate(self, x, y, w, h):
+        """Flag the given rectangle of tiles for a redraw on the next frame."""
+        if w <= 0 or h <= 0:
+            return
+
+        self._dirty.append((x, y, w, h))
+        self._trigger()
+
+    @PROFILER.profile("tilemap")
+    def redraw_dirty(self, *args):
+        """Redraw the tiles in the dirty rectangles. Chunks that are not
+        rendered are skipped since they are drawn when they scroll into view.
+        """
+        #Refill the dirty tiles of each rendered chunk
+        chunks = set()
+
+        for x, y, w, h in self._dirty:
+            cx1 = max(x, 0) // CHUNK_SIZE
+            cy1 = max(y, 0) // CHUNK_SIZE
+            cx2 = (x + w - 1) // CHUNK_SIZE
+            cy2 = (y + h - 1) // CHUNK_SIZE
+
+            for cy in range(cy1, cy2 + 1):
+                for cx in range(cx1, cx2 + 1):
+                    chunk = self._chunks.get((cx, cy))
+
+                    if chunk is not None:
+                        chunk.fill(self, x, y, x + w, y + h)
+                        chunks.add(chunk)
+
+        self._dirty = []
+
+        #Upload each changed chunk once
+        for chunk in chunks:
+            chunk.upload()
+
     def get_offset(self):
         """Get the offset of this tilemap."""
         #Adjust the current offset based on the parent pos
@@ -125,19 +617,109 @@ class TileMap(object):
     def set_offset(self, value):
         """Set the offset of this tilemap."""
         #Adjust the new offset based on the parent pos
+        x, y = value
+        x = -x
+        y = -y
+
         if self.parent is not None:
-            x, y = value
             px, py = self.parent.pos
             x += px
             y += py
-            value = (-x, -y)
 
-        self._offset.xy = value
+        self._offset.xy = (x, y)
+        self.cull()
 
     offset = property(get_offset, set_offset)
 
+    def get_chunk_count(self):
+        """Get the number of chunks that are currently rendered."""
+        return len(self._chunks)
+
+    chunk_count = property(get_chunk_count)
+
+    def get_view_rect(self):
+        """Get the visible area of the parent in map coords as
+        (x, y, w, h). A camera parent provides its visible rect, so the
+        tilemap is culled against the world area in view.
+        """
+        ox, oy = self.offset
+
+        if hasattr(self.parent, "visible_rect"):
+            x, y, w, h = self.parent.visible_rect
+            return (x + ox, y + oy, w, h)
+
+        w, h = self.parent.size
+        return (ox, oy, w, h)
+
+    def get_view_property(self):
+        """Get the name of the parent property that changes with the visible
+        area of the parent.
+        """
+        if hasattr(self.parent, "visible_rect"):
+            return "visible_rect"
+
+        return "size"
+
+    def get_visible_chunks(self):
+        """Get the range of chunks that intersect the visible area of the
+        parent as (cx1, cy1, cx2, cy2), where cx2 and cy2 are exclusive.
+        """
+        w, h = self.size
+
+        if self.parent is None or w == 0 or h == 0:
+            return (0, 0, 0, 0)
+
+        #Calculate the visible area in map coords
+        ox, oy, vw, vh = self.get_view_rect()
+        chunk_px = CHUNK_SIZE * TILE_SIZE
+        cw = (w + CHUNK_SIZE - 1) // CHUNK_SIZE
+        ch = (h + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+        #Clip the chunk range to the tilemap
+        return (
+            max(int(ox // chunk_px), 0),
+            max(int(oy // chunk_px), 0),
+            min(int((ox + vw) // chunk_px) + 1, cw),
+            min(int((oy + vh) // chunk_px) + 1, ch)
+        )
+
+    @PROFILER.profile("tilemap")
+    def cull(self, *args):
+        """Attach the chunks that intersect the visible area of the parent and
+        release the ones that don't.
+        """
+        #Skip this if there is nothing to draw
+        if self.tileset is None or self.map_data is None:
+            return
+
+        cx1, cy1, cx2, cy2 = self.get_visible_chunks()
+
+        #Release chunks that scrolled out of view
+        for key in list(self._chunks.keys()):
+            cx, cy = key
+
+            if cx < cx1 or cx >= cx2 or cy < cy1 or cy >= cy2:
+                chunk = self._chunks.pop(key)
+                self._chunk_ig.remove(chunk.mesh)
+                PROFILER.count("canvas_removes")
+
+        #Create chunks that scrolled into view
+        for cy in range(cy1, cy2):
+            for cx in range(cx1, cx2):
+                if (cx, cy) not in self._chunks:
+                    chunk = TileChunk(self, cx, cy)
+                    self._chunks[(cx, cy)] = chunk
+                    self._chunk_ig.add(chunk.mesh)
+                    PROFILER.count("canvas_adds")
+
+    def release_chunks(self):
+        """Release every chunk of this tilemap."""
+        PROFILER.count("canvas_removes", len(self._chunks))
+        self._chunks = {}
+        self._chunk_ig.clear()
+
     def update(self):
-        """Update the tilemap texture."""
+        """Update the tilemap meshes."""
         #Skip this if there is no tileset or map data
         if self.tileset is None:
             Logger.warning("TileMap: There is no assigned tileset.")
@@ -147,36 +729,10 @@ class TileMap(object):
             Logger.warning("TileMap: There is no map data.")
             return
 
-        #Update Fbo size
-        w, h = self.size
-        w = w * 32
-        h = h * 32
-        self._fbo.size = (w, h)
-        self._rect.size = (w, h)
-        self._rect.texture = self._fbo.texture
-
-        #Draw the new tiles
-        self._fbo.clear()
-
-        with self._fbo:
-            ClearColor(0, 0, 0, 0)
-            ClearBuffers()
-
-            #Draw each tile
-            x = 0
-            y = 0
-
-            for row in self.map_data:
-                for tile in row:
-                    Rectangle(pos = (x, y), size = (32, 32), 
-                        source = self.tileset[tile])
-                    x += 32
-
-                y += 32
-                x = 0
-
-            #Force a redraw of the Fbo
-            self._fbo.draw()
+        #Discard the old chunks and render the visible ones again
+        self._dirty = []
+        self.release_chunks()
+        self.cull()
 
     def show(self, do_show):
         """Show/hide this tilemap."""
@@ -188,10 +744,13 @@ class TileMap(object):
         #Show the tilemap
         if do_show and not self.visible:
             self.parent.canvas.add(self._ig)
+            self.parent.fbind(self.get_view_property(), self.cull)
+            self.cull()
 
         #Hide the tilemap
         elif not do_show and self.visible:
             self.parent.canvas.remove(self._ig)
+            self.parent.funbind(self.get_view_property(), self.cull)
 
         #Update vibility state
         self._visible = do_show
@@ -206,14 +765,184 @@ class TileMap(object):
         vx, vy = sprite.velocity
         x += ox + vx
         y += oy + vy
-        tx = int(x / 32)
-        ty = int(y / 32)
+        tx = int(x // TILE_SIZE)
+        ty = int(y // TILE_SIZE)
 
         #Return the index of the tile
         w, h = self.size
 
-        if tx > 0 and tx < w and ty > 0 and ty < h:
-            return self.map_data[ty][tx]
+        if tx >= 0 and tx < w and ty >= 0 and ty < h:
+            return self.map_data.get(tx, ty)
 
         else:
-            return -1
\ No newline at end of file
+            return -1
+
+    def query_rect(self, x, y, w, h, flags = 0):
+        """Return a list of (tx, ty, tile) for every tile that overlaps the
+        given rectangle in map coords. If flags is not 0, only tiles with at
+        least 1 of the given flags are returned.
+        """
+        mw, mh = self.size
+
+        #Calculate the range of overlapped tiles
+        tx1 = max(int(x // TILE_SIZE), 0)
+        ty1 = max(int(y // TILE_SIZE), 0)
+        tx2 = min(int(-(-(x + w) // TILE_SIZE)), mw)
+        ty2 = min(int(-(-(y + h) // TILE_SIZE)), mh)
+
+        #Gather the tiles in range
+        data = self.map_data.data
+        tile_flags = self._tile_flags
+        n = len(tile_flags)
+        tiles = []
+
+        for ty in range(ty1, ty2):
+            b = ty * mw
+
+            for tx in range(tx1, tx2):
+                tile = data[b + tx]
+
+                if flags == 0 or (tile < n and (tile_flags[tile] & flags)):
+                    tiles.append((tx, ty, tile))
+
+        return tiles
+
+    def is_solid_at(self, tx, ty):
+        """Check if the tile at the given tile coords is solid. Tiles outside
+        of this tilemap are not solid.
+        """
+        w, h = self.size
+
+        if tx < 0 or tx >= w or ty < 0 or ty >= h:
+            return False
+
+        return self.is_solid(self.map_data.get(tx, ty))
+
+    def collide(self, sprite):
+        """Check which solid tiles overlap the bounding box of the given sprite.
+        This returns a list of (tx, ty, tile) for the overlapped solid tiles and
+        the (x, y) vector that moves the sprite out of them.
+        """
+        #Calculate the bounding box of the sprite in map coords
+        ox, oy = self.offset
+        cx, cy = sprite.center
+        w, h = sprite.size
+        x1 = cx + ox - w / 2
+        y1 = cy + oy - h / 2
+        x2 = x1 + w
+        y2 = y1 + h
+        tiles = self.query_rect(x1, y1, w, h, TILE_SOLID)
+
+        #Push the sprite out of each tile along the shortest open side. Sides
+        #shared with another solid tile are skipped, so the sprite does not
+        #catch on the seams between tiles.
+        px = 0
+        py = 0
+
+        for tx, ty, tile in tiles:
+            left = tx * TILE_SIZE
+            bottom = ty * TILE_SIZE
+            pushes = []
+
+            if not self.is_solid_at(tx - 1, ty):
+                pushes.append((left - x2, 0))
+
+            if not self.is_solid_at(tx + 1, ty):
+                pushes.append((left + TILE_SIZE - x1, 0))
+
+            if not self.is_solid_at(tx, ty - 1):
+                pushes.append((0, bottom - y2))
+
+            if not self.is_solid_at(tx, ty + 1):
+                pushes.append((0, bottom + TILE_SIZE - y1))
+
+            if len(pushes) == 0:
+                continue
+
+            dx, dy = min(pushes, key = lambda p: abs(p[0]) + abs(p[1]))
+
+            #Keep the largest push along each axis
+            if abs(dx) > abs(px):
+                px = dx
+
+            if abs(dy) > abs(py):
+                py = dy
+
+        return (tiles, (px, py))
+
+    def get_height(self, tile, col):
+        """Get the height of the given pixel column of the given tile. Tiles
+        that are not solid have no height.
+        """
+        heights = self.tile_heights
+        i = tile * TILE_SIZE + col
+
+        if i >= len(heights) or not self.is_solid(tile):
+            return 0
+
+        return heights[i]
+
+    def ground_height(self, x, y):
+        """Get the height of the ground surface at the given point in map
+        coords. Only the tile at the point and the tiles directly above and
+        below it are checked, so this returns None if there is no ground
+        within 1 tile of the point.
+        """
+        w, h = self.size
+        tx = int(x // TILE_SIZE)
+        ty = int(y // TILE_SIZE)
+
+        if tx < 0 or tx >= w:
+            return None
+
+        col = int(x - tx * TILE_SIZE)
+        get = self.map_data.get
+
+        #A full column may continue into the tile above
+        if ty >= 0 and ty < h:
+            height = self.get_height(get(tx, ty), col)
+
+            if height == TILE_SIZE and ty + 1 < h:
+                above = self.get_height(get(tx, ty + 1), col)
+
+                if above > 0:
+                    return (ty + 1) * TILE_SIZE + above
+
+            if height > 0:
+                return ty * TILE_SIZE + height
+
+        #Otherwise the ground may be in the tile below
+        ty -= 1
+
+        if ty >= 0 and ty < h:
+            height = self.get_height(get(tx, ty), col)
+
+            if height > 0:
+                return ty * TILE_SIZE + height
+
+        return None
+
+    def resolve_slope(self, sprite, snap = 0):
+        """Get the vertical distance that places the bottom center of the given
+        sprite on the ground. Sprites that sank into the ground are pushed up.
+        Sprites up to snap pixels above the ground are pulled down, which keeps
+        them on the ground while walking down a slope. This returns 0 if the
+        sprite is not touching the ground.
+        """
+        #Calculate the bottom center of the sprite in map coords
+        ox, oy = self.offset
+        cx, cy = sprite.center
+        w, h = sprite.size
+        x = cx + ox
+        y = cy + oy - h / 2
+        ground = self.ground_height(x, y)
+
+        if ground is None:
+            return 0
+
+        dy = ground - y
+
+        if dy > 0 or -dy <= snap:
+            return dy
+
+        return 0
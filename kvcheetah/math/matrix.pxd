@@ -0,0 +1,28 @@
+"""kvcheetah - Matrix API"""
+
+
+#Functions
+#==============================================================================
+cdef void mat4_mul(const float *a, const float *b, float *out) noexcept nogil
+cdef void mat4_transform(const float *m, const float *v, float *out) noexcept nogil
+cdef void mat4_transform_points(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil
+cdef void mat4_transform_xy(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil
+
+
+cdef void affine2d_mul(const float *a, const float *b, float *out) noexcept nogil
+cdef void affine2d_transform(const float *m, const float *v, float *out) noexcept nogil
+cdef void affine2d_transform_xy(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil
+cdef bint affine2d_invert(const float *m, float *out) noexcept nogil
+
+
+#Classes
+#==============================================================================
+cdef class Mat4(object):
+    cdef float data[16]
+
+
+cdef class Affine2D(object):
+    cdef float data[6]
@@ -1,24 +1,164 @@
 """kvcheetah - Matrix API"""
 
+cimport cython
+from libc.string cimport memcpy
 from math import cos, radians, sin, tan
 
-from .vector import Vec4
+from .vector cimport Vec2, Vec4, copy_floats, fill_buffer, vec2_new
+
+
+#Globals
+#==============================================================================
+cdef Py_ssize_t MAT4_SHAPE[2]
+cdef Py_ssize_t MAT4_STRIDES[2]
+cdef Py_ssize_t AFFINE2D_SHAPE[2]
+cdef Py_ssize_t AFFINE2D_STRIDES[2]
+
+MAT4_SHAPE[0] = 4
+MAT4_SHAPE[1] = 4
+MAT4_STRIDES[0] = 4 * sizeof(float)
+MAT4_STRIDES[1] = sizeof(float)
+AFFINE2D_SHAPE[0] = 3
+AFFINE2D_SHAPE[1] = 2
+AFFINE2D_STRIDES[0] = 2 * sizeof(float)
+AFFINE2D_STRIDES[1] = sizeof(float)
+
+
+#Functions
+#==============================================================================
+cdef void mat4_mul(const float *a, const float *b, float *out) noexcept nogil:
+    """Multiply 2 column-major matrices. out may be the same as a or b."""
+    cdef float res[16]
+    cdef int x, y
+
+    for x in range(4):
+        for y in range(4):
+            res[x * 4 + y] = (a[y] * b[x * 4] + a[4 + y] * b[x * 4 + 1] +
+                a[8 + y] * b[x * 4 + 2] + a[12 + y] * b[x * 4 + 3])
+
+    memcpy(out, res, sizeof(res))
+
+
+cdef void mat4_transform(const float *m, const float *v, float *out) noexcept nogil:
+    """Multiply a column-major matrix and a vector. out may be the same as
+    v.
+    """
+    cdef float res[4]
+    cdef int y
+
+    for y in range(4):
+        res[y] = (m[y] * v[0] + m[4 + y] * v[1] + m[8 + y] * v[2] +
+            m[12 + y] * v[3])
+
+    memcpy(out, res, sizeof(res))
+
+
+cdef void mat4_transform_points(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil:
+    """Multiply a column-major matrix and n packed 4-component points. dst may
+    be the same as src.
+    """
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        mat4_transform(m, src + i * 4, dst + i * 4)
+
+
+cdef void mat4_transform_xy(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil:
+    """Multiply a column-major matrix and n packed 2D points. The points are
+    treated as (x, y, 0, 1) and no perspective divide is applied. dst may be
+    the same as src.
+    """
+    cdef Py_ssize_t i
+    cdef float x, y
+
+    for i in range(n):
+        x = src[i * 2]
+        y = src[i * 2 + 1]
+        dst[i * 2] = m[0] * x + m[4] * y + m[12]
+        dst[i * 2 + 1] = m[1] * x + m[5] * y + m[13]
+
+
+cdef void affine2d_mul(const float *a, const float *b, float *out) noexcept nogil:
+    """Multiply 2 column-major 3x2 affine matrices. out may be the same as a or
+    b.
+    """
+    cdef float res[6]
+    res[0] = a[0] * b[0] + a[2] * b[1]
+    res[1] = a[1] * b[0] + a[3] * b[1]
+    res[2] = a[0] * b[2] + a[2] * b[3]
+    res[3] = a[1] * b[2] + a[3] * b[3]
+    res[4] = a[0] * b[4] + a[2] * b[5] + a[4]
+    res[5] = a[1] * b[4] + a[3] * b[5] + a[5]
+    memcpy(out, res, sizeof(res))
+
+
+cdef void affine2d_transform(const float *m, const float *v, float *out) noexcept nogil:
+    """Multiply a column-major 3x2 affine matrix and a 2D point. out may be the
+    same as v.
+    """
+    cdef float x = v[0]
+    cdef float y = v[1]
+    out[0] = m[0] * x + m[2] * y + m[4]
+    out[1] = m[1] * x + m[3] * y + m[5]
+
+
+cdef void affine2d_transform_xy(const float *m, const float *src, float *dst,
+    Py_ssize_t n) noexcept nogil:
+    """Multiply a column-major 3x2 affine matrix and n packed 2D points. dst may
+    be the same as src.
+    """
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        affine2d_transform(m, src + i * 2, dst + i * 2)
+
+
+cdef bint affine2d_invert(const float *m, float *out) noexcept nogil:
+    """Invert a column-major 3x2 affine matrix. out may be the same as m.
+    Returns False if the matrix cannot be inverted.
+    """
+    cdef float det = m[0] * m[3] - m[1] * m[2]
+    cdef float res[6]
+
+    if det == 0:
+        return False
+
+    res[0] = m[3] / det
+    res[1] = -m[1] / det
+    res[2] = -m[2] / det
+    res[3] = m[0] / det
+    res[4] = -(res[0] * m[4] + res[2] * m[5])
+    res[5] = -(res[1] * m[4] + res[3] * m[5])
+    memcpy(out, res, sizeof(res))
+    return True
 
 
 #Classes
 #==============================================================================
 cdef class Mat4(object):
-    """A 4x4 matrix."""
-    cdef float data[16]
+    """A 4x4 matrix. Matrices support the buffer protocol as a 4x4 array of
+    floats indexed the same way as the matrix, so memoryview(m) and
+    numpy.asarray(m) share the data of the matrix.
+    """
+    @staticmethod
+    def from_buffer(buf):
+        """Return a matrix with a copy of 16 floats from a buffer. The floats
+        must be in the same order as the buffer of a matrix.
+        """
+        cdef Mat4 m = Mat4()
+        copy_floats(m.data, buf, 16)
+        return m
 
     @staticmethod
     def identity():
         """Return a 4x4 identity matrix."""
-        m = Mat4()
-
-        for i in range(4):
-            m[i, i] = 1
-
+        cdef Mat4 m = Mat4()
+        m.data[0] = 1
+        m.data[5] = 1
+        m.data[10] = 1
+        m.data[15] = 1
         return m
 
     @staticmethod
@@ -96,6 +236,8 @@ cdef class Mat4(object):
 
     def __cinit__(self, *args):
         """Setup this matrix."""
+        cdef int i
+
         #Init data
         if len(args) == 0:
             for i in range(16):
@@ -103,10 +245,7 @@ cdef class Mat4(object):
 
         #Copy matrix
         elif isinstance(args[0], Mat4):
-            m = args[0]
-
-            for i in range(4):
-                self.data[i] = m.data[i]
+            memcpy(self.data, (<Mat4>args[0]).data, sizeof(self.data))
 
         #Copy data
         else:
@@ -138,24 +277,319 @@ cdef class Mat4(object):
         """Return the representation of this matrix."""
         return str(self)
 
-    def __mul__(self, b):
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        """Expose the data of this matrix as a buffer."""
+        fill_buffer(buffer, self, self.data, 2, MAT4_SHAPE, MAT4_STRIDES,
+            flags)
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        """Release a buffer of this matrix."""
+        pass
+
+    def __mul__(Mat4 self, b):
         """Multiply this matrix with another matrix or a vector."""
+        cdef Mat4 m
+        cdef Vec4 v
+
         #Multiply 2 matrices
         if isinstance(b, Mat4):
-            res = Mat4()
-
-            for y in range(4):
-                for x in range(4):
-                    for i in range(4):
-                        res[x, y] += self[i, y] * b[x, i]
-
-            return res
+            m = Mat4()
+            mat4_mul(self.data, (<Mat4>b).data, m.data)
+            return m
 
         #Multiply a matrix and a vector
         elif isinstance(b, Vec4):
-            res = Vec4()
-            res.x = self[0, 0] * b.x + self[1, 0] * b.y + self[2, 0] * b.z + self[3, 0] * b.w
-            res.y = self[0, 1] * b.x + self[1, 1] * b.y + self[2, 1] * b.z + self[3, 1] * b.w
-            res.z = self[0, 2] * b.x + self[1, 2] * b.y + self[2, 2] * b.z + self[3, 2] * b.w
-            res.w = self[0, 3] * b.x + self[1, 3] * b.y + self[2, 3] * b.z + self[3, 3] * b.w
-            return res
+            v = Vec4()
+            mat4_transform(self.data, (<Vec4>b).data, v.data)
+            return v
+
+        return NotImplemented
+
+    def __imul__(Mat4 self, Mat4 b):
+        """Multiply this matrix with another matrix in place."""
+        mat4_mul(self.data, b.data, self.data)
+        return self
+
+    def copy(self):
+        """Return a copy of this matrix."""
+        return Mat4(self)
+
+    def imul(self, Mat4 b):
+        """Multiply this matrix with another matrix in place and return this
+        matrix.
+        """
+        mat4_mul(self.data, b.data, self.data)
+        return self
+
+    def mul_into(self, Mat4 b, Mat4 out):
+        """Multiply this matrix with another matrix and store the result in the
+        given matrix. out may be this matrix or b. Returns out.
+        """
+        mat4_mul(self.data, b.data, out.data)
+        return out
+
+    @cython.boundscheck(False)
+    def transform_points(self, const float[::1] src, float[::1] dst,
+        release_gil = False):
+        """Transform the packed (x, y, z, w) points of a contiguous float
+        buffer such as array("f") and store them in another buffer of the same
+        length. dst may be src. The GIL is released during the loop if
+        release_gil is True. Returns dst.
+        """
+        cdef Py_ssize_t n = src.shape[0]
+
+        if n % 4 != 0:
+            raise ValueError("Buffer length must be a multiple of 4.")
+
+        if dst.shape[0] != n:
+            raise ValueError("Buffers must have the same length.")
+
+        if n == 0:
+            return dst.base
+
+        if release_gil:
+            with nogil:
+                mat4_transform_points(self.data, &src[0], &dst[0], n // 4)
+
+        else:
+            mat4_transform_points(self.data, &src[0], &dst[0], n // 4)
+
+        return dst.base
+
+    @cython.boundscheck(False)
+    def transform_xy(self, const float[::1] src, float[::1] dst,
+        release_gil = False):
+        """Transform the packed (x, y) points of a contiguous float buffer such
+        as array("f") and store them in another buffer of the same length. dst
+        may be src. The GIL is released during the loop if release_gil is
+        True. Returns dst.
+        """
+        cdef Py_ssize_t n = src.shape[0]
+
+        if n % 2 != 0:
+            raise ValueError("Buffer length must be a multiple of 2.")
+
+        if dst.shape[0] != n:
+            raise ValueError("Buffers must have the same length.")
+
+        if n == 0:
+            return dst.base
+
+        if release_gil:
+            with nogil:
+                mat4_transform_xy(self.data, &src[0], &dst[0], n // 2)
+
+        else:
+            mat4_transform_xy(self.data, &src[0], &dst[0], n // 2)
+
+        return dst.base
+
+    def transform_into(self, Vec4 vec, Vec4 out):
+        """Multiply this matrix and a vector and store the result in the given
+        vector. out may be vec. Returns out.
+        """
+        mat4_transform(self.data, vec.data, out.data)
+        return out
+
+
+cdef class Affine2D(object):
+    """A 3x2 affine matrix for 2D transforms. Elements are indexed as
+    m[column, row] like Mat4, and the last column holds the translation.
+    Affine matrices support the buffer protocol as a 3x2 array of floats.
+    """
+    @staticmethod
+    def from_buffer(buf):
+        """Return an affine matrix with a copy of 6 floats from a buffer."""
+        cdef Affine2D m = Affine2D()
+        copy_floats(m.data, buf, 6)
+        return m
+
+    @staticmethod
+    def identity():
+        """Return an identity affine matrix."""
+        return Affine2D()
+
+    @staticmethod
+    def translate(x, y):
+        """Return an affine translation matrix."""
+        cdef Affine2D m = Affine2D()
+        m.data[4] = x
+        m.data[5] = y
+        return m
+
+    @staticmethod
+    def rotate(angle):
+        """Return an affine matrix that rotates counterclockwise by the given
+        angle in degrees.
+        """
+        cdef Affine2D m = Affine2D()
+        theta = radians(angle)
+        m.data[0] = cos(theta)
+        m.data[1] = sin(theta)
+        m.data[2] = -sin(theta)
+        m.data[3] = cos(theta)
+        return m
+
+    @staticmethod
+    def scale(x, y):
+        """Return an affine scaling matrix."""
+        cdef Affine2D m = Affine2D()
+        m.data[0] = x
+        m.data[3] = y
+        return m
+
+    def __cinit__(self, *args):
+        """Setup this affine matrix. With no args this is an identity
+        matrix.
+        """
+        cdef int i
+
+        #Init data
+        if len(args) == 0:
+            self.data[0] = 1
+            self.data[1] = 0
+            self.data[2] = 0
+            self.data[3] = 1
+            self.data[4] = 0
+            self.data[5] = 0
+
+        #Copy matrix
+        elif isinstance(args[0], Affine2D):
+            memcpy(self.data, (<Affine2D>args[0]).data, sizeof(self.data))
+
+        #Copy data
+        elif len(args) == 6:
+            for i in range(6):
+                self.data[i] = args[i]
+
+        else:
+            raise TypeError("Affine2D takes 0, 1 or 6 args.")
+
+    def __getitem__(self, i):
+        """Get an element of this affine matrix."""
+        x, y = i
+        return self.data[x * 2 + y]
+
+    def __setitem__(self, i, value):
+        """Set an element of this affine matrix."""
+        x, y = i
+        self.data[x * 2 + y] = value
+
+    def __str__(self):
+        """Return the string representation of this affine matrix."""
+        return "Affine2D([\n\t[{}, {}, {}],\n\t[{}, {}, {}]\n])".format(
+            self.data[0], self.data[2], self.data[4],
+            self.data[1], self.data[3], self.data[5])
+
+    def __repr__(self):
+        """Return the representation of this affine matrix."""
+        return str(self)
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        """Expose the data of this affine matrix as a buffer."""
+        fill_buffer(buffer, self, self.data, 2, AFFINE2D_SHAPE,
+            AFFINE2D_STRIDES, flags)
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        """Release a buffer of this affine matrix."""
+        pass
+
+    def __mul__(Affine2D self, b):
+        """Multiply this affine matrix with another affine matrix or a
+        vector.
+        """
+        cdef Affine2D m
+        cdef Vec2 v
+
+        #Multiply 2 affine matrices
+        if isinstance(b, Affine2D):
+            m = Affine2D()
+            affine2d_mul(self.data, (<Affine2D>b).data, m.data)
+            return m
+
+        #Transform a vector
+        elif isinstance(b, Vec2):
+            v = vec2_new(0, 0)
+            affine2d_transform(self.data, (<Vec2>b).data, v.data)
+            return v
+
+        return NotImplemented
+
+    def __imul__(Affine2D self, Affine2D b):
+        """Multiply this affine matrix with another affine matrix in place."""
+        affine2d_mul(self.data, b.data, self.data)
+        return self
+
+    def copy(self):
+        """Return a copy of this affine matrix."""
+        return Affine2D(self)
+
+    def imul(self, Affine2D b):
+        """Multiply this affine matrix with another affine matrix in place and
+        return this affine matrix.
+        """
+        affine2d_mul(self.data, b.data, self.data)
+        return self
+
+    def mul_into(self, Affine2D b, Affine2D out):
+        """Multiply this affine matrix with another affine matrix and store the
+        result in the given affine matrix. out may be this matrix or b. Returns
+        out.
+        """
+        affine2d_mul(self.data, b.data, out.data)
+        return out
+
+    def transform_into(self, Vec2 vec, Vec2 out):
+        """Transform a vector and store the result in the given vector. out may
+        be vec. Returns out.
+        """
+        affine2d_transform(self.data, vec.data, out.data)
+        return out
+
+    @cython.boundscheck(False)
+    def transform_xy(self, const float[::1] src, float[::1] dst,
+        release_gil = False):
+        """Transform the packed (x, y) points of a contiguous float buffer such
+        as array("f") and store them in another buffer of the same length. dst
+        may be src. The GIL is released during the loop if release_gil is
+        True. Returns dst.
+        """
+        cdef Py_ssize_t n = src.shape[0]
+
+        if n % 2 != 0:
+            raise ValueError("Buffer length must be a multiple of 2.")
+
+        if dst.shape[0] != n:
+            raise ValueError("Buffers must have the same length.")
+
+        if n == 0:
+            return dst.base
+
+        if release_gil:
+            with nogil:
+                affine2d_transform_xy(self.data, &src[0], &dst[0], n // 2)
+
+        else:
+            affine2d_transform_xy(self.data, &src[0], &dst[0], n // 2)
+
+        return dst.base
+
+    def inverse(self):
+        """Return the inverse of this affine matrix."""
+        cdef Affine2D m = Affine2D()
+
+        if not affine2d_invert(self.data, m.data):
+            raise ValueError("Affine2D is not invertible.")
+
+        return m
+
+    def to_mat4(self):
+        """Return the equivalent 4x4 matrix of this affine matrix."""
+        cdef Mat4 m = Mat4.identity()
+        m.data[0] = self.data[0]
+        m.data[1] = self.data[1]
+        m.data[4] = self.data[2]
+        m.data[5] = self.data[3]
+        m.data[12] = self.data[4]
+        m.data[13] = self.data[5]
+        return m
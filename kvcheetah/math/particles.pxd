@@ -0,0 +1,33 @@
+"""kvcheetah - Particle Array API"""
+
+from cpython cimport array
+from libc.stdint cimport uint32_t
+
+
+#Functions
+#==============================================================================
+cdef float xorshift(uint32_t *state) noexcept nogil
+cdef Py_ssize_t particles_update(float *pos, float *vel, float *age,
+    float *life, float *rot, const float *spin, float dt, float gx, float gy,
+    Py_ssize_t n) noexcept nogil
+cdef Py_ssize_t particles_build(float *vertices, const float *pos,
+    const float *age, const float *life, const float *rot, const float *size,
+    const float *color, const float *uvs, Py_ssize_t head,
+    Py_ssize_t n) noexcept nogil
+
+
+#Classes
+#==============================================================================
+cdef class ParticleArray(object):
+    cdef Py_ssize_t _capacity
+    cdef Py_ssize_t _head
+    cdef Py_ssize_t _live
+    cdef uint32_t _state
+    cdef array.array _pos
+    cdef array.array _vel
+    cdef array.array _age
+    cdef array.array _life
+    cdef array.array _rot
+    cdef array.array _spin
+    cdef array.array _size
+    cdef array.array _color
@@ -0,0 +1,329 @@
+"""kvcheetah - Particle Array API"""
+
+cimport cython
+from cpython cimport array
+from libc.math cimport cos, sin
+from libc.stdint cimport uint32_t
+
+from array import array as pyarray
+
+
+#Globals
+#==============================================================================
+cdef float DEG2RAD = 3.141592653589793 / 180
+cdef array.array FLOAT_ARRAY = pyarray("f")
+cdef int VERTEX_SIZE = 8
+cdef int QUAD_SIZE = 4 * VERTEX_SIZE
+
+
+#Functions
+#==============================================================================
+cdef float xorshift(uint32_t *state) noexcept nogil:
+    """Advance a xorshift32 state and return a random float in [0, 1)."""
+    cdef uint32_t x = state[0]
+    x ^= x << 13
+    x ^= x >> 17
+    x ^= x << 5
+    state[0] = x
+    return (x >> 8) * (1.0 / 16777216)
+
+
+cdef Py_ssize_t particles_update(float *pos, float *vel, float *age,
+    float *life, float *rot, const float *spin, float dt, float gx, float gy,
+    Py_ssize_t n) noexcept nogil:
+    """Age and move n particles and return the number of live particles. A
+    particle dies when its age reaches its life, which sets its life to 0.
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t live = 0
+
+    for i in range(n):
+        if life[i] <= 0:
+            continue
+
+        age[i] += dt
+
+        if age[i] >= life[i]:
+            life[i] = 0
+            continue
+
+        vel[i * 2] += gx * dt
+        vel[i * 2 + 1] += gy * dt
+        pos[i * 2] += vel[i * 2] * dt
+        pos[i * 2 + 1] += vel[i * 2 + 1] * dt
+        rot[i] += spin[i] * dt
+        live += 1
+
+    return live
+
+
+cdef Py_ssize_t particles_build(float *vertices, const float *pos,
+    const float *age, const float *life, const float *rot, const float *size,
+    const float *color, const float *uvs, Py_ssize_t head,
+    Py_ssize_t n) noexcept nogil:
+    """Write a quad for each live particle into vertices and return the number
+    of quads. The quads are packed from the oldest particle to the newest and
+    use the vertex format of a sprite batch. Size and color are interpolated
+    between their start and end values over the life of each particle.
+    """
+    cdef Py_ssize_t k, i, base
+    cdef Py_ssize_t quads = 0
+    cdef float t, h, c, s, r, g, b, a
+    cdef float lx[4]
+    cdef float ly[4]
+    cdef float *v
+    cdef int corner
+
+    for k in range(n):
+        i = (head + k) % n
+
+        if life[i] <= 0:
+            continue
+
+        #Interpolate the size and color
+        t = age[i] / life[i]
+        h = (size[i * 2] + (size[i * 2 + 1] - size[i * 2]) * t) / 2
+        r = color[i * 8] + (color[i * 8 + 4] - color[i * 8]) * t
+        g = color[i * 8 + 1] + (color[i * 8 + 5] - color[i * 8 + 1]) * t
+        b = color[i * 8 + 2] + (color[i * 8 + 6] - color[i * 8 + 2]) * t
+        a = color[i * 8 + 3] + (color[i * 8 + 7] - color[i * 8 + 3]) * t
+
+        #Rotate the corners of the quad around the particle pos
+        c = cos(rot[i] * DEG2RAD)
+        s = sin(rot[i] * DEG2RAD)
+        lx[0] = -h
+        ly[0] = -h
+        lx[1] = h
+        ly[1] = -h
+        lx[2] = h
+        ly[2] = h
+        lx[3] = -h
+        ly[3] = h
+        base = quads * QUAD_SIZE
+
+        for corner in range(4):
+            v = vertices + base + corner * VERTEX_SIZE
+            v[0] = pos[i * 2] + c * lx[corner] - s * ly[corner]
+            v[1] = pos[i * 2 + 1] + s * lx[corner] + c * ly[corner]
+            v[2] = uvs[corner * 2]
+            v[3] = uvs[corner * 2 + 1]
+            v[4] = r
+            v[5] = g
+            v[6] = b
+            v[7] = a
+
+        quads += 1
+
+    return quads
+
+
+#Classes
+#==============================================================================
+cdef class ParticleArray(object):
+    """A fixed number of particles whose state is packed into preallocated
+    arrays. New particles are written into a ring buffer, so emitting more
+    particles than the capacity replaces the oldest ones. Emitting, updating
+    and building vertices are typed loops over the packed floats, so no
+    particle objects are created.
+    """
+    def __cinit__(self, Py_ssize_t capacity, seed = 1):
+        """Setup this particle array."""
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0.")
+
+        self._capacity = capacity
+        self._head = 0
+        self._live = 0
+        self._state = seed if seed else 1
+        self._pos = array.clone(FLOAT_ARRAY, capacity * 2, True)
+        self._vel = array.clone(FLOAT_ARRAY, capacity * 2, True)
+        self._age = array.clone(FLOAT_ARRAY, capacity, True)
+        self._life = array.clone(FLOAT_ARRAY, capacity, True)
+        self._rot = array.clone(FLOAT_ARRAY, capacity, True)
+        self._spin = array.clone(FLOAT_ARRAY, capacity, True)
+        self._size = array.clone(FLOAT_ARRAY, capacity * 2, True)
+        self._color = array.clone(FLOAT_ARRAY, capacity * 8, True)
+
+    def __len__(self):
+        """Get the number of live particles."""
+        return self._live
+
+    def get_capacity(self):
+        """Get the maximum number of particles of this particle array."""
+        return self._capacity
+
+    capacity = property(get_capacity)
+
+    def get_pos(self):
+        """Get the packed positions of the particles."""
+        return self._pos
+
+    pos = property(get_pos)
+
+    def get_vel(self):
+        """Get the packed velocities of the particles."""
+        return self._vel
+
+    vel = property(get_vel)
+
+    def get_age(self):
+        """Get the age of each particle in seconds."""
+        return self._age
+
+    age = property(get_age)
+
+    def get_life(self):
+        """Get the life of each particle in seconds. Dead particles have a life
+        of 0.
+        """
+        return self._life
+
+    life = property(get_life)
+
+    def get_rot(self):
+        """Get the rotation of each particle."""
+        return self._rot
+
+    rot = property(get_rot)
+
+    def get_spin(self):
+        """Get the rotation speed of each particle in degrees per second."""
+        return self._spin
+
+    spin = property(get_spin)
+
+    def get_size(self):
+        """Get the packed start and end sizes of the particles."""
+        return self._size
+
+    size = property(get_size)
+
+    def get_color(self):
+        """Get the packed start and end colors of the particles."""
+        return self._color
+
+    color = property(get_color)
+
+    def emit(self, Py_ssize_t n, float x, float y, float angle = 90,
+        float spread = 360, speed = (50, 50), life = (1, 1), size = (8, 8),
+        rot = (0, 0), spin = (0, 0), color = (1, 1, 1, 1),
+        end_color = None):
+        """Emit n particles at the given pos. Each range is a (min, max) pair
+        that is sampled for every particle. The direction of each particle is
+        within spread / 2 degrees of angle. The color fades to end_color over
+        the life of each particle.
+        """
+        cdef float speed_lo = speed[0]
+        cdef float speed_hi = speed[1]
+        cdef float life_lo = life[0]
+        cdef float life_hi = life[1]
+        cdef float rot_lo = rot[0]
+        cdef float rot_hi = rot[1]
+        cdef float spin_lo = spin[0]
+        cdef float spin_hi = spin[1]
+        cdef float start_size = size[0]
+        cdef float end_size = size[1]
+        cdef float colors[8]
+        cdef float *pos = self._pos.data.as_floats
+        cdef float *vel = self._vel.data.as_floats
+        cdef float *ages = self._age.data.as_floats
+        cdef float *lives = self._life.data.as_floats
+        cdef float *rots = self._rot.data.as_floats
+        cdef float *spins = self._spin.data.as_floats
+        cdef float *sizes = self._size.data.as_floats
+        cdef float *cols = self._color.data.as_floats
+        cdef Py_ssize_t k, i
+        cdef float theta, v
+        cdef int c
+
+        if end_color is None:
+            end_color = color
+
+        for c in range(4):
+            colors[c] = color[c]
+            colors[c + 4] = end_color[c]
+
+        #Write the new particles at the head of the ring buffer
+        for k in range(min(n, self._capacity)):
+            i = self._head
+            self._head = (self._head + 1) % self._capacity
+
+            #Replacing a live particle keeps the live count
+            if lives[i] <= 0:
+                self._live += 1
+
+            theta = angle + (xorshift(&self._state) - .5) * spread
+            v = speed_lo + (speed_hi - speed_lo) * xorshift(&self._state)
+            pos[i * 2] = x
+            pos[i * 2 + 1] = y
+            vel[i * 2] = cos(theta * DEG2RAD) * v
+            vel[i * 2 + 1] = sin(theta * DEG2RAD) * v
+            ages[i] = 0
+            lives[i] = life_lo + (life_hi - life_lo) * xorshift(&self._state)
+            rots[i] = rot_lo + (rot_hi - rot_lo) * xorshift(&self._state)
+            spins[i] = spin_lo + (spin_hi - spin_lo) * xorshift(&self._state)
+            sizes[i * 2] = start_size
+            sizes[i * 2 + 1] = end_size
+
+            for c in range(8):
+                cols[i * 8 + c] = colors[c]
+
+    def update(self, float dt, float gx = 0, float gy = 0):
+        """Age and move every particle by the given number of seconds with the
+        given gravity and return the number of live particles.
+        """
+        with nogil:
+            self._live = particles_update(
+                self._pos.data.as_floats,
+                self._vel.data.as_floats,
+                self._age.data.as_floats,
+                self._life.data.as_floats,
+                self._rot.data.as_floats,
+                self._spin.data.as_floats,
+                dt, gx, gy, self._capacity
+            )
+
+        return self._live
+
+    @cython.boundscheck(False)
+    def build(self, float[::1] vertices, uvs):
+        """Write a quad for each live particle into the given float buffer and
+        return the number of quads. The buffer must hold 32 floats per
+        particle. uvs are the texture coords of the particle texture.
+        """
+        cdef float tex_coords[8]
+        cdef Py_ssize_t quads
+        cdef int c
+
+        if vertices.shape[0] < self._capacity * QUAD_SIZE:
+            raise ValueError("Vertex buffer must hold {} floats.".format(
+                self._capacity * QUAD_SIZE))
+
+        for c in range(8):
+            tex_coords[c] = uvs[c]
+
+        with nogil:
+            quads = particles_build(
+                &vertices[0],
+                self._pos.data.as_floats,
+                self._age.data.as_floats,
+                self._life.data.as_floats,
+                self._rot.data.as_floats,
+                self._size.data.as_floats,
+                self._color.data.as_floats,
+                tex_coords,
+                self._head,
+                self._capacity
+            )
+
+        return quads
+
+    def clear(self):
+        """Kill every particle."""
+        cdef Py_ssize_t i
+
+        for i in range(self._capacity):
+            self._life.data.as_floats[i] = 0
+
+        self._head = 0
+        self._live = 0
@@ -0,0 +1,13 @@
+"""kvcheetah - Sprite Quad API"""
+
+
+#Functions
+#==============================================================================
+cdef void quad_corners(float *v, const float *pos, const float *origin,
+    const float *size, float rot) noexcept nogil
+cdef void quad_build(float *vertices, const float *pos, const float *origin,
+    const float *size, const float *rot, const float *color,
+    const float *uvs, const unsigned char *shown,
+    const unsigned char *culled, Py_ssize_t i) noexcept nogil
+cdef void quad_bounds(float *bounds, const float *pos, const float *origin,
+    const float *size, float rot) noexcept nogil
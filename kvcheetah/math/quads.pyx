@@ -0,0 +1,212 @@
+"""kvcheetah - Sprite Quad API"""
+
+cimport cython
+from libc.math cimport cos, sin
+from libc.stdlib cimport free, malloc
+from libc.string cimport memset
+
+
+#Globals
+#==============================================================================
+cdef float DEG2RAD = 3.141592653589793 / 180
+cdef int VERTEX_SIZE = 8
+cdef int QUAD_SIZE = 4 * VERTEX_SIZE
+
+
+#Functions
+#==============================================================================
+cdef void quad_corners(float *v, const float *pos, const float *origin,
+    const float *size, float rot) noexcept nogil:
+    """Write the corners of a sprite into the positions of a quad. The corners
+    are rotated around the sprite pos, which matches
+    Translate(pos) -> Rotate(rot) -> Translate(-origin) in Sprite.
+    """
+    cdef float c = 1
+    cdef float s = 0
+    cdef float lx = -origin[0]
+    cdef float ly = -origin[1]
+    cdef float rx = size[0] - origin[0]
+    cdef float ty = size[1] - origin[1]
+
+    #Unrotated sprites are the common case
+    if rot != 0:
+        c = cos(rot * DEG2RAD)
+        s = sin(rot * DEG2RAD)
+
+    v[0] = pos[0] + c * lx - s * ly
+    v[1] = pos[1] + s * lx + c * ly
+    v[VERTEX_SIZE] = pos[0] + c * rx - s * ly
+    v[VERTEX_SIZE + 1] = pos[1] + s * rx + c * ly
+    v[VERTEX_SIZE * 2] = pos[0] + c * rx - s * ty
+    v[VERTEX_SIZE * 2 + 1] = pos[1] + s * rx + c * ty
+    v[VERTEX_SIZE * 3] = pos[0] + c * lx - s * ty
+    v[VERTEX_SIZE * 3 + 1] = pos[1] + s * lx + c * ty
+
+
+cdef void quad_build(float *vertices, const float *pos, const float *origin,
+    const float *size, const float *rot, const float *color,
+    const float *uvs, const unsigned char *shown,
+    const unsigned char *culled, Py_ssize_t i) noexcept nogil:
+    """Write the quad of the given row in the vertex format of a sprite
+    batch. Hidden and culled rows are collapsed to a degenerate quad.
+    """
+    cdef float *v = vertices + i * QUAD_SIZE
+    cdef int corner, c
+
+    if not shown[i] or culled[i]:
+        memset(v, 0, QUAD_SIZE * sizeof(float))
+        return
+
+    quad_corners(v, pos + i * 2, origin + i * 2, size + i * 2, rot[i])
+
+    for corner in range(4):
+        v[corner * VERTEX_SIZE + 2] = uvs[i * 8 + corner * 2]
+        v[corner * VERTEX_SIZE + 3] = uvs[i * 8 + corner * 2 + 1]
+
+        for c in range(4):
+            v[corner * VERTEX_SIZE + 4 + c] = color[i * 4 + c]
+
+
+cdef void quad_bounds(float *bounds, const float *pos, const float *origin,
+    const float *size, float rot) noexcept nogil:
+    """Write the bounding box (x1, y1, x2, y2) of a sprite into bounds. The
+    sprite rotates around its pos like in sprite_bounds.
+    """
+    cdef float v[32] #One quad
+    cdef int corner
+    cdef float x, y
+
+    #Unrotated sprites are the common case
+    if rot == 0:
+        bounds[0] = pos[0] - origin[0]
+        bounds[1] = pos[1] - origin[1]
+        bounds[2] = bounds[0] + size[0]
+        bounds[3] = bounds[1] + size[1]
+        return
+
+    quad_corners(v, pos, origin, size, rot)
+    bounds[0] = v[0]
+    bounds[1] = v[1]
+    bounds[2] = v[0]
+    bounds[3] = v[1]
+
+    for corner in range(1, 4):
+        x = v[corner * VERTEX_SIZE]
+        y = v[corner * VERTEX_SIZE + 1]
+        bounds[0] = min(bounds[0], x)
+        bounds[1] = min(bounds[1], y)
+        bounds[2] = max(bounds[2], x)
+        bounds[3] = max(bounds[3], y)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def build_quads(float[::1] vertices, float[::1] pos, float[::1] origin,
+    float[::1] size, float[::1] rot, float[::1] color, float[::1] uvs,
+    unsigned char[::1] shown, unsigned char[::1] culled, Py_ssize_t count,
+    rows = None, bint corners_only = False):
+    """Write the quads of the first count rows of the given sprite columns
+    into a vertex buffer with 32 floats per row. If rows is given, only the
+    quads of those rows are written. If corners_only is True, only the
+    corners of the visible rows are written, which is enough after the
+    sprites moved.
+    """
+    cdef Py_ssize_t i
+
+    if count <= 0:
+        return
+
+    if (vertices.shape[0] < count * QUAD_SIZE or pos.shape[0] < count * 2 or
+        origin.shape[0] < count * 2 or size.shape[0] < count * 2 or
+        rot.shape[0] < count or color.shape[0] < count * 4 or
+        uvs.shape[0] < count * 8 or shown.shape[0] < count or
+        culled.shape[0] < count):
+        raise ValueError("Sprite columns must hold {} rows.".format(count))
+
+    #Move the corners of every visible row
+    if corners_only:
+        with nogil:
+            for i in range(count):
+                if shown[i] and not culled[i]:
+                    quad_corners(&vertices[i * QUAD_SIZE], &pos[i * 2],
+                        &origin[i * 2], &size[i * 2], rot[i])
+
+        return
+
+    #Write every row
+    if rows is None:
+        with nogil:
+            for i in range(count):
+                quad_build(&vertices[0], &pos[0], &origin[0], &size[0],
+                    &rot[0], &color[0], &uvs[0], &shown[0], &culled[0], i)
+
+        return
+
+    #Write the given rows
+    for i in rows:
+        if i < 0 or i >= count:
+            raise IndexError("Row index out of range.")
+
+        quad_build(&vertices[0], &pos[0], &origin[0], &size[0], &rot[0],
+            &color[0], &uvs[0], &shown[0], &culled[0], i)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def cull_quads(float[::1] pos, float[::1] origin, float[::1] size,
+    float[::1] rot, unsigned char[::1] shown, unsigned char[::1] culled,
+    Py_ssize_t count, float x1, float y1, float x2, float y2):
+    """Flag the visible rows among the first count rows of the given sprite
+    columns whose bounds are outside of the rect (x1, y1, x2, y2) as culled.
+    Hidden rows are skipped. Returns (drawn, culled count, rows) where rows
+    lists the rows whose culled flag changed.
+    """
+    cdef Py_ssize_t drawn = 0
+    cdef Py_ssize_t culled_count = 0
+    cdef Py_ssize_t flipped_count = 0
+    cdef Py_ssize_t i
+    cdef Py_ssize_t *flipped
+    cdef float bounds[4]
+    cdef unsigned char off
+
+    if count <= 0:
+        return (0, 0, [])
+
+    if (pos.shape[0] < count * 2 or origin.shape[0] < count * 2 or
+        size.shape[0] < count * 2 or rot.shape[0] < count or
+        shown.shape[0] < count or culled.shape[0] < count):
+        raise ValueError("Sprite columns must hold {} rows.".format(count))
+
+    flipped = <Py_ssize_t *>malloc(count * sizeof(Py_ssize_t))
+
+    if flipped == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for i in range(count):
+                if not shown[i]:
+                    continue
+
+                quad_bounds(bounds, &pos[i * 2], &origin[i * 2], &size[i * 2],
+                    rot[i])
+                off = (bounds[2] < x1 or bounds[0] > x2 or bounds[3] < y1 or
+                    bounds[1] > y2)
+
+                if off != culled[i]:
+                    culled[i] = off
+                    flipped[flipped_count] = i
+                    flipped_count += 1
+
+                if off:
+                    culled_count += 1
+
+                else:
+                    drawn += 1
+
+        rows = [flipped[i] for i in range(flipped_count)]
+
+    finally:
+        free(flipped)
+
+    return (drawn, culled_count, rows)
@@ -0,0 +1,15 @@
+"""kvcheetah - Sweep API"""
+
+
+#Types
+#==============================================================================
+cdef struct Edge:
+    float pos
+    Py_ssize_t index
+
+
+#Functions
+#==============================================================================
+cdef int edge_cmp(const void *a, const void *b) noexcept nogil
+cdef bint shapes_hit(const float *centers, const float *hw, const float *hh,
+    Py_ssize_t i, Py_ssize_t j, bint circle) noexcept nogil
@@ -0,0 +1,138 @@
+"""kvcheetah - Sweep API"""
+
+cimport cython
+from libc.stdlib cimport free, malloc, qsort
+
+
+#Functions
+#==============================================================================
+cdef int edge_cmp(const void *a, const void *b) noexcept nogil:
+    """Order 2 edges by their position, then by their shape index."""
+    cdef const Edge *ea = <const Edge *>a
+    cdef const Edge *eb = <const Edge *>b
+
+    if ea.pos < eb.pos:
+        return -1
+
+    if ea.pos > eb.pos:
+        return 1
+
+    return (ea.index > eb.index) - (ea.index < eb.index)
+
+
+cdef bint shapes_hit(const float *centers, const float *hw, const float *hh,
+    Py_ssize_t i, Py_ssize_t j, bint circle) noexcept nogil:
+    """Check if the shapes at the given indices overlap."""
+    cdef float dx = centers[j * 2] - centers[i * 2]
+    cdef float dy = centers[j * 2 + 1] - centers[i * 2 + 1]
+    cdef float r
+
+    if circle:
+        r = hw[i] + hw[j]
+        return dx * dx + dy * dy < r * r
+
+    return (abs(dx) < hw[i] + hw[j]) and (abs(dy) < hh[i] + hh[j])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def sweep_pairs(float[::1] centers, float[::1] sizes, Py_ssize_t split = -1,
+    bint circle = False):
+    """Find every overlapping pair of the shapes with the given flat centers
+    and sizes in the form [x0, y0, x1, y1, ...]. The shapes are sorted by
+    their left edge and swept from left to right, so only shapes whose
+    horizontal extents overlap are tested. Circles use max(w, h) / 2 as their
+    radius. If split is not negative, the shapes before split form a first
+    group and the rest a second one, and only pairs between the groups are
+    returned as (index into first group, index into second group). Otherwise
+    every pair (i, j) with i < j is returned.
+    """
+    cdef Py_ssize_t count = centers.shape[0] // 2
+    cdef Py_ssize_t active_count = 0
+    cdef Py_ssize_t i, j, k, k2, kept
+    cdef float left
+    cdef float *hw
+    cdef float *hh
+    cdef Edge *edges
+    cdef Py_ssize_t *active
+    pairs = []
+
+    if sizes.shape[0] != count * 2:
+        raise ValueError("Centers and sizes must describe the same shapes.")
+
+    if count == 0:
+        return pairs
+
+    hw = <float *>malloc(count * sizeof(float))
+    hh = <float *>malloc(count * sizeof(float))
+    edges = <Edge *>malloc(count * sizeof(Edge))
+    active = <Py_ssize_t *>malloc(count * sizeof(Py_ssize_t))
+
+    if hw == NULL or hh == NULL or edges == NULL or active == NULL:
+        free(hw)
+        free(hh)
+        free(edges)
+        free(active)
+        raise MemoryError()
+
+    try:
+        #Gather the extents of each shape
+        with nogil:
+            for i in range(count):
+                if circle:
+                    hw[i] = max(sizes[i * 2], sizes[i * 2 + 1]) / 2
+                    hh[i] = hw[i]
+
+                else:
+                    hw[i] = sizes[i * 2] / 2
+                    hh[i] = sizes[i * 2 + 1] / 2
+
+                edges[i].pos = centers[i * 2] - hw[i]
+                edges[i].index = i
+
+            qsort(edges, count, sizeof(Edge), edge_cmp)
+
+        #Sweep the shapes from left to right. Only shapes whose horizontal
+        #extents still overlap the current one need a narrow-phase test.
+        for k in range(count):
+            i = edges[k].index
+            left = edges[k].pos
+            kept = 0
+
+            for j in range(active_count):
+                if centers[active[j] * 2] + hw[active[j]] > left:
+                    active[kept] = active[j]
+                    kept += 1
+
+            active_count = kept
+
+            for k2 in range(active_count):
+                j = active[k2]
+
+                #Skip pairs from the same group when testing 2 groups
+                if split >= 0 and (i < split) == (j < split):
+                    continue
+
+                if not shapes_hit(&centers[0], hw, hh, i, j, circle):
+                    continue
+
+                #Report the pair in group order
+                if split < 0:
+                    pairs.append((i, j) if i < j else (j, i))
+
+                elif i < split:
+                    pairs.append((i, j - split))
+
+                else:
+                    pairs.append((j, i - split))
+
+            active[active_count] = i
+            active_count += 1
+
+    finally:
+        free(hw)
+        free(hh)
+        free(edges)
+        free(active)
+
+    return pairs
@@ -0,0 +1,41 @@
+"""kvcheetah - Vector Array API"""
+
+from cpython cimport array
+
+
+#Functions
+#==============================================================================
+cdef void floats_add(float *a, const float *b, Py_ssize_t n) noexcept nogil
+cdef void floats_sub(float *a, const float *b, Py_ssize_t n) noexcept nogil
+cdef void floats_mul(float *a, const float *b, Py_ssize_t n) noexcept nogil
+cdef void floats_scale(float *a, float s, Py_ssize_t n) noexcept nogil
+cdef void floats_add_scaled(float *a, const float *b, float s,
+    Py_ssize_t n) noexcept nogil
+cdef void floats_clamp(float *a, const float *lo, const float *hi, int size,
+    Py_ssize_t n) noexcept nogil
+cdef float vecs_length(const float *a, int size) noexcept nogil
+cdef void vecs_lengths(const float *a, float *out, int size,
+    Py_ssize_t n) noexcept nogil
+cdef void vecs_clamp_length(float *a, float max_length, int size,
+    Py_ssize_t n) noexcept nogil
+cdef void vec2s_rotate(float *a, const float *angles, Py_ssize_t step,
+    Py_ssize_t n) noexcept nogil
+
+
+#Classes
+#==============================================================================
+cdef class VecArray(object):
+    cdef int size
+    cdef array.array _data
+
+    cdef setup(self, int size, data)
+    cdef float *ptr(self)
+    cdef Py_ssize_t check(self, VecArray b) except -1
+
+
+cdef class Vec2Array(VecArray):
+    pass
+
+
+cdef class Vec4Array(VecArray):
+    pass
@@ -0,0 +1,427 @@
+"""kvcheetah - Vector Array API"""
+
+from cpython cimport array
+from libc.math cimport cos, sin, sqrt
+
+from array import array as pyarray
+
+from .matrix cimport Mat4, mat4_transform_points
+from .vector cimport Vec2, Vec4, vec2_new
+
+
+#Globals
+#==============================================================================
+cdef float DEG2RAD = 3.141592653589793 / 180
+cdef array.array FLOAT_ARRAY = pyarray("f")
+
+
+#Functions
+#==============================================================================
+cdef void floats_add(float *a, const float *b, Py_ssize_t n) noexcept nogil:
+    """Add n floats of b to a."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        a[i] += b[i]
+
+
+cdef void floats_sub(float *a, const float *b, Py_ssize_t n) noexcept nogil:
+    """Subtract n floats of b from a."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        a[i] -= b[i]
+
+
+cdef void floats_mul(float *a, const float *b, Py_ssize_t n) noexcept nogil:
+    """Multiply n floats of a with b."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        a[i] *= b[i]
+
+
+cdef void floats_scale(float *a, float s, Py_ssize_t n) noexcept nogil:
+    """Multiply n floats of a with s."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        a[i] *= s
+
+
+cdef void floats_add_scaled(float *a, const float *b, float s,
+    Py_ssize_t n) noexcept nogil:
+    """Add n floats of b multiplied with s to a."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        a[i] += b[i] * s
+
+
+cdef void floats_clamp(float *a, const float *lo, const float *hi, int size,
+    Py_ssize_t n) noexcept nogil:
+    """Clamp each component of n packed vectors between lo and hi."""
+    cdef Py_ssize_t i
+    cdef int c
+
+    for i in range(n):
+        for c in range(size):
+            if a[i * size + c] < lo[c]:
+                a[i * size + c] = lo[c]
+
+            elif a[i * size + c] > hi[c]:
+                a[i * size + c] = hi[c]
+
+
+cdef float vecs_length(const float *a, int size) noexcept nogil:
+    """Return the length of a packed vector."""
+    cdef float total = 0
+    cdef int c
+
+    for c in range(size):
+        total += a[c] * a[c]
+
+    return sqrt(total)
+
+
+cdef void vecs_lengths(const float *a, float *out, int size,
+    Py_ssize_t n) noexcept nogil:
+    """Store the length of n packed vectors in out."""
+    cdef Py_ssize_t i
+
+    for i in range(n):
+        out[i] = vecs_length(a + i * size, size)
+
+
+cdef void vecs_clamp_length(float *a, float max_length, int size,
+    Py_ssize_t n) noexcept nogil:
+    """Scale down n packed vectors that are longer than max_length. A max
+    length of 0 normalizes the vectors instead. Zero vectors stay zero.
+    """
+    cdef Py_ssize_t i
+    cdef float length
+    cdef int c
+
+    for i in range(n):
+        length = vecs_length(a + i * size, size)
+
+        if length == 0 or (max_length > 0 and length <= max_length):
+            continue
+
+        length = (max_length if max_length > 0 else 1) / length
+
+        for c in range(size):
+            a[i * size + c] *= length
+
+
+cdef void vec2s_rotate(float *a, const float *angles, Py_ssize_t step,
+    Py_ssize_t n) noexcept nogil:
+    """Rotate n packed 2D vectors counterclockwise by the angles in degrees.
+    A step of 0 rotates every vector by the first angle.
+    """
+    cdef Py_ssize_t i
+    cdef float c, s, x, y, angle
+
+    for i in range(n):
+        angle = angles[i * step] * DEG2RAD
+        c = cos(angle)
+        s = sin(angle)
+        x = a[i * 2]
+        y = a[i * 2 + 1]
+        a[i * 2] = c * x - s * y
+        a[i * 2 + 1] = s * x + c * y
+
+
+#Classes
+#==============================================================================
+cdef class VecArray(object):
+    """Base class for an array of vectors that are packed into a single
+    array("f"). Every operation works in place with a typed loop over the
+    packed floats, so no vector objects are created.
+    """
+    def __len__(self):
+        """Get the number of vectors in this vector array."""
+        return len(self._data) // self.size
+
+    def get_data(self):
+        """Get the packed floats of this vector array."""
+        return self._data
+
+    data = property(get_data)
+
+    def __iadd__(self, b):
+        """Add another vector array to this vector array in place."""
+        return self.iadd(b)
+
+    def __isub__(self, b):
+        """Subtract another vector array from this vector array in place."""
+        return self.isub(b)
+
+    def __imul__(self, b):
+        """Multiply this vector array with another vector array or a scalar
+        in place.
+        """
+        if isinstance(b, VecArray):
+            return self.imul(b)
+
+        return self.scale(b)
+
+    cdef setup(self, int size, data):
+        """Setup this vector array with the given number of components."""
+        self.size = size
+
+        #Wrap an existing float array
+        if isinstance(data, pyarray):
+            if data.typecode != "f":
+                raise ValueError("Array must contain 32-bit floats.")
+
+            self._data = data
+
+        #Create a zero filled array
+        else:
+            self._data = array.clone(FLOAT_ARRAY, data * size, True)
+
+    cdef float *ptr(self):
+        """Get a pointer to the packed floats of this vector array."""
+        return self._data.data.as_floats
+
+    cdef Py_ssize_t check(self, VecArray b) except -1:
+        """Check that another vector array matches this one and return the
+        number of packed floats.
+        """
+        cdef Py_ssize_t n = len(self._data)
+
+        if b.size != self.size or len(b._data) != n:
+            raise ValueError("Vector arrays must have the same length.")
+
+        return n
+
+    def resize(self, Py_ssize_t n):
+        """Change the number of vectors in this vector array. New vectors are
+        set to zero.
+        """
+        cdef Py_ssize_t old = len(self._data)
+        cdef Py_ssize_t i
+        array.resize(self._data, n * self.size)
+
+        for i in range(old, n * self.size):
+            self._data.data.as_floats[i] = 0
+
+    def iadd(self, VecArray b):
+        """Add another vector array to this vector array in place and return
+        this vector array.
+        """
+        floats_add(self.ptr(), b.ptr(), self.check(b))
+        return self
+
+    def isub(self, VecArray b):
+        """Subtract another vector array from this vector array in place and
+        return this vector array.
+        """
+        floats_sub(self.ptr(), b.ptr(), self.check(b))
+        return self
+
+    def imul(self, VecArray b):
+        """Multiply this vector array with another vector array in place and
+        return this vector array.
+        """
+        floats_mul(self.ptr(), b.ptr(), self.check(b))
+        return self
+
+    def scale(self, float s):
+        """Multiply every vector with a scalar in place and return this vector
+        array.
+        """
+        floats_scale(self.ptr(), s, len(self._data))
+        return self
+
+    def add_scaled(self, VecArray b, float s):
+        """Add another vector array multiplied with a scalar to this vector
+        array in place and return this vector array. This is the usual
+        pos += vel * dt step.
+        """
+        floats_add_scaled(self.ptr(), b.ptr(), s, self.check(b))
+        return self
+
+    def lengths(self, out = None):
+        """Return an array("f") with the length of each vector. The lengths are
+        stored in out if it is given.
+        """
+        cdef Py_ssize_t n = len(self)
+        cdef array.array res
+
+        if out is None:
+            res = array.clone(FLOAT_ARRAY, n, False)
+
+        else:
+            res = out
+
+            if len(res) != n or res.typecode != "f":
+                raise ValueError("Output must hold {} floats.".format(n))
+
+        vecs_lengths(self.ptr(), res.data.as_floats, self.size, n)
+        return res
+
+    def normalize(self):
+        """Scale every vector to unit length in place and return this vector
+        array. Zero vectors stay zero.
+        """
+        vecs_clamp_length(self.ptr(), 0, self.size, len(self))
+        return self
+
+    def clamp_length(self, float max_length):
+        """Scale down every vector that is longer than max_length in place and
+        return this vector array.
+        """
+        if max_length <= 0:
+            floats_scale(self.ptr(), 0, len(self._data))
+
+        else:
+            vecs_clamp_length(self.ptr(), max_length, self.size, len(self))
+
+        return self
+
+    def clamp(self, lo, hi):
+        """Clamp each component of every vector between the components of lo
+        and hi in place and return this vector array.
+        """
+        cdef float lo_c[4]
+        cdef float hi_c[4]
+        cdef int c
+
+        for c in range(self.size):
+            lo_c[c] = lo[c]
+            hi_c[c] = hi[c]
+
+        floats_clamp(self.ptr(), lo_c, hi_c, self.size, len(self))
+        return self
+
+    def fill(self, value):
+        """Set every vector to the components of the given vector and return
+        this vector array.
+        """
+        cdef float v[4]
+        cdef float *a = self.ptr()
+        cdef Py_ssize_t i
+        cdef int c
+
+        for c in range(self.size):
+            v[c] = value[c]
+
+        for i in range(len(self)):
+            for c in range(self.size):
+                a[i * self.size + c] = v[c]
+
+        return self
+
+
+cdef class Vec2Array(VecArray):
+    """An array of 2D vectors. Vec2Array(n) creates n zero vectors and
+    Vec2Array(array("f")) shares the floats of an existing array.
+    """
+    def __cinit__(self, data = 0):
+        """Setup this vector array."""
+        self.setup(2, data)
+
+    def __getitem__(self, Py_ssize_t i):
+        """Get a copy of a vector of this vector array."""
+        if i < 0 or i >= len(self):
+            raise IndexError("Vec2Array index out of range")
+
+        return vec2_new(self.ptr()[i * 2], self.ptr()[i * 2 + 1])
+
+    def __setitem__(self, Py_ssize_t i, value):
+        """Set a vector of this vector array."""
+        if i < 0 or i >= len(self):
+            raise IndexError("Vec2Array index out of range")
+
+        self.ptr()[i * 2] = value[0]
+        self.ptr()[i * 2 + 1] = value[1]
+
+    def __str__(self):
+        """Return the string representation of this vector array."""
+        return "Vec2Array({})".format(list(self._data))
+
+    def __repr__(self):
+        """Return the representation of this vector array."""
+        return str(self)
+
+    def copy(self):
+        """Return a copy of this vector array."""
+        return Vec2Array(array.copy(self._data))
+
+    def rotate(self, angles):
+        """Rotate every vector counterclockwise in place and return this vector
+        array. angles is either a single angle in degrees or a float buffer
+        with 1 angle per vector.
+        """
+        cdef const float[::1] view
+        cdef float angle
+        cdef Py_ssize_t n = len(self)
+
+        if n == 0:
+            return self
+
+        #Rotate every vector by the same angle
+        if isinstance(angles, (int, float)):
+            angle = angles
+            vec2s_rotate(self.ptr(), &angle, 0, n)
+
+        #Rotate each vector by its own angle
+        else:
+            view = angles
+
+            if view.shape[0] != n:
+                raise ValueError("There must be 1 angle per vector.")
+
+            vec2s_rotate(self.ptr(), &view[0], 1, n)
+
+        return self
+
+
+cdef class Vec4Array(VecArray):
+    """An array of 4-component vectors. Vec4Array(n) creates n zero vectors
+    and Vec4Array(array("f")) shares the floats of an existing array.
+    """
+    def __cinit__(self, data = 0):
+        """Setup this vector array."""
+        self.setup(4, data)
+
+    def __getitem__(self, Py_ssize_t i):
+        """Get a copy of a vector of this vector array."""
+        cdef float *a = self.ptr()
+
+        if i < 0 or i >= len(self):
+            raise IndexError("Vec4Array index out of range")
+
+        return Vec4(a[i * 4], a[i * 4 + 1], a[i * 4 + 2], a[i * 4 + 3])
+
+    def __setitem__(self, Py_ssize_t i, value):
+        """Set a vector of this vector array."""
+        cdef float *a = self.ptr()
+        cdef int c
+
+        if i < 0 or i >= len(self):
+            raise IndexError("Vec4Array index out of range")
+
+        for c in range(4):
+            a[i * 4 + c] = value[c]
+
+    def __str__(self):
+        """Return the string representation of this vector array."""
+        return "Vec4Array({})".format(list(self._data))
+
+    def __repr__(self):
+        """Return the representation of this vector array."""
+        return str(self)
+
+    def copy(self):
+        """Return a copy of this vector array."""
+        return Vec4Array(array.copy(self._data))
+
+    def transform(self, Mat4 m):
+        """Multiply a matrix and every vector in place and return this vector
+        array.
+        """
+        mat4_transform_points(m.data, self.ptr(), self.ptr(), len(self))
+        return self
@@ -0,0 +1,23 @@
+"""kvcheetah - Vector API"""
+
+
+#Functions
+#================================================================================================
+cdef int copy_floats(float *dst, object src, Py_ssize_t n) except -1
+cdef void fill_buffer(Py_buffer *buffer, object obj, float *data, int ndim,
+    Py_ssize_t *shape, Py_ssize_t *strides, int flags) noexcept
+cdef Vec2 vec2_new(float x, float y)
+cdef float vec2_dot(const float *a, const float *b) noexcept nogil
+cdef float vec2_length(const float *v) noexcept nogil
+cdef void vec2_normalize(const float *v, float *out) noexcept nogil
+cdef void vec2_rotate(const float *v, float angle, float *out) noexcept nogil
+
+
+#Classes
+#================================================================================================
+cdef class Vec4(object):
+    cdef float data[4]
+
+
+cdef class Vec2(object):
+    cdef float data[2]
@@ -1,11 +1,120 @@
 """kvcheetah - Vector API"""
 
+from cpython.buffer cimport PyBUF_FORMAT, PyBUF_ND, PyBUF_STRIDES
+from libc.math cimport cos, sin, sqrt
+from libc.string cimport memcpy
+
+
+#Globals
+#================================================================================================
+cdef char *FLOAT_FORMAT = b"f"
+cdef float DEG2RAD = 3.141592653589793 / 180
+cdef Py_ssize_t VEC2_SHAPE[1]
+cdef Py_ssize_t VEC4_SHAPE[1]
+cdef Py_ssize_t VEC4_STRIDES[1]
+
+VEC2_SHAPE[0] = 2
+VEC4_SHAPE[0] = 4
+VEC4_STRIDES[0] = sizeof(float)
+
+
+#Functions
+#================================================================================================
+cdef int copy_floats(float *dst, object src, Py_ssize_t n) except -1:
+    """Copy n floats from an object that supports the buffer protocol."""
+    #Get a contiguous byte view of the source
+    view = memoryview(src)
+
+    if view.format != "f":
+        raise ValueError("Buffer must contain 32-bit floats.")
+
+    if view.nbytes != n * sizeof(float):
+        raise ValueError("Buffer must contain {} floats.".format(n))
+
+    cdef const unsigned char[::1] raw = view.cast("B")
+    memcpy(dst, &raw[0], n * sizeof(float))
+    return 0
+
+
+cdef void fill_buffer(Py_buffer *buffer, object obj, float *data, int ndim,
+    Py_ssize_t *shape, Py_ssize_t *strides, int flags) noexcept:
+    """Describe an array of floats owned by obj in the given buffer."""
+    buffer.buf = data
+    buffer.obj = obj
+    buffer.len = shape[0] * strides[0]
+    buffer.readonly = 0
+    buffer.itemsize = sizeof(float)
+    buffer.format = FLOAT_FORMAT if flags & PyBUF_FORMAT else NULL
+    buffer.ndim = ndim
+    buffer.shape = shape if flags & PyBUF_ND else NULL
+
+    if flags & PyBUF_STRIDES == PyBUF_STRIDES:
+        buffer.strides = strides
+
+    else:
+        buffer.strides = NULL
+
+    buffer.suboffsets = NULL
+    buffer.internal = NULL
+
+
+cdef Vec2 vec2_new(float x, float y):
+    """Return a new 2D vector without parsing any args."""
+    cdef Vec2 v = Vec2.__new__(Vec2)
+    v.data[0] = x
+    v.data[1] = y
+    return v
+
+
+cdef float vec2_dot(const float *a, const float *b) noexcept nogil:
+    """Return the dot product of 2 packed 2D vectors."""
+    return a[0] * b[0] + a[1] * b[1]
+
+
+cdef float vec2_length(const float *v) noexcept nogil:
+    """Return the length of a packed 2D vector."""
+    return sqrt(v[0] * v[0] + v[1] * v[1])
+
+
+cdef void vec2_normalize(const float *v, float *out) noexcept nogil:
+    """Scale a packed 2D vector to unit length. A zero vector stays zero. out
+    may be the same as v.
+    """
+    cdef float length = vec2_length(v)
+
+    if length == 0:
+        out[0] = 0
+        out[1] = 0
+        return
+
+    out[0] = v[0] / length
+    out[1] = v[1] / length
+
+
+cdef void vec2_rotate(const float *v, float angle, float *out) noexcept nogil:
+    """Rotate a packed 2D vector counterclockwise by the given angle in
+    degrees. out may be the same as v.
+    """
+    cdef float c = cos(angle * DEG2RAD)
+    cdef float s = sin(angle * DEG2RAD)
+    cdef float x = v[0]
+    cdef float y = v[1]
+    out[0] = c * x - s * y
+    out[1] = s * x + c * y
+
 
 #Classes
 #================================================================================================
 cdef class Vec4(object):
-    """A 4-component vector."""
-    cdef float data[4]
+    """A 4-component vector. Vectors support the buffer protocol, so
+    memoryview(v) and numpy.asarray(v) share the data of the vector.
+    """
+    @staticmethod
+    def from_buffer(buf):
+        """Return a vector with a copy of 4 floats from a buffer."""
+        cdef Vec4 v = Vec4()
+        copy_floats(v.data, buf, 4)
+        return v
 
     def __cinit__(self, *args):
         """Setup this vector."""
@@ -41,6 +150,15 @@ cdef class Vec4(object):
         """Return the representation of this vector."""
         return str(self)
 
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        """Expose the data of this vector as a buffer."""
+        fill_buffer(buffer, self, self.data, 1, VEC4_SHAPE, VEC4_STRIDES,
+            flags)
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        """Release a buffer of this vector."""
+        pass
+
     def __add__(self, b):
         """Add 2 vectors."""
         v = Vec4()
@@ -115,4 +233,246 @@ cdef class Vec4(object):
         """Set the W component of this vector."""
         self.data[3] = value
 
-    w = property(get_w, set_w)
\ No newline at end of file
+    w = property(get_w, set_w)
+
+
+cdef class Vec2(object):
+    """A 2-component vector. Vectors support the buffer protocol, so
+    memoryview(v) and numpy.asarray(v) share the data of the vector.
+    """
+    @staticmethod
+    def from_buffer(buf):
+        """Return a vector with a copy of 2 floats from a buffer."""
+        cdef Vec2 v = Vec2()
+        copy_floats(v.data, buf, 2)
+        return v
+
+    def __cinit__(self, *args):
+        """Setup this vector."""
+        #Init data
+        if len(args) == 0:
+            self.data[0] = 0
+            self.data[1] = 0
+
+        #Copy data
+        elif len(args) == 2:
+            self.data[0] = args[0]
+            self.data[1] = args[1]
+
+        #Copy data
+        else:
+            v = args[0]
+            self.data[0] = v[0]
+            self.data[1] = v[1]
+
+    def __len__(self):
+        """Get the number of components of this vector."""
+        return 2
+
+    def __getitem__(self, Py_ssize_t i):
+        """Get an element of this vector."""
+        if i < 0 or i > 1:
+            raise IndexError("Vec2 index out of range")
+
+        return self.data[i]
+
+    def __setitem__(self, Py_ssize_t i, float value):
+        """Set an element of this vector."""
+        if i < 0 or i > 1:
+            raise IndexError("Vec2 index out of range")
+
+        self.data[i] = value
+
+    def __str__(self):
+        """Return the string representation of this vector."""
+        return "Vec2([{}, {}])".format(self.data[0], self.data[1])
+
+    def __repr__(self):
+        """Return the representation of this vector."""
+        return str(self)
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        """Expose the data of this vector as a buffer."""
+        fill_buffer(buffer, self, self.data, 1, VEC2_SHAPE, VEC4_STRIDES,
+            flags)
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        """Release a buffer of this vector."""
+        pass
+
+    def __eq__(self, b):
+        """Check if 2 vectors are equal."""
+        if not isinstance(b, Vec2):
+            return NotImplemented
+
+        return (self.data[0] == (<Vec2>b).data[0] and
+            self.data[1] == (<Vec2>b).data[1])
+
+    def __ne__(self, b):
+        """Check if 2 vectors are not equal."""
+        if not isinstance(b, Vec2):
+            return NotImplemented
+
+        return not self == b
+
+    def __neg__(self):
+        """Negate this vector."""
+        return vec2_new(-self.data[0], -self.data[1])
+
+    def __add__(self, Vec2 b):
+        """Add 2 vectors."""
+        return vec2_new(self.data[0] + b.data[0], self.data[1] + b.data[1])
+
+    def __sub__(self, Vec2 b):
+        """Subtract 2 vectors."""
+        return vec2_new(self.data[0] - b.data[0], self.data[1] - b.data[1])
+
+    def __mul__(self, b):
+        """Multiply this vector with another vector or a scalar."""
+        cdef float s
+
+        if isinstance(b, Vec2):
+            return vec2_new(self.data[0] * (<Vec2>b).data[0],
+                self.data[1] * (<Vec2>b).data[1])
+
+        s = b
+        return vec2_new(self.data[0] * s, self.data[1] * s)
+
+    def __rmul__(self, b):
+        """Multiply a scalar with this vector."""
+        cdef float s = b
+        return vec2_new(self.data[0] * s, self.data[1] * s)
+
+    def __truediv__(self, b):
+        """Divide this vector by another vector or a scalar."""
+        cdef float s
+
+        if isinstance(b, Vec2):
+            return vec2_new(self.data[0] / (<Vec2>b).data[0],
+                self.data[1] / (<Vec2>b).data[1])
+
+        s = b
+        return vec2_new(self.data[0] / s, self.data[1] / s)
+
+    def __iadd__(self, Vec2 b):
+        """Add another vector to this vector in place."""
+        self.data[0] += b.data[0]
+        self.data[1] += b.data[1]
+        return self
+
+    def __isub__(self, Vec2 b):
+        """Subtract another vector from this vector in place."""
+        self.data[0] -= b.data[0]
+        self.data[1] -= b.data[1]
+        return self
+
+    def __imul__(self, b):
+        """Multiply this vector with another vector or a scalar in place."""
+        cdef float s
+
+        if isinstance(b, Vec2):
+            self.data[0] *= (<Vec2>b).data[0]
+            self.data[1] *= (<Vec2>b).data[1]
+
+        else:
+            s = b
+            self.data[0] *= s
+            self.data[1] *= s
+
+        return self
+
+    def __itruediv__(self, b):
+        """Divide this vector by another vector or a scalar in place."""
+        cdef float s
+
+        if isinstance(b, Vec2):
+            self.data[0] /= (<Vec2>b).data[0]
+            self.data[1] /= (<Vec2>b).data[1]
+
+        else:
+            s = b
+            self.data[0] /= s
+            self.data[1] /= s
+
+        return self
+
+    def get_x(self):
+        """Get the X component of this vector."""
+        return self.data[0]
+
+    def set_x(self, float value):
+        """Set the X component of this vector."""
+        self.data[0] = value
+
+    x = property(get_x, set_x)
+
+    def get_y(self):
+        """Get the Y component of this vector."""
+        return self.data[1]
+
+    def set_y(self, float value):
+        """Set the Y component of this vector."""
+        self.data[1] = value
+
+    y = property(get_y, set_y)
+
+    def set(self, float x, float y):
+        """Set both components of this vector and return this vector."""
+        self.data[0] = x
+        self.data[1] = y
+        return self
+
+    def copy(self):
+        """Return a copy of this vector."""
+        return vec2_new(self.data[0], self.data[1])
+
+    def dot(self, Vec2 b):
+        """Return the dot product of this vector and another vector."""
+        return vec2_dot(self.data, b.data)
+
+    def cross(self, Vec2 b):
+        """Return the Z component of the cross product of this vector and
+        another vector.
+        """
+        return self.data[0] * b.data[1] - self.data[1] * b.data[0]
+
+    def length(self):
+        """Return the length of this vector."""
+        return vec2_length(self.data)
+
+    def length_squared(self):
+        """Return the squared length of this vector."""
+        return vec2_dot(self.data, self.data)
+
+    def distance(self, Vec2 b):
+        """Return the distance between this vector and another vector."""
+        cdef float d[2]
+        d[0] = b.data[0] - self.data[0]
+        d[1] = b.data[1] - self.data[1]
+        return vec2_length(d)
+
+    def normalize(self):
+        """Return a unit length copy of this vector."""
+        cdef Vec2 v = Vec2()
+        vec2_normalize(self.data, v.data)
+        return v
+
+    def inormalize(self):
+        """Scale this vector to unit length in place and return this vector."""
+        vec2_normalize(self.data, self.data)
+        return self
+
+    def rotate(self, float angle):
+        """Return a copy of this vector rotated counterclockwise by the given
+        angle in degrees.
+        """
+        cdef Vec2 v = Vec2()
+        vec2_rotate(self.data, angle, v.data)
+        return v
+
+    def irotate(self, float angle):
+        """Rotate this vector counterclockwise by the given angle in degrees in
+        place and return this vector.
+        """
+        vec2_rotate(self.data, angle, self.data)
+        return self
@@ -0,0 +1,369 @@
+"""kvcheetah - Profiler API"""
+
+from array import array
+import csv
+from functools import wraps
+import json
+
+from kivy.clock import Clock
+
+try:
+    from time import perf_counter_ns
+
+except ImportError:
+    from time import perf_counter
+
+    def perf_counter_ns():
+        """Get the value of the performance counter in nanoseconds."""
+        return int(perf_counter() * 1000000000)
+
+
+#Classes
+#==============================================================================
+class ProfileScope(object):
+    """A context manager that adds the time spent inside it to a phase of a
+    profiler.
+    """
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name):
+        """Setup this profile scope."""
+        self._profiler = profiler
+        self._name = name
+        self._start = 0
+
+    def __enter__(self):
+        """Start timing this profile scope."""
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        """Stop timing this profile scope."""
+        self._profiler.add_time(self._name, perf_counter_ns() - self._start)
+        return False
+
+
+class NullScope(object):
+    """A context manager that does nothing. Disabled profilers return it from
+    scope, so timing a block costs a single check.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *args):
+        """Do nothing."""
+        return False
+
+
+class Profiler(object):
+    """Records how long each phase of a frame takes and how often counted
+    events happen. Phase times and counts are summed over a frame and stored
+    in a ring buffer that holds the last frames. A frame ends after the
+    window of the profiler is drawn or, without a window, once per clock
+    tick. Phases can be nested, like collision inside update, so their times
+    can overlap. A disabled profiler records nothing, so instrumented code
+    only pays for a single check.
+    """
+    def __init__(self, **kwargs):
+        """Setup this profiler."""
+        self._enabled = False
+        self._history = HISTORY
+        self._window = None
+        self._event = None
+        self._watches = {}
+        self._draw_start = 0
+        self.reset()
+
+        #Process keyword args
+        if "history" in kwargs:
+            self.history = kwargs["history"]
+
+        if "window" in kwargs:
+            self.attach(kwargs["window"])
+
+        if "enabled" in kwargs:
+            self.enabled = kwargs["enabled"]
+
+    def get_enabled(self):
+        """Is this profiler recording?"""
+        return self._enabled
+
+    def set_enabled(self, value):
+        """Start/stop recording."""
+        self._enabled = value
+        self._frame_start = perf_counter_ns()
+        self.schedule()
+
+    enabled = property(get_enabled, set_enabled)
+
+    def get_history(self):
+        """Get the number of frames kept by this profiler."""
+        return self._history
+
+    def set_history(self, value):
+        """Set the number of frames kept by this profiler. This discards the
+        recorded frames.
+        """
+        self._history = max(value, 1)
+        self.reset()
+
+    history = property(get_history, set_history)
+
+    def get_window(self):
+        """Get the window whose drawing is timed by this profiler."""
+        return self._window
+
+    window = property(get_window)
+
+    def get_frames(self):
+        """Get the number of recorded frames in the ring buffer."""
+        return min(self._frame, self._history)
+
+    frames = property(get_frames)
+
+    def get_frame(self):
+        """Get the number of frames recorded since the last reset."""
+        return self._frame
+
+    frame = property(get_frame)
+
+    def get_phases(self):
+        """Get the names of the recorded phases."""
+        return list(self._phases.keys())
+
+    phases = property(get_phases)
+
+    def get_counters(self):
+        """Get the names of the recorded counters."""
+        return list(self._counters.keys())
+
+    counters = property(get_counters)
+
+    def reset(self):
+        """Discard every recorded frame."""
+        self._frame = 0
+        self._frame_start = perf_counter_ns()
+        self._phases = {"frame": array("q", bytes(self._history * 8))}
+        self._counters = {}
+        self._times = {}
+        self._counts = {}
+
+    def attach(self, window):
+        """Time the drawing of the canvas of the given window as the "canvas"
+        phase and end each frame after the window is drawn. None detaches the
+        current window.
+        """
+        enabled = self._enabled
+        self.enabled = False
+        self._window = window
+        self.enabled = enabled
+
+    def schedule(self):
+        """Start or stop recording frames."""
+        #Stop recording
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+        if self._window is not None:
+            self._window.unbind(on_draw = self.on_draw,
+                on_flip = self.on_flip)
+
+        if not self._enabled:
+            return
+
+        #End each frame after the window is drawn
+        if self._window is not None:
+            self._window.bind(on_draw = self.on_draw, on_flip = self.on_flip)
+
+        #Otherwise end each frame once per clock tick
+        else:
+            self._event = Clock.schedule_interval(self.next_frame, 0)
+
+    def on_draw(self, *args):
+        """Start timing the canvas of the window."""
+        self._draw_start = perf_counter_ns()
+
+    def on_flip(self, *args):
+        """Stop timing the canvas of the window and end the frame."""
+        self.add_time("canvas", perf_counter_ns() - self._draw_start)
+        self.next_frame()
+
+    def scope(self, name):
+        """Return a context manager that times the given phase."""
+        if not self._enabled:
+            return NULL_SCOPE
+
+        return ProfileScope(self, name)
+
+    def profile(self, name = None):
+        """Return a decorator that times each call of a function as the given
+        phase. The phase defaults to the name of the function.
+        """
+        def decorator(func):
+            phase = func.__name__ if name is None else name
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self._enabled:
+                    return func(*args, **kwargs)
+
+                start = perf_counter_ns()
+
+                try:
+                    return func(*args, **kwargs)
+
+                finally:
+                    self.add_time(phase, perf_counter_ns() - start)
+
+            return wrapper
+
+        return decorator
+
+    def add_time(self, name, ns):
+        """Add the given number of nanoseconds to a phase of this frame."""
+        if self._enabled:
+            self._times[name] = self._times.get(name, 0) + ns
+
+    def count(self, name, n = 1):
+        """Add n to a counter of this frame."""
+        if self._enabled:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def watch(self, name, func):
+        """Sample the given function at the end of every frame and record the
+        sum of the samples of every function watched under the same name. This
+        suits values like the number of visible sprites that are not events.
+        """
+        self._watches.setdefault(name, []).append(func)
+
+    def unwatch(self, name, func = None):
+        """Stop sampling the given function, or every function watched under
+        the given name.
+        """
+        funcs = self._watches.get(name, [])
+
+        if func is not None and func in funcs:
+            funcs.remove(func)
+
+        if func is None or len(funcs) == 0:
+            self._watches.pop(name, None)
+
+    def next_frame(self, *args):
+        """Store the phase times and counts of this frame in the ring buffer
+        and start a new frame.
+        """
+        if not self._enabled:
+            return
+
+        #Sample the watched values
+        for name, funcs in self._watches.items():
+            self._counts[name] = (self._counts.get(name, 0) +
+                sum(func() for func in funcs))
+
+        #Time the whole frame
+        now = perf_counter_ns()
+        self._times["frame"] = now - self._frame_start
+        self._frame_start = now
+
+        #Store every value, including the ones that did not occur
+        slot = self._frame % self._history
+        self.store(self._phases, self._times, slot)
+        self.store(self._counters, self._counts, slot)
+        self._times = {}
+        self._counts = {}
+        self._frame += 1
+
+    def store(self, rings, values, slot):
+        """Write a frame of values into the given ring buffers."""
+        for name in values:
+            if name not in rings:
+                rings[name] = array("q", bytes(self._history * 8))
+
+        for name, ring in rings.items():
+            ring[slot] = values.get(name, 0)
+
+    def values(self, name):
+        """Get the recorded values of a phase in nanoseconds or of a counter
+        from the oldest frame to the newest.
+        """
+        ring = self._phases.get(name, None)
+
+        if ring is None:
+            ring = self._counters[name]
+
+        n = self.frames
+        start = (self._frame - n) % self._history
+        return (ring[start:] + ring[:start])[:n]
+
+    def stats(self, name):
+        """Get the (last, average, maximum) value of a phase in milliseconds
+        or of a counter over the recorded frames.
+        """
+        values = self.values(name)
+
+        if len(values) == 0:
+            return (0, 0, 0)
+
+        scale = 1000000 if name in self._phases else 1
+        return (
+            values[-1] / scale,
+            sum(values) / len(values) / scale,
+            max(values) / scale
+        )
+
+    def rows(self):
+        """Get the recorded frames as a header and a list of rows. Phase times
+        are in milliseconds.
+        """
+        phases = self.phases
+        counters = self.counters
+        columns = ([self.values(name) for name in phases] +
+            [self.values(name) for name in counters])
+        first = self._frame - self.frames
+        header = (["frame"] + ["{}_ms".format(name) for name in phases] +
+            counters)
+        rows = []
+
+        for i in range(self.frames):
+            row = [first + i]
+            row.extend(column[i] / 1000000 for column in
+                columns[:len(phases)])
+            row.extend(column[i] for column in columns[len(phases):])
+            rows.append(row)
+
+        return header, rows
+
+    def export_csv(self, path):
+        """Write the recorded frames to a CSV file with 1 row per frame."""
+        header, rows = self.rows()
+
+        with open(path, "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def export_json(self, path):
+        """Write the recorded frames to a JSON file with a list of values per
+        phase and counter.
+        """
+        data = {
+            "first_frame": self._frame - self.frames,
+            "phases_ms": {name: [v / 1000000 for v in self.values(name)]
+                for name in self.phases},
+            "counters": {name: list(self.values(name))
+                for name in self.counters}
+        }
+
+        with open(path, "w") as f:
+            json.dump(data, f, indent = 4)
+
+
+#Globals
+#==============================================================================
+HISTORY = 240
+NULL_SCOPE = NullScope()
+PROFILER = Profiler()
@@ -0,0 +1,109 @@
+"""kvcheetah - ProfilerOverlay API"""
+
+from kivy.base import EventLoop
+from kivy.clock import Clock
+from kivy.factory import Factory
+from kivy.graphics import Color, Line, Rectangle
+from kivy.properties import NumericProperty, ObjectProperty
+from kivy.uix.label import Label
+
+try:
+    from ..profiler import PROFILER
+
+except ImportError:
+    from profiler import PROFILER
+
+
+#Classes
+#==============================================================================
+class ProfilerOverlay(Label):
+    """Shows the phase times and counters of a profiler over a graph of the
+    recent frame times. The graph spans twice the frame budget, so frames
+    over budget reach past the middle line. The overlay enables the profiler
+    and attaches it to its window while it is shown.
+    """
+    profiler = ObjectProperty(PROFILER)
+    budget = NumericProperty(1000 / 60)
+    interval = NumericProperty(.5)
+
+    def __init__(self, **kwargs):
+        """Setup this profiler overlay."""
+        kwargs.setdefault("halign", "left")
+        kwargs.setdefault("valign", "top")
+        kwargs.setdefault("font_size", 12)
+        self._event = None
+        super(ProfilerOverlay, self).__init__(**kwargs)
+
+        with self.canvas.before:
+            Color(0, 0, 0, .6)
+            self.bg = Rectangle(pos = self.pos, size = self.size)
+            Color(1, 1, 0, .5)
+            self.budget_line = Line(points = [])
+            Color(0, 1, 0, 1)
+            self.graph = Line(points = [])
+
+        self.bind(
+            pos = self.update,
+            size = self.update
+        )
+
+    def on_parent(self, instance, value):
+        """Start/stop refreshing when this overlay is added/removed."""
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+        if value is not None:
+            self.profiler.attach(EventLoop.window)
+            self.profiler.enabled = True
+            self._event = Clock.schedule_interval(self.refresh,
+                self.interval)
+
+        else:
+            self.profiler.enabled = False
+
+    def update(self, *args):
+        """Handle pos/size change."""
+        self.bg.pos = self.pos
+        self.bg.size = self.size
+        self.text_size = self.size
+        self.refresh()
+
+    def refresh(self, *args):
+        """Show the latest stats of the profiler."""
+        profiler = self.profiler
+        lines = []
+
+        #List the phase times
+        for name in sorted(profiler.phases):
+            last, avg, peak = profiler.stats(name)
+            lines.append("{}: {:.2f} ms (avg {:.2f}, max {:.2f})".format(
+                name, last, avg, peak))
+
+        #List the counters
+        for name in sorted(profiler.counters):
+            last, avg, peak = profiler.stats(name)
+            lines.append("{}: {} (avg {:.1f}, max {})".format(
+                name, last, avg, peak))
+
+        self.text = "\n".join(lines)
+
+        #Graph the frame times along the bottom of the overlay
+        x, y = self.pos
+        w, h = self.size
+        gh = h / 4
+        values = profiler.values("frame")
+        step = w / max(profiler.history - 1, 1)
+        scale = gh / (self.budget * 2000000)
+        points = []
+
+        for i, value in enumerate(values):
+            points.extend((x + i * step, y + min(value * scale, gh)))
+
+        self.graph.points = points
+        self.budget_line.points = [x, y + gh / 2, x + w, y + gh / 2]
+
+
+#Register Widgets
+#===============================================================================
+Factory.register("ProfilerOverlay", ProfilerOverlay)
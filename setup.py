@@ -16,11 +16,33 @@ if sys.platform == "win32":
 
 #Define extensions
 extensions = [
+    Extension("kvcheetah.ecs", ["kvcheetah/ecs.py"]),
+    Extension("kvcheetah.engine", ["kvcheetah/engine.py"]),
     Extension("kvcheetah.math.matrix", ["kvcheetah/math/matrix.pyx"]),
+    Extension("kvcheetah.math.particles", ["kvcheetah/math/particles.pyx"]),
+    Extension("kvcheetah.math.quads", ["kvcheetah/math/quads.pyx"]),
+    Extension("kvcheetah.math.sweep", ["kvcheetah/math/sweep.pyx"]),
+    Extension("kvcheetah.math.vecarray", ["kvcheetah/math/vecarray.pyx"]),
     Extension("kvcheetah.math.vector", ["kvcheetah/math/vector.pyx"]),
+    Extension("kvcheetah.profiler", ["kvcheetah/profiler.py"]),
+    Extension("kvcheetah.graphics.animation",
+        ["kvcheetah/graphics/animation.py"]),
+    Extension("kvcheetah.graphics.atlas", ["kvcheetah/graphics/atlas.py"]),
+    Extension("kvcheetah.graphics.batch", ["kvcheetah/graphics/batch.py"]),
+    Extension("kvcheetah.graphics.camera", ["kvcheetah/graphics/camera.py"]),
+    Extension("kvcheetah.graphics.collision",
+        ["kvcheetah/graphics/collision.py"]),
+    Extension("kvcheetah.graphics.opengl.renderer",
+        ["kvcheetah/graphics/opengl/renderer.py"]),
+    Extension("kvcheetah.graphics.particles",
+        ["kvcheetah/graphics/particles.py"]),
+    Extension("kvcheetah.graphics.renderqueue",
+        ["kvcheetah/graphics/renderqueue.py"]),
     Extension("kvcheetah.graphics.sprite", ["kvcheetah/graphics/sprite.py"]),
+    Extension("kvcheetah.graphics.store", ["kvcheetah/graphics/store.py"]),
     Extension("kvcheetah.graphics.tilemap", ["kvcheetah/graphics/tilemap.py"]),
-    Extension("kvcheetah.uix.joystick", ["kvcheetah/uix/joystick.py"])
+    Extension("kvcheetah.uix.joystick", ["kvcheetah/uix/joystick.py"]),
+    Extension("kvcheetah.uix.overlay", ["kvcheetah/uix/overlay.py"])
 ]
 
 #Run setup